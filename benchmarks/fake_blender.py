@@ -0,0 +1,101 @@
+import argparse
+import json
+import random
+import socketserver
+import threading
+import time
+
+# Stand-in for the Blender socket bridge (port 9876), for benchmarks.
+#
+# Accepts the bridge protocol ({"type": "execute_code", "params": {"code": ...}})
+# and answers {"status": "success", "result": ...} after a simulated run time
+# of --latency seconds plus --per-kb seconds per KB of code. Like the real
+# add-on it executes one command at a time (bpy is single threaded), so
+# concurrent clients queue up.
+#
+#   python benchmarks/fake_blender.py --port 9876 --latency 0.2
+
+IDLE_TIMEOUT = 0.5  # raw (non-JSON) scripts are taken as complete after this much silence
+
+
+class FakeBlender:
+    def __init__(self, latency=0.1, per_kb=0.002, jitter=0.1, fail_rate=0.0):
+        self.latency = latency
+        self.per_kb = per_kb
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.bpy_lock = threading.Lock()
+        self.stats = {"commands": 0, "failed": 0}
+
+    def execute(self, code):
+        seconds = (self.latency + self.per_kb * len(code) / 1024) * (1 + random.uniform(-self.jitter, self.jitter))
+        with self.bpy_lock:
+            time.sleep(max(0.0, seconds))
+            self.stats["commands"] += 1
+            if random.random() < self.fail_rate:
+                self.stats["failed"] += 1
+                return {"status": "error", "message": "Simulated failure"}
+        return {"status": "success", "result": {"fake": True, "seconds": round(seconds, 4), "code_bytes": len(code)}}
+
+
+def make_handler(fake):
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            sock = self.request
+            chunks = []
+            while True:
+                sock.settimeout(IDLE_TIMEOUT if chunks else None)
+                try:
+                    chunk = sock.recv(65536)
+                except TimeoutError:
+                    break
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                try:
+                    json.loads(b"".join(chunks).decode("utf-8"))
+                    break
+                except ValueError:
+                    continue
+            if not chunks:
+                return
+            text = b"".join(chunks).decode("utf-8", errors="replace")
+            try:
+                message = json.loads(text)
+                code = message.get("params", {}).get("code", "")
+            except ValueError:
+                code = text  # scripts that send raw Python
+            sock.sendall(json.dumps(fake.execute(code)).encode("utf-8"))
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=9876, **config):
+    fake = FakeBlender(**config)
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    server = socketserver.ThreadingTCPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    return server, fake
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Blender socket bridge for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9876)
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds per command")
+    parser.add_argument("--per-kb", type=float, default=0.002, help="Extra seconds per KB of code")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, _ = serve(args.host, args.port, latency=args.latency, per_kb=args.per_kb,
+                      jitter=args.jitter, fail_rate=args.fail_rate)
+    print(f"Fake Blender bridge on {args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
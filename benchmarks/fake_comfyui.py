@@ -0,0 +1,308 @@
+import argparse
+import base64
+import hashlib
+import json
+import queue
+import random
+import re
+import struct
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Stand-in for ComfyUI, for benchmarks (standard library only).
+#
+# Speaks the parts of the ComfyUI API the backend uses: POST /prompt,
+# GET /history/<id>, GET /view, POST /upload/image, GET /object_info,
+# GET /queue and the /ws websocket with status / execution_start /
+# executing / progress / executed events. Prompts are executed by
+# --workers simulated GPUs, one prompt at a time each, so queueing
+# behaves like the real server under load. Each GPU remembers the last
+# checkpoint it loaded; a prompt for a different one costs --load-time.
+#
+#   python benchmarks/fake_comfyui.py --port 8188 --steps 20 --step-time 0.05
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def make_png(size):
+    """Valid grey size x size PNG (content doesn't matter, byte size does)."""
+    raw = b"".join(b"\x00" + bytes([128]) * size * 3 for _ in range(size))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b"")
+
+
+class WebSocket:
+    """Server side of one websocket connection (we only ever send text frames)."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def send(self, text):
+        data = text.encode("utf-8")
+        if len(data) < 126:
+            header = struct.pack("!BB", 0x81, len(data))
+        elif len(data) < 65536:
+            header = struct.pack("!BBH", 0x81, 126, len(data))
+        else:
+            header = struct.pack("!BBQ", 0x81, 127, len(data))
+        with self.lock:
+            if self.closed:
+                return
+            try:
+                self.sock.sendall(header + data)
+            except OSError:
+                self.closed = True
+
+    def wait_closed(self):
+        """Reads (and ignores) client frames until the client goes away."""
+        while not self.closed:
+            try:
+                head = self.sock.recv(2)
+                if len(head) < 2 or head[0] & 0x0F == 0x8:
+                    break
+                length = head[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack("!H", self.sock.recv(2))[0]
+                elif length == 127:
+                    length = struct.unpack("!Q", self.sock.recv(8))[0]
+                remaining = length + (4 if head[1] & 0x80 else 0)
+                while remaining:
+                    chunk = self.sock.recv(min(remaining, 65536))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+            except OSError:
+                break
+        self.closed = True
+
+
+class FakeComfyUI:
+    def __init__(self, steps=20, step_time=0.05, jitter=0.1, upload_latency=0.01, image_size=512,
+                 workers=1, fail_rate=0.0, checkpoints=("fake_sd15.safetensors",), load_time=0.0):
+        self.steps = steps
+        self.load_time = load_time
+        self.step_time = step_time
+        self.jitter = jitter
+        self.upload_latency = upload_latency
+        self.workers = workers
+        self.fail_rate = fail_rate
+        self.checkpoints = list(checkpoints)
+        self.image = make_png(image_size)
+        self.pending = queue.Queue()
+        self.history = {}
+        self.sockets = {}  # client_id -> [WebSocket]
+        self.lock = threading.Lock()
+        self.counter = 0
+        self.stats = {"prompts": 0, "uploads": 0, "views": 0, "failed": 0, "model_loads": 0}
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"gpu-{i}", daemon=True).start()
+
+    # --- websocket fan-out ---------------------------------------------------
+
+    def emit(self, client_id, kind, data):
+        text = json.dumps({"type": kind, "data": data})
+        with self.lock:
+            targets = list(self.sockets.get(client_id, [])) if client_id else \
+                [ws for lst in self.sockets.values() for ws in lst]
+        for ws in targets:
+            ws.send(text)
+
+    def status(self):
+        return {"status": {"exec_info": {"queue_remaining": self.pending.qsize()}}}
+
+    def attach(self, client_id, ws):
+        with self.lock:
+            self.sockets.setdefault(client_id, []).append(ws)
+        ws.send(json.dumps({"type": "status", "data": dict(self.status(), sid=client_id)}))
+
+    def detach(self, client_id, ws):
+        with self.lock:
+            lst = self.sockets.get(client_id, [])
+            if ws in lst:
+                lst.remove(ws)
+            if not lst:
+                self.sockets.pop(client_id, None)
+
+    # --- execution -------------------------------------------------------------
+
+    def queue_prompt(self, body):
+        prompt_id = str(uuid.uuid4())
+        with self.lock:
+            self.counter += 1
+            number = self.counter
+            self.stats["prompts"] += 1
+        self.pending.put((prompt_id, body.get("client_id"), body.get("prompt", {})))
+        self.emit(None, "status", self.status())
+        return {"prompt_id": prompt_id, "number": number, "node_errors": {}}
+
+    def _worker(self):
+        loaded = None
+        while True:
+            prompt_id, client_id, prompt = self.pending.get()
+            self.emit(None, "status", self.status())
+            self.emit(client_id, "execution_start", {"prompt_id": prompt_id, "timestamp": int(time.time() * 1000)})
+            ckpt = next((n.get("inputs", {}).get("ckpt_name") for n in prompt.values()
+                         if n.get("class_type") == "CheckpointLoaderSimple"), None)
+            if ckpt is not None and ckpt != loaded:
+                time.sleep(self.load_time)
+                loaded = ckpt
+                with self.lock:
+                    self.stats["model_loads"] += 1
+            nodes = sorted(prompt, key=lambda k: int(k) if str(k).isdigit() else 0) or ["3"]
+            failed = random.random() < self.fail_rate
+            for node in nodes:
+                self.emit(client_id, "executing", {"node": node, "display_node": node, "prompt_id": prompt_id})
+                if prompt.get(node, {}).get("class_type", "KSampler") == "KSampler" or len(nodes) == 1:
+                    for step in range(1, self.steps + 1):
+                        time.sleep(self.step_time * (1 + random.uniform(-self.jitter, self.jitter)))
+                        self.emit(client_id, "progress", {"value": step, "max": self.steps,
+                                                          "prompt_id": prompt_id, "node": node})
+                if failed:
+                    break
+            filename = f"fake_{prompt_id[:8]}_00001_.png"
+            if failed:
+                with self.lock:
+                    self.stats["failed"] += 1
+                self.emit(client_id, "execution_error", {"prompt_id": prompt_id, "node_id": nodes[-1],
+                                                          "exception_message": "Simulated failure"})
+                outputs = {}
+            else:
+                outputs = {"9": {"images": [{"filename": filename, "subfolder": "", "type": "output"}]}}
+                self.emit(client_id, "executed", {"node": "9", "output": outputs["9"], "prompt_id": prompt_id})
+            with self.lock:
+                self.history[prompt_id] = {"prompt": [0, prompt_id, prompt, {}, ["9"]], "outputs": outputs,
+                                           "status": {"status_str": "error" if failed else "success",
+                                                      "completed": not failed}}
+            self.emit(client_id, "executing", {"node": None, "prompt_id": prompt_id})
+            self.emit(None, "status", self.status())
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _json(self, payload, status=200):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length) if length else b""
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/ws":
+                return self._websocket(parse_qs(url.query).get("clientId", [None])[0])
+            if url.path.startswith("/history/"):
+                prompt_id = url.path[len("/history/"):]
+                with fake.lock:
+                    entry = fake.history.get(prompt_id)
+                return self._json({prompt_id: entry} if entry else {})
+            if url.path == "/view":
+                with fake.lock:
+                    fake.stats["views"] += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(fake.image)))
+                self.end_headers()
+                self.wfile.write(fake.image)
+                return
+            if url.path == "/object_info":
+                return self._json({"CheckpointLoaderSimple": {"input": {"required": {"ckpt_name": [fake.checkpoints]}}}})
+            if url.path == "/queue":
+                return self._json({"queue_running": [], "queue_pending": [None] * fake.pending.qsize()})
+            if url.path == "/stats":
+                with fake.lock:
+                    return self._json(dict(fake.stats, queue=fake.pending.qsize()))
+            self._json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            body = self._body()
+            if url.path == "/prompt":
+                return self._json(fake.queue_prompt(json.loads(body or b"{}")))
+            if url.path == "/upload/image":
+                time.sleep(fake.upload_latency)
+                match = re.search(rb'filename="([^"]*)"', body)
+                name = match.group(1).decode("utf-8", "replace") if match else "upload.png"
+                with fake.lock:
+                    fake.stats["uploads"] += 1
+                return self._json({"name": name, "subfolder": "", "type": "input"})
+            self._json({"error": "not found"}, 404)
+
+        def _websocket(self, client_id):
+            key = self.headers.get("Sec-WebSocket-Key")
+            if not key or self.headers.get("Upgrade", "").lower() != "websocket":
+                return self._json({"error": "websocket upgrade required"}, 400)
+            accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+            self.send_response(101)
+            self.send_header("Upgrade", "websocket")
+            self.send_header("Connection", "Upgrade")
+            self.send_header("Sec-WebSocket-Accept", accept)
+            self.end_headers()
+            self.wfile.flush()
+            ws = WebSocket(self.connection)
+            client_id = client_id or uuid.uuid4().hex
+            fake.attach(client_id, ws)
+            try:
+                ws.wait_closed()
+            finally:
+                fake.detach(client_id, ws)
+                self.close_connection = True
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=8188, **config):
+    fake = FakeComfyUI(**config)
+    server = ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    return server, fake
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake ComfyUI server for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8188)
+    parser.add_argument("--steps", type=int, default=20, help="Sampler steps per prompt")
+    parser.add_argument("--step-time", type=float, default=0.05, help="Seconds per sampler step")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Relative +- jitter per step")
+    parser.add_argument("--upload-latency", type=float, default=0.01)
+    parser.add_argument("--image-size", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=1, help="Simulated GPUs")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--checkpoints", nargs="+", default=["fake_sd15.safetensors"])
+    parser.add_argument("--load-time", type=float, default=0.0, help="Seconds to switch checkpoints")
+    args = parser.parse_args()
+
+    server, _ = serve(args.host, args.port, steps=args.steps, step_time=args.step_time, jitter=args.jitter,
+                      upload_latency=args.upload_latency, image_size=args.image_size,
+                      workers=args.workers, fail_rate=args.fail_rate, checkpoints=args.checkpoints,
+                      load_time=args.load_time)
+    print(f"Fake ComfyUI on http://{args.host}:{args.port} ({args.workers} worker(s), "
+          f"{args.steps} x {args.step_time}s steps)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
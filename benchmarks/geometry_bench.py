@@ -0,0 +1,244 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import history
+
+SCRIPTS_DIR = os.path.join(history.ROOT_DIR, "scripts")
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+import segmentation  # noqa: E402
+import shape_keys  # noqa: E402
+from glb_utils import ELEMENT_ARRAY_BUFFER, Glb  # noqa: E402
+from measurements import Measurements  # noqa: E402
+
+# Microbenchmarks for the geometry / GLB tooling (plain Python + NumPy).
+#
+# Cases run on synthetic shirt-like meshes (10k to 1M vertices) and on the
+# real client/public/models/man.glb and woman.glb:
+#   glb_load       Glb.load (header, JSON and BIN chunks)
+#   glb_positions  reading every POSITION / index accessor
+#   bounds         world-space bbox over all mesh nodes + Measurements
+#   segment        segmentation.segment with the shirt rules + quantize
+#   morph_deltas   the four part shape keys built by add_part_controls.py
+# Each case reports the median (and min) of several repeats. Results are
+# stored like the load tests (history.py); with --compare a case fails when
+# its median is slower than the baseline by more than the "geometry"
+# threshold in thresholds.json, and --fail-on-regression turns that into a
+# non-zero exit for CI.
+#
+#   python benchmarks/geometry_bench.py --compare --fail-on-regression
+#   python benchmarks/geometry_bench.py --sizes 10000 100000 --only segment
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+MODELS_DIR = os.path.join(history.ROOT_DIR, "client", "public", "models")
+REAL_ASSETS = ("man.glb", "woman.glb")
+
+MIN_REPEATS = 3
+MAX_REPEATS = 50
+TIME_BUDGET = 1.0  # seconds per case, after the minimum repeats
+
+
+def synthetic_mesh(n_vertices, seed=0):
+    """Shirt-like open cylinder (rings along Z) with noise: positions, normals, uvs and triangles."""
+    rng = np.random.default_rng(seed)
+    columns = max(8, int(np.sqrt(n_vertices * 2)))
+    rows = max(2, n_vertices // columns)
+    theta = np.linspace(0.0, 2 * np.pi, columns, endpoint=False, dtype=np.float32)
+    z = np.linspace(0.0, 0.8, rows, dtype=np.float32)
+    t, h = np.meshgrid(theta, z)
+    radius = 0.2 + 0.03 * np.sin(3 * h) + rng.normal(0.0, 0.002, t.shape).astype(np.float32)
+    positions = np.stack([radius * np.cos(t), radius * np.sin(t) * 0.6, h], axis=-1).reshape(-1, 3)
+    normals = np.stack([np.cos(t), np.sin(t), np.zeros_like(t)], axis=-1).reshape(-1, 3)
+    uvs = np.stack([t / (2 * np.pi), h / 0.8], axis=-1).reshape(-1, 2)
+
+    r, c = np.meshgrid(np.arange(rows - 1), np.arange(columns), indexing="ij")
+    a = r * columns + c
+    b = r * columns + (c + 1) % columns
+    quads = np.stack([a, b, b + columns, a, b + columns, a + columns], axis=-1)
+    return (positions.astype(np.float32), normals.astype(np.float32), uvs.astype(np.float32),
+            quads.reshape(-1).astype(np.uint32))
+
+
+def synthetic_glb(path, n_vertices):
+    """Writes a one-mesh GLB with the synthetic shirt and two morph targets."""
+    positions, normals, uvs, indices = synthetic_mesh(n_vertices)
+    glb = Glb({"asset": {"version": "2.0"}, "scenes": [{"nodes": [0]}], "scene": 0,
+               "nodes": [{"name": "Shirt", "mesh": 0}], "meshes": []})
+    collar = (positions[:, 2:] > 0.6) * np.array([0.0, 0.0, 0.01], dtype=np.float32)
+    targets = [
+        {"POSITION": glb.add_accessor(collar.astype(np.float32), with_bounds=True)},
+        {"POSITION": glb.add_accessor(positions * np.float32(0.05), with_bounds=True)},
+    ]
+    primitive = {
+        "attributes": {
+            "POSITION": glb.add_accessor(positions, with_bounds=True),
+            "NORMAL": glb.add_accessor(normals),
+            "TEXCOORD_0": glb.add_accessor(uvs),
+        },
+        "indices": glb.add_accessor(indices, target=ELEMENT_ARRAY_BUFFER),
+        "targets": targets,
+    }
+    glb.gltf["meshes"].append({"name": "Shirt", "primitives": [primitive], "weights": [0.0, 0.0],
+                               "extras": {"targetNames": ["Collar_Up", "Wider"]}})
+    return glb.save(path), len(positions)
+
+
+def timeit(fn, min_repeats=MIN_REPEATS, max_repeats=MAX_REPEATS, budget=TIME_BUDGET):
+    """Runs fn once to warm up, then repeats it; returns the timing stats in seconds."""
+    fn()
+    times = []
+    started = time.perf_counter()
+    while len(times) < max_repeats and (len(times) < min_repeats or time.perf_counter() - started < budget):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {"median": statistics.median(times), "min": min(times), "repeats": len(times)}
+
+
+# --- Cases ---------------------------------------------------------------
+
+def read_positions(glb):
+    out = []
+    for mesh in glb.gltf.get("meshes", []):
+        for prim in mesh.get("primitives", []):
+            out.append(glb.read_accessor(prim["attributes"]["POSITION"]))
+            if "indices" in prim:
+                glb.read_accessor(prim["indices"])
+    return out
+
+
+def world_bounds(glb):
+    world = glb.world_matrices()
+    lo = np.full(3, np.inf)
+    hi = np.full(3, -np.inf)
+    for node_index, mesh_index in glb.mesh_nodes():
+        m = world[node_index]
+        for prim in glb.gltf["meshes"][mesh_index]["primitives"]:
+            p = glb.read_accessor(prim["attributes"]["POSITION"]).astype(np.float64) @ m[:3, :3].T + m[:3, 3]
+            lo = np.minimum(lo, p.min(axis=0))
+            hi = np.maximum(hi, p.max(axis=0))
+    return Measurements("bench", lo, hi, 0)
+
+
+def segment(coords):
+    parts = segmentation.segment(coords, segmentation.shirt_rules(falloff=0.05))
+    return {name: segmentation.quantize(w) for name, w in parts.items()}
+
+
+def morph_deltas(coords, weights):
+    return [
+        shape_keys.translation_deltas(weights["Sleeve_L"], (0.2, 0, 0)),
+        shape_keys.translation_deltas(weights["Sleeve_R"], (-0.2, 0, 0)),
+        shape_keys.scale_deltas(coords, weights["Collar"], 1.3),
+        shape_keys.scale_deltas(coords, weights["Torso"], 1.3),
+    ]
+
+
+CASES = ("glb_load", "glb_positions", "bounds", "segment", "morph_deltas")
+
+
+def bench_file(label, path, only=None):
+    """Runs every case on one GLB file; returns {"<case>/<label>": stats}."""
+    glb = Glb.load(path)
+    positions = read_positions(glb)
+    coords = np.concatenate(positions).astype(np.float32) if positions else np.zeros((0, 3), np.float32)
+    weights = segment(coords)
+    fns = {
+        "glb_load": lambda: Glb.load(path),
+        "glb_positions": lambda: read_positions(glb),
+        "bounds": lambda: world_bounds(glb),
+        "segment": lambda: segment(coords),
+        "morph_deltas": lambda: morph_deltas(coords, weights),
+    }
+    results = {}
+    for case in CASES:
+        if only and case not in only:
+            continue
+        stats = timeit(fns[case])
+        stats["vertices"] = int(len(coords))
+        stats["file_bytes"] = os.path.getsize(path)
+        results[f"{case}/{label}"] = stats
+        print(f"  {case + '/' + label:28s} {stats['median'] * 1000:10.2f} ms  (min {stats['min'] * 1000:.2f}, "
+              f"n={stats['repeats']}, {len(coords)} verts)", flush=True)
+    return results
+
+
+def run(sizes, real_assets=True, only=None):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="orchid_geom_") as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"synthetic_{size}.glb")
+            synthetic_glb(path, size)
+            results.update(bench_file(f"synthetic_{size // 1000}k", path, only))
+    if real_assets:
+        for name in REAL_ASSETS:
+            path = os.path.join(MODELS_DIR, name)
+            if os.path.exists(path):
+                results.update(bench_file(name, path, only))
+            else:
+                print(f"  skipping {name}: not found")
+    return results
+
+
+def compare(baseline, results, limits):
+    """Returns the cases whose median regressed past the configured threshold."""
+    relative = limits.get("relative", 0.25)
+    noise = limits.get("min_seconds", 0.001)
+    overrides = limits.get("overrides", {})
+    print(f"\nvs {history.describe(baseline)}")
+    regressions = []
+    for name, stats in results.items():
+        old = baseline["results"].get(name)
+        if not old:
+            continue
+        before, after = old["median"], stats["median"]
+        change = (after - before) / before if before else 0.0
+        limit = overrides.get(name, relative)
+        # Sub-millisecond cases are too noisy for relative checks alone
+        worse = change > limit and after - before > noise
+        flag = "  REGRESSION" if worse else ""
+        print(f"  {name:28s} {before * 1000:10.2f} -> {after * 1000:10.2f} ms ({change:+.1%}, limit {limit:.0%}){flag}")
+        if worse:
+            regressions.append((name, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Geometry / GLB microbenchmarks.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="Synthetic mesh vertex counts")
+    parser.add_argument("--only", nargs="+", choices=CASES, help="Cases to run")
+    parser.add_argument("--no-assets", action="store_true", help="Skip man.glb / woman.glb")
+    parser.add_argument("--compare", action="store_true", help="Compare with the previous stored run")
+    parser.add_argument("--baseline", help="Result file to compare with")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    results = run(args.sizes, not args.no_assets, args.only)
+
+    path = None
+    if not args.no_save:
+        path = history.save("geometry", {"sizes": args.sizes, "only": args.only}, results)
+        print(f"\nSaved {os.path.relpath(path, history.ROOT_DIR)}")
+
+    baseline_path = args.baseline or (history.previous("geometry", path) if args.compare else None)
+    if baseline_path:
+        regressions = compare(history.load(baseline_path), results, history.thresholds("geometry"))
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed")
+            if args.fail_on_regression:
+                sys.exit(1)
+    elif args.compare:
+        print("No earlier result to compare with")
+
+
+if __name__ == "__main__":
+    main()
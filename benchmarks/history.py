@@ -0,0 +1,78 @@
+import json
+import os
+import platform
+import subprocess
+import time
+
+# Stored benchmark results, shared by run.py (load tests) and
+# geometry_bench.py (microbenchmarks).
+#
+# Every run is written to benchmarks/results/<kind>_<time>_<commit>.json with
+# the git commit, dirty flag and machine info, so runs can be compared across
+# commits. Regression thresholds live in benchmarks/thresholds.json.
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+THRESHOLDS_PATH = os.path.join(BENCH_DIR, "thresholds.json")
+
+
+def git_info():
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT_DIR, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {"commit": git("rev-parse", "HEAD"), "branch": git("rev-parse", "--abbrev-ref", "HEAD"),
+            "dirty": bool(status) if status is not None else None}
+
+
+def save(kind, config, results):
+    """Writes one run to RESULTS_DIR and returns the file path."""
+    info = git_info()
+    record = {
+        "kind": kind,
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "git": info,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": config,
+        "results": results,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    sha = (info["commit"] or "nogit")[:10] + ("-dirty" if info["dirty"] else "")
+    path = os.path.join(RESULTS_DIR, f"{kind}_{time.strftime('%Y%m%d-%H%M%S')}_{sha}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2)
+    return path
+
+
+def previous(kind, exclude=None):
+    """Path of the most recent stored run of `kind` (other than `exclude`), or None."""
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    files = sorted(os.path.join(RESULTS_DIR, f) for f in os.listdir(RESULTS_DIR)
+                   if f.startswith(kind + "_") and f.endswith(".json"))
+    files = [f for f in files if f != exclude]
+    return files[-1] if files else None
+
+
+def load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return dict(json.load(f), path=path)
+
+
+def thresholds(kind):
+    """Regression thresholds for `kind` from thresholds.json ({} when missing)."""
+    if not os.path.exists(THRESHOLDS_PATH):
+        return {}
+    with open(THRESHOLDS_PATH, "r", encoding="utf-8") as f:
+        return json.load(f).get(kind, {})
+
+
+def describe(record):
+    commit = (record.get("git") or {}).get("commit") or "?"
+    return f"{os.path.basename(record['path'])} ({commit[:10]})"
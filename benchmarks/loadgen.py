@@ -0,0 +1,224 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Load generator for the backend (and the Blender bridge).
+#
+# Keeps `concurrency` requests in flight against /generate-texture until
+# `requests` have completed (or `duration` seconds passed) and reports
+# throughput, p50/p95/p99 latency, status codes and memory: peak RSS of the
+# backend process when its pid is known (Linux /proc), plus this process.
+# Texture requests carry a per-request prompt suffix so the backend can't
+# coalesce them; --same-prompt sends identical requests instead.
+#
+#   python benchmarks/loadgen.py --url http://127.0.0.1:8000 -c 8 -n 200 --file tupian/sample.png
+#   python benchmarks/loadgen.py --blender 127.0.0.1:9876 -c 2 -n 20
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def rss_bytes(pid):
+    """Resident set size of a process (Linux only, None elsewhere)."""
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class MemorySampler:
+    def __init__(self, pid, interval=0.25):
+        self.pid = pid
+        self.interval = interval
+        self.start_rss = rss_bytes(pid) if pid else None
+        self.peak = self.start_rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            rss = rss_bytes(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+
+    def __enter__(self):
+        if self.pid:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self.end_rss = rss_bytes(self.pid) if self.pid else None
+
+
+def texture_request(url, file_path=None, prompt="blue denim", part="shirt", timeout=300, unique=True):
+    """Returns a callable doing one /generate-texture request with its own session.
+
+    With unique=True every request gets its own prompt ("blue denim #17"), so
+    the backend's single-flight coalescing can't merge concurrent requests and
+    the run measures generation throughput. unique=False sends identical
+    requests, which is what the coalescing scenarios want.
+    """
+    local = threading.local()
+    counter = itertools.count()
+    payload = None
+    if file_path:
+        with open(file_path, "rb") as f:
+            payload = f.read()
+        name = os.path.basename(file_path)
+
+    def call():
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        files = {"file": (name, payload, "image/png")} if payload is not None else None
+        text = f"{prompt} #{next(counter)}" if unique else prompt
+        resp = session.post(f"{url.rstrip('/')}/generate-texture", data={"prompt": text, "part": part},
+                            files=files, timeout=timeout)
+        resp.content
+        return resp.status_code
+
+    return call
+
+
+def blender_request(address, code="import bpy\nresult = len(bpy.data.objects)\n", timeout=300):
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.insert(0, SCRIPTS_DIR)
+    from blender_bridge import send_command
+
+    host, port = address.rsplit(":", 1)
+
+    def call():
+        response = send_command(code, "bench.blender", host, int(port), timeout=timeout)
+        return 200 if response.get("status") == "success" else 500
+
+    return call
+
+
+def run_load(call, concurrency=4, requests_total=100, duration=None, server_pid=None, warmup=0):
+    """Runs `call` with fixed concurrency. Returns a stats dict."""
+    for _ in range(warmup):
+        try:
+            call()
+        except Exception:
+            pass
+
+    latencies, statuses, errors = [], {}, {}
+    lock = threading.Lock()
+    issued = [0]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker():
+        while True:
+            with lock:
+                if deadline is None and issued[0] >= requests_total:
+                    return
+                issued[0] += 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            start = time.perf_counter()
+            try:
+                status = call()
+                key = str(status)
+            except Exception as e:
+                key = None
+                with lock:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            elapsed = time.perf_counter() - start
+            with lock:
+                if key is not None:
+                    statuses[key] = statuses.get(key, 0) + 1
+                    if key.startswith("2"):
+                        latencies.append(elapsed)
+
+    with MemorySampler(server_pid) as memory:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for _ in range(concurrency):
+                pool.submit(worker)
+        wall = time.perf_counter() - started
+
+    latencies.sort()
+    completed = sum(statuses.values())
+    ok = len(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": completed + sum(errors.values()),
+        "ok": ok,
+        "statuses": statuses,
+        "errors": errors,
+        "seconds": round(wall, 3),
+        "throughput_rps": round(ok / wall, 3) if wall > 0 else None,
+        "latency_s": {
+            "mean": round(sum(latencies) / ok, 4) if ok else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else None,
+        },
+        "memory": {
+            "server_rss_start": memory.start_rss,
+            "server_rss_peak": memory.peak,
+            "server_rss_end": getattr(memory, "end_rss", None),
+            # ru_maxrss is in KB on Linux
+            "loadgen_peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        },
+    }
+
+
+def format_stats(name, stats):
+    lat = stats["latency_s"]
+    fmt = lambda v: f"{v * 1000:.0f}ms" if v is not None else "-"
+    mem = stats["memory"]["server_rss_peak"]
+    mem = f", server peak RSS {mem / 1e6:.0f} MB" if mem else ""
+    errors = sum(stats["errors"].values()) + sum(v for k, v in stats["statuses"].items() if not k.startswith("2"))
+    return (f"{name}: c={stats['concurrency']} {stats['ok']}/{stats['requests']} ok, "
+            f"{stats['throughput_rps']} req/s, p50 {fmt(lat['p50'])} p95 {fmt(lat['p95'])} "
+            f"p99 {fmt(lat['p99'])}, {errors} errors{mem}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive /generate-texture (or the Blender bridge) under load.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="Backend base URL, e.g. http://127.0.0.1:8000")
+    target.add_argument("--blender", help="Blender bridge host:port")
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("-n", "--requests", type=int, default=100)
+    parser.add_argument("-d", "--duration", type=float, help="Run for N seconds instead of -n requests")
+    parser.add_argument("--file", help="Image to upload with each request")
+    parser.add_argument("--prompt", default="blue denim")
+    parser.add_argument("--same-prompt", action="store_true",
+                        help="Send identical requests (exercises coalescing instead of throughput)")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--server-pid", type=int, help="Backend pid, for RSS sampling")
+    parser.add_argument("--json", action="store_true", help="Print the raw stats as JSON")
+    args = parser.parse_args()
+
+    call = (texture_request(args.url, args.file, args.prompt, unique=not args.same_prompt) if args.url
+            else blender_request(args.blender))
+    stats = run_load(call, args.concurrency, args.requests, args.duration, args.server_pid, args.warmup)
+    print(json.dumps(stats, indent=2) if args.json else format_stats("load", stats))
+
+
+if __name__ == "__main__":
+    main()
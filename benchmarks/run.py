@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import fake_blender
+import fake_comfyui
+import history
+from loadgen import blender_request, format_stats, run_load, texture_request
+
+# Benchmark runner: starts the fake ComfyUI and fake Blender bridge, launches
+# the real backend (uvicorn server.main:app) against them in a scratch
+# directory, runs every scenario from scenarios.json through the load
+# generator and stores the numbers in benchmarks/results/ (see history.py).
+# With --compare the run is checked against the previous result (or
+# --baseline) and regressions beyond the threshold (thresholds.json "load",
+# or --threshold) are listed.
+#
+#   python benchmarks/run.py
+#   python benchmarks/run.py --only texture_upload_c8 --compare --fail-on-regression
+
+SCENARIOS_PATH = os.path.join(history.BENCH_DIR, "scenarios.json")
+
+DEFAULT_THRESHOLD = 0.10  # relative change that counts as a regression
+STARTUP_TIMEOUT = 30
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_thread_server(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Backend:
+    """The FastAPI backend in its own process, with uploads/outputs in a scratch dir."""
+
+    def __init__(self, comfy_address, workdir):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        env = dict(os.environ, COMFYUI_ADDRESS=comfy_address, PYTHONPATH=history.ROOT_DIR,
+                   ORCHID_TRACE_FILE=os.path.join(workdir, "traces", "spans.jsonl"))
+        self.log_path = os.path.join(workdir, "backend.log")
+        self._log = open(self.log_path, "w", encoding="utf-8")
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server.main:app", "--host", "127.0.0.1", "--port", str(self.port),
+             "--log-level", "warning"],
+            cwd=workdir, env=env, stdout=self._log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self):
+        deadline = time.time() + STARTUP_TIMEOUT
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                break
+            try:
+                with urllib.request.urlopen(self.url + "/", timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        self.stop()
+        with open(self.log_path, "r", encoding="utf-8", errors="replace") as f:
+            tail = f.read()[-3000:]
+        raise RuntimeError(f"Backend did not start:\n{tail}")
+
+    def stop(self):
+        if self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self._log.close()
+
+
+def run_scenarios(config, only=None):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="orchid_bench_") as workdir:
+        comfy_port, blender_port = free_port(), free_port()
+        comfy, _ = fake_comfyui.serve(port=comfy_port, **config.get("fake_comfyui", {}))
+        blender, _ = fake_blender.serve(port=blender_port, **config.get("fake_blender", {}))
+        start_thread_server(comfy)
+        start_thread_server(blender)
+
+        upload = os.path.join(workdir, "sample.png")
+        with open(upload, "wb") as f:
+            f.write(fake_comfyui.make_png(256))
+
+        backend = None
+        try:
+            for scenario in config["scenarios"]:
+                name = scenario["name"]
+                if only and name not in only:
+                    continue
+                if scenario["target"] == "blender":
+                    call = blender_request(f"127.0.0.1:{blender_port}")
+                    pid = None
+                else:
+                    if backend is None:
+                        backend = Backend(f"127.0.0.1:{comfy_port}", workdir)
+                        backend.wait_ready()
+                    # Unique prompts unless the scenario is about coalescing identical requests
+                    call = texture_request(backend.url, upload if scenario.get("upload") else None,
+                                           unique=not scenario.get("coalesce", False))
+                    pid = backend.proc.pid
+                stats = run_load(call, scenario.get("concurrency", 1), scenario.get("requests", 50),
+                                 scenario.get("duration"), pid, scenario.get("warmup", 2))
+                stats["scenario"] = scenario
+                results[name] = stats
+                print(format_stats(name, stats), flush=True)
+        finally:
+            if backend is not None:
+                backend.stop()
+            comfy.shutdown()
+            blender.shutdown()
+    return results
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Prints a comparison table. Returns the list of regressions."""
+    print(f"\nvs {history.describe(baseline)}")
+    metrics = [("throughput_rps", "higher"), ("p50", "lower"), ("p95", "lower"), ("p99", "lower"),
+               ("server_rss_peak", "lower")]
+    regressions = []
+    for name, stats in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old:
+            print(f"  {name}: no baseline")
+            continue
+        for metric, better in metrics:
+            def get(s):
+                if metric in s["latency_s"]:
+                    return s["latency_s"][metric]
+                if metric in s["memory"]:
+                    return s["memory"][metric]
+                return s.get(metric)
+            before, after = get(old), get(stats)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = change < -threshold if better == "higher" else change > threshold
+            flag = "  REGRESSION" if worse else ""
+            print(f"  {name:24s} {metric:16s} {before:>12.4g} -> {after:>12.4g} ({change:+.1%}){flag}")
+            if worse:
+                regressions.append((name, metric, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the backend benchmarks against fake ComfyUI / Blender.")
+    parser.add_argument("--scenarios", default=SCENARIOS_PATH)
+    parser.add_argument("--only", nargs="+", help="Scenario names to run")
+    parser.add_argument("--compare", action="store_true", help="Compare with the previous stored result")
+    parser.add_argument("--baseline", help="Result file to compare with (implies --compare)")
+    parser.add_argument("--threshold", type=float,
+                        default=history.thresholds("load").get("relative", DEFAULT_THRESHOLD))
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.scenarios, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    results = run_scenarios(config, args.only)
+
+    path = None
+    if not args.no_save:
+        path = history.save("load", {k: v for k, v in config.items() if k != "scenarios"}, results)
+        print(f"\nSaved {os.path.relpath(path, history.ROOT_DIR)}")
+
+    baseline_path = args.baseline or (history.previous("load", path) if args.compare else None)
+    if baseline_path:
+        baseline = history.load(baseline_path)
+        regressions = compare(baseline, {"results": results}, args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+    elif args.compare:
+        print("No earlier result to compare with")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 import React, { useEffect, useRef, useState } from 'react'
 import { Center, useGLTF, TransformControls, Html } from '@react-three/drei'
-import { useThree } from '@react-three/fiber'
+import { useFrame, useThree } from '@react-three/fiber'
 import * as THREE from 'three'
 import * as BufferGeometryUtils from 'three/examples/jsm/utils/BufferGeometryUtils.js'
 import { MODEL_CONFIG, AVAILABLE_CLOTHES } from '../config'
+import { attachVertexAnimation, loadVertexAnimation, VertexAnimation } from '../vertexAnimation'
 
 interface HumanModelProps {
   activeTab?: string
@@ -42,6 +43,18 @@ function ClothingModel({ url, params, scale }: { url: string, params?: Record<st
     clonedScene.traverse((child) => {
       if ((child as THREE.Mesh).isMesh && (child as THREE.Mesh).morphTargetInfluences) {
         const mesh = child as THREE.Mesh
+        // PCA-compressed morphs (scripts/pca_morphs.py): slider weights -> component weights
+        const basis = mesh.userData.morphBasis as { sliders: string[], matrix: number[][] } | undefined
+        if (basis && mesh.morphTargetInfluences) {
+          const influences = mesh.morphTargetInfluences
+          influences.fill(0)
+          basis.sliders.forEach((name, i) => {
+            const w = params[name]
+            if (!w) return
+            basis.matrix[i].forEach((m, c) => { influences[c] += w * m })
+          })
+          return
+        }
         Object.keys(params).forEach(key => {
           if (mesh.morphTargetDictionary && mesh.morphTargetDictionary.hasOwnProperty(key)) {
             const index = mesh.morphTargetDictionary[key]
@@ -54,6 +67,56 @@ function ClothingModel({ url, params, scale }: { url: string, params?: Record<st
     })
   }, [clonedScene, params])
 
+  // Pre-baked cloth motion (scripts/bake_vat.py): mesh extras.vertexAnimation -> VAT playback
+  const vatUpdaters = useRef<((seconds: number) => void)[]>([])
+  React.useEffect(() => {
+    let cancelled = false
+    // GLTFLoader copies mesh extras onto every primitive's THREE.Mesh (and the
+    // multi-primitive Group may carry them too): load each VAT file once and
+    // pick the primitive index from the mesh's place among its sibling primitives
+    const loads = new Map<string, Promise<VertexAnimation>>()
+    const attached = new Set<THREE.Mesh>()
+    const attach = (mesh: THREE.Mesh, file: string, primitive: number) => {
+      if (attached.has(mesh)) return
+      attached.add(mesh)
+      const vatUrl = new URL(file, new URL(url, window.location.href)).toString()
+      if (!loads.has(vatUrl)) loads.set(vatUrl, loadVertexAnimation(vatUrl))
+      loads.get(vatUrl)!
+        .then((vat) => {
+          if (cancelled) return
+          vatUpdaters.current.push(attachVertexAnimation(mesh, vat, primitive))
+        })
+        .catch((e) => console.warn('Vertex animation not loaded:', e))
+    }
+    const primitiveMeshes = (node: THREE.Object3D, file: string) =>
+      node.children.filter((c) => (c as THREE.Mesh).isMesh
+        && (c.userData.vertexAnimation === undefined || c.userData.vertexAnimation === file)) as THREE.Mesh[]
+
+    clonedScene.traverse((child) => {
+      const file = child.userData.vertexAnimation as string | undefined
+      if (!file) return
+      if ((child as THREE.Mesh).isMesh) {
+        const mesh = child as THREE.Mesh
+        const parent = mesh.parent
+        const parentFile = parent?.userData.vertexAnimation as string | undefined
+        // Primitives of one glTF mesh are siblings under the Group GLTFLoader creates
+        const siblings = parent && (parentFile === undefined || parentFile === file)
+          ? primitiveMeshes(parent, file).filter((c) => c.userData.vertexAnimation === file) : [mesh]
+        attach(mesh, file, Math.max(0, siblings.indexOf(mesh)))
+      } else {
+        primitiveMeshes(child, file).forEach((mesh, i) => attach(mesh, file, i))
+      }
+    })
+    return () => {
+      cancelled = true
+      vatUpdaters.current = []
+    }
+  }, [clonedScene, url])
+
+  useFrame(({ clock }) => {
+    vatUpdaters.current.forEach((update) => update(clock.elapsedTime))
+  })
+
   return <primitive object={clonedScene} scale={scale} />
 }
 
@@ -0,0 +1,114 @@
+import * as THREE from 'three'
+
+// 顶点动画纹理 (VAT) 播放: 数据由 scripts/bake_vat.py 烘焙
+// raw 模式每帧一块纹理行, 顶点着色器取相邻两帧插值;
+// pca 模式纹理里只有 k 个基, 每帧系数在 CPU 上插值后作为 uniform 传入.
+
+export interface VertexAnimationHeader {
+  version: number
+  mode: 'raw' | 'pca'
+  fps: number
+  frames: number
+  vertices: number
+  primitives: { first: number, count: number }[]
+  texture: { offset: number, length: number, width: number, height: number, rows_per_block: number, blocks: number }
+  decode: { min: number[][], max: number[][] }
+  coefficients?: { offset: number, length: number, components: number }
+  max_error: number
+  bin: string
+}
+
+export interface VertexAnimation {
+  header: VertexAnimationHeader
+  texture: THREE.DataTexture
+  coefficients: Float32Array | null
+}
+
+export async function loadVertexAnimation(url: string): Promise<VertexAnimation> {
+  const header: VertexAnimationHeader = await (await fetch(url)).json()
+  const binUrl = new URL(header.bin, new URL(url, window.location.href)).toString()
+  const data = await (await fetch(binUrl)).arrayBuffer()
+
+  // uint16 RGB -> float RGBA, 量化范围按块 (raw: 全部帧共用一个范围)
+  const { width, height, rows_per_block: rows, offset } = header.texture
+  const raw = new Uint16Array(data, offset, width * height * 3)
+  const pixels = new Float32Array(width * height * 4)
+  const blockSize = width * rows
+  for (let i = 0; i < width * height; i++) {
+    const range = header.mode === 'pca' ? Math.floor(i / blockSize) : 0
+    const lo = header.decode.min[range]
+    const hi = header.decode.max[range]
+    for (let c = 0; c < 3; c++) {
+      pixels[i * 4 + c] = lo[c] + (raw[i * 3 + c] / 65535) * (hi[c] - lo[c])
+    }
+  }
+  const texture = new THREE.DataTexture(pixels, width, height, THREE.RGBAFormat, THREE.FloatType)
+  texture.minFilter = THREE.NearestFilter
+  texture.magFilter = THREE.NearestFilter
+  texture.needsUpdate = true
+
+  let coefficients: Float32Array | null = null
+  if (header.coefficients) {
+    coefficients = new Float32Array(data.slice(header.coefficients.offset, header.coefficients.offset + header.coefficients.length))
+  }
+  return { header, texture, coefficients }
+}
+
+// 给一个网格 (glTF 的一个 primitive) 挂上 VAT, 返回每帧调用的 update(秒)
+export function attachVertexAnimation(mesh: THREE.Mesh, vat: VertexAnimation, primitive = 0) {
+  const { header } = vat
+  const components = header.coefficients?.components ?? 0
+  const uniforms = {
+    vatTexture: { value: vat.texture },
+    vatFirst: { value: header.primitives[primitive]?.first ?? 0 },
+    vatBlocks: { value: new THREE.Vector2(0, 0) },
+    vatMix: { value: 0 },
+    vatCoefficients: { value: new Array(Math.max(components, 1)).fill(0) },
+  }
+
+  const material = (mesh.material as THREE.Material).clone()
+  material.onBeforeCompile = (shader) => {
+    Object.assign(shader.uniforms, uniforms)
+    const { width, rows_per_block: rows } = header.texture
+    const fetch = `
+uniform sampler2D vatTexture;
+uniform float vatFirst;
+uniform vec2 vatBlocks;
+uniform float vatMix;
+${components ? `uniform float vatCoefficients[${components}];` : ''}
+vec3 vatFetch(float block, float index) {
+  float x = mod(index, ${width}.0);
+  float y = block * ${rows}.0 + floor(index / ${width}.0);
+  return texelFetch(vatTexture, ivec2(int(x), int(y)), 0).xyz;
+}
+`
+    const offset = components
+      ? `vec3 vatOffset = vec3(0.0);
+  for (int c = 0; c < ${components}; c++) vatOffset += vatCoefficients[c] * vatFetch(float(c), vatIndex);`
+      : `vec3 vatOffset = mix(vatFetch(vatBlocks.x, vatIndex), vatFetch(vatBlocks.y, vatIndex), vatMix);`
+    shader.vertexShader = fetch + shader.vertexShader.replace('#include <begin_vertex>', `#include <begin_vertex>
+  float vatIndex = vatFirst + float(gl_VertexID);
+  ${offset}
+  transformed += vatOffset;`)
+  }
+  material.customProgramCacheKey = () => `vat-${header.mode}-${components}-${header.texture.width}`
+  mesh.material = material
+  // 包围盒不再准确, 避免被视锥裁掉
+  mesh.frustumCulled = false
+
+  return (seconds: number) => {
+    const position = (seconds * header.fps) % header.frames
+    const a = Math.floor(position)
+    const b = (a + 1) % header.frames
+    const t = position - a
+    if (vat.coefficients) {
+      const coefficients = uniforms.vatCoefficients.value
+      for (let c = 0; c < components; c++) {
+        coefficients[c] = vat.coefficients[a * components + c] * (1 - t) + vat.coefficients[b * components + c] * t
+      }
+    } else {
+      uniforms.vatBlocks.value.set(a, b)
+      uniforms.vatMix.value = t
+    }
+  }
+}
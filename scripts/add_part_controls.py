@@ -1,7 +1,8 @@
-import socket
 import json
 import textwrap
 
+from blender_bridge import import_preamble, send_command
+
 HOST = '127.0.0.1'
 PORT = 9876
 
@@ -9,7 +10,7 @@ def create_controls():
     print("Connecting to Blender to add part controls...")
     
     # Python script to run INSIDE Blender
-    blender_script = textwrap.dedent("""
+    blender_script = import_preamble("shape_keys", "segmentation") + textwrap.dedent("""
     import bpy
     import math
 
@@ -44,109 +45,32 @@ def create_controls():
         # Clear existing groups
         obj.vertex_groups.clear()
         
-        vg_sleeve_l = obj.vertex_groups.new(name="Sleeve_L")
-        vg_sleeve_r = obj.vertex_groups.new(name="Sleeve_R")
-        vg_collar = obj.vertex_groups.new(name="Collar")
-        vg_torso = obj.vertex_groups.new(name="Torso")
-        
         # Get bounding box for relative thresholds
         # Note: dimensions are updated after rotation
-        bbox_min = [min(v.co[i] for v in obj.data.vertices) for i in range(3)]
-        bbox_max = [max(v.co[i] for v in obj.data.vertices) for i in range(3)]
-        
-        width = bbox_max[0] - bbox_min[0]
-        height = bbox_max[2] - bbox_min[2]
-        depth = bbox_max[1] - bbox_min[1]
-        
-        # Thresholds
-        x_limit = width * 0.25 # Sleeves are outer 25% on each side
-        z_collar_limit = bbox_max[2] - (height * 0.15) # Top 15%
-        
-        # Assign vertices
-        for v in obj.data.vertices:
-            co = v.co
-            
-            # Collar: High Z
-            if co.z > z_collar_limit:
-                vg_collar.add([v.index], 1.0, 'REPLACE')
-                continue
-                
-            # Sleeves: Outer X
-            if co.x > x_limit:
-                vg_sleeve_l.add([v.index], 1.0, 'REPLACE')
-            elif co.x < -x_limit:
-                vg_sleeve_r.add([v.index], 1.0, 'REPLACE')
-            else:
-                vg_torso.add([v.index], 1.0, 'REPLACE')
+        coords = shape_keys.read_coords(obj.data.vertices)
+        bbox_min = coords.min(axis=0).tolist()
+        bbox_max = coords.max(axis=0).tolist()
+        
+        # Part masks: Collar = top 15% of Z, Sleeves = outer 25% on each side,
+        # Torso = rest; blended over a small band at the boundaries.
+        # One bulk add() per group/weight level (see scripts/segmentation.py).
+        parts = segmentation.segment(coords, segmentation.shirt_rules(falloff=0.05))
+        weights = segmentation.assign_groups(obj, parts)
                 
         # 4. Add Shape Keys (Basis + Deformations)
-        if not obj.data.shape_keys:
-            obj.shape_key_add(name="Basis")
-            
-        # Helper to create scaling shape key
-        def add_scale_key(name, vg_name, scale_factor):
-            if name in obj.data.shape_keys.key_blocks:
-                obj.shape_key_remove(obj.data.shape_keys.key_blocks[name])
-            
-            key = obj.shape_key_add(name=name)
-            
-            # We need to manually set positions for the shape key
-            # Ideally we use 'from_mix' or manipulate data directly
-            # Simple approach: Scale vertices in the group
-            
-            # Calculate center of group for scaling
-            vs = [v for v in obj.data.vertices if obj.vertex_groups[vg_name].index in [g.group for g in v.groups]]
-            if not vs: return
-            
-            center = sum((v.co for v in vs), mathutils.Vector()) / len(vs)
-            
-            for v in vs:
-                # Get weight
-                w = 0
-                for g in v.groups:
-                    if g.group == obj.vertex_groups[vg_name].index:
-                        w = g.weight
-                        break
-                
-                # Apply scale relative to group center
-                delta = v.co - center
-                new_pos = center + delta * scale_factor
-                
-                # Blend based on weight
-                key.data[v.index].co = v.co.lerp(new_pos, w)
-                
-        # Need mathutils
-        import mathutils
-        
-        # Add Keys
-        # Sleeve Length: Scale X by 1.5
-        # Note: This simple scaling might distort. A better way involves moving them outward.
-        # Let's try simple Translation for length
+        # Deltas are computed in NumPy from the part weights and written back
+        # with foreach_set (see scripts/shape_keys.py).
+        base = shape_keys.basis_coords(obj)
         
-        def add_translation_key(name, vg_name, vec):
-             if name in obj.data.shape_keys.key_blocks:
-                obj.shape_key_remove(obj.data.shape_keys.key_blocks[name])
-             key = obj.shape_key_add(name=name)
-             vg_idx = obj.vertex_groups[vg_name].index
-             
-             for v in obj.data.vertices:
-                 w = 0
-                 for g in v.groups:
-                     if g.group == vg_idx:
-                         w = g.weight
-                         break
-                 if w > 0:
-                     key.data[v.index].co += mathutils.Vector(vec) * w
-
-        add_translation_key("Sleeve_L_Longer", "Sleeve_L", (0.2, 0, 0))
-        add_translation_key("Sleeve_R_Longer", "Sleeve_R", (-0.2, 0, 0))
+        # Sleeve Length: simple translation outward along X
+        shape_keys.add_translation_key(obj, "Sleeve_L_Longer", weights["Sleeve_L"], (0.2, 0, 0), base)
+        shape_keys.add_translation_key(obj, "Sleeve_R_Longer", weights["Sleeve_R"], (-0.2, 0, 0), base)
         
         # Collar Bigger (Scale from center of collar)
-        # We'll use the scale logic for collar
-        add_scale_key("Collar_Bigger", "Collar", 1.3)
+        shape_keys.add_scale_key(obj, "Collar_Bigger", weights["Collar"], 1.3, base)
         
         # Torso Wider
-        add_scale_key("Torso_Wider", "Torso", 1.3)
+        shape_keys.add_scale_key(obj, "Torso_Wider", weights["Torso"], 1.3, base)
 
         print("Shape Keys created.")
         
@@ -175,22 +99,8 @@ def create_controls():
     """)
     
     try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(10)
-        s.connect((HOST, PORT))
-        
-        payload = {
-            "type": "execute_code",
-            "params": {
-                "code": blender_script
-            }
-        }
-        s.sendall(json.dumps(payload).encode('utf-8'))
-        
-        # Wait for ack
-        resp = s.recv(4096)
-        print(f"Response: {resp.decode('utf-8')}")
-        s.close()
+        resp = send_command(blender_script, "blender.add_part_controls", HOST, PORT, timeout=10)
+        print(f"Response: {json.dumps(resp)}")
         
     except Exception as e:
         print(f"Error: {e}")
@@ -0,0 +1,296 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Incremental build of the client GLB assets.
+#
+# Each target in scripts/assets.json declares its script, input files,
+# parameters, outputs and required add-ons. A target's fingerprint hashes
+# all of that (script plus the helper modules it imports, input file
+# contents, parameters, Blender and add-on versions). Only targets whose
+# fingerprint changed, or whose outputs are missing, are rebuilt; targets
+# that don't depend on each other run in parallel in headless Blender.
+#
+#   python scripts/asset_build.py            # build what changed
+#   python scripts/asset_build.py --dry-run  # show what would be rebuilt
+#   python scripts/asset_build.py mpfb_scene --force -j 4
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SCRIPTS_DIR)
+CONFIG_PATH = os.path.join(SCRIPTS_DIR, "assets.json")
+STATE_PATH = os.path.join(ROOT_DIR, "cache", "asset_build", "state.json")
+LOG_DIR = os.path.join(ROOT_DIR, "cache", "asset_build", "logs")
+RUNNER = os.path.join(SCRIPTS_DIR, "blender_headless.py")
+
+# Build parameters are passed to the Blender script through this variable
+ENV_VAR = "ORCHID_BUILD"
+
+IMPORT_RE = re.compile(r"^\s*(?:from\s+(\w+)\s+import|import\s+(\w+))", re.M)
+PREAMBLE_RE = re.compile(r"import_preamble\(([^)]*)\)")
+
+
+def _abs(path):
+    return path if os.path.isabs(path) else os.path.join(ROOT_DIR, path)
+
+
+def file_digest(path, _memo={}):
+    """sha256 of a file, memoised on (path, size, mtime)."""
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    if key not in _memo:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        _memo[key] = h.hexdigest()
+    return _memo[key]
+
+
+def local_modules(script):
+    """The script plus every scripts/ module it imports, directly or via import_preamble()."""
+    seen = []
+    pending = [os.path.abspath(script)]
+    while pending:
+        path = pending.pop()
+        if path in seen or not os.path.exists(path):
+            continue
+        seen.append(path)
+        with open(path, "r", encoding="utf-8") as f:
+            source = f.read()
+        names = {a or b for a, b in IMPORT_RE.findall(source)}
+        for args in PREAMBLE_RE.findall(source):
+            names.update(re.findall(r"['\"](\w+)['\"]", args))
+        for name in names:
+            candidate = os.path.join(SCRIPTS_DIR, name + ".py")
+            if os.path.exists(candidate):
+                pending.append(candidate)
+    return sorted(seen)
+
+
+def tool_versions(blender, addons):
+    """Blender version string plus bl_info versions of the requested add-ons."""
+    if not addons:
+        addons = []
+    expr = (
+        "import bpy, addon_utils, json; "
+        f"wanted = {sorted(addons)!r}; "
+        "found = {m.__name__.split('.')[-1]: '.'.join(map(str, m.bl_info.get('version', ()))) "
+        "for m in addon_utils.modules()}; "
+        "print('ORCHID_VERSIONS ' + json.dumps({'blender': bpy.app.version_string, "
+        "'addons': {a: found.get(a) for a in wanted}}))"
+    )
+    cmd = [blender, "-b"] + ([] if addons else ["--factory-startup"]) + ["--python-expr", expr]
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True, timeout=120).stdout
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise RuntimeError(f"Could not run Blender ({blender}): {e}")
+    for line in out.splitlines():
+        if line.startswith("ORCHID_VERSIONS "):
+            return json.loads(line[len("ORCHID_VERSIONS "):])
+    raise RuntimeError("Could not read Blender version")
+
+
+class Target:
+    def __init__(self, name, spec):
+        self.name = name
+        self.script = _abs(spec["script"])
+        self.blend = _abs(spec["blend"]) if spec.get("blend") else None
+        self.inputs = [_abs(p) for p in spec.get("inputs", [])]
+        self.outputs = {k: _abs(v) for k, v in spec["outputs"].items()}
+        self.params = spec.get("params", {})
+        self.addons = spec.get("addons", [])
+        self.deps = set()
+
+    def source_files(self):
+        files = list(self.inputs)
+        if self.blend:
+            files.append(self.blend)
+        return files
+
+    def missing_inputs(self):
+        return [p for p in self.source_files() if not os.path.exists(p)]
+
+    def fingerprint(self, versions):
+        h = hashlib.sha256()
+        for path in local_modules(self.script):
+            h.update(os.path.relpath(path, ROOT_DIR).encode() + b"\0" + file_digest(path).encode())
+        for path in self.source_files():
+            h.update(os.path.relpath(path, ROOT_DIR).encode() + b"\0" + file_digest(path).encode())
+        h.update(json.dumps({
+            "params": self.params,
+            "outputs": sorted(os.path.relpath(p, ROOT_DIR) for p in self.outputs.values()),
+            "blender": versions.get("blender"),
+            "addons": {a: versions.get("addons", {}).get(a) for a in self.addons},
+        }, sort_keys=True).encode())
+        return h.hexdigest()
+
+
+def load_targets(config_path=CONFIG_PATH):
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    targets = {name: Target(name, spec) for name, spec in config["targets"].items()}
+
+    # A target depends on every target that produces one of its inputs
+    producers = {}
+    for t in targets.values():
+        for path in t.outputs.values():
+            producers[os.path.normcase(path)] = t.name
+    for t in targets.values():
+        for path in t.source_files():
+            dep = producers.get(os.path.normcase(path))
+            if dep and dep != t.name:
+                t.deps.add(dep)
+    return config, targets
+
+
+def load_state():
+    if os.path.exists(STATE_PATH):
+        with open(STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+    tmp = STATE_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, STATE_PATH)
+
+
+def is_stale(target, state, versions):
+    if any(not os.path.exists(p) for p in target.outputs.values()):
+        return True, None
+    fp = target.fingerprint(versions)
+    return state.get(target.name, {}).get("fingerprint") != fp, fp
+
+
+def run_target(blender, target):
+    """Runs one target in its own headless Blender process. Returns (ok, seconds, log path)."""
+    cmd = [blender, "-b"]
+    if target.blend:
+        cmd.append(target.blend)
+    cmd += ["--python-exit-code", "1", "--python", RUNNER, "--", target.script]
+
+    env = dict(os.environ)
+    env[ENV_VAR] = json.dumps({"target": target.name, "outputs": target.outputs,
+                               "inputs": target.inputs, "params": target.params})
+    for path in target.outputs.values():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    log_path = os.path.join(LOG_DIR, f"{target.name}.log")
+    started = time.time()
+    start = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.run(cmd, cwd=ROOT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    elapsed = time.perf_counter() - start
+    # Every output must exist and have been written by this run
+    ok = proc.returncode == 0 and all(
+        os.path.exists(p) and os.path.getmtime(p) >= started - 1 for p in target.outputs.values())
+    return ok, elapsed, log_path
+
+
+def build(selected=None, jobs=None, force=False, dry_run=False, config_path=CONFIG_PATH):
+    config, targets = load_targets(config_path)
+    blender = os.environ.get("BLENDER", config.get("blender", "blender"))
+
+    # Selected targets plus everything they depend on
+    wanted = set(selected or targets)
+    unknown = wanted - set(targets)
+    if unknown:
+        raise SystemExit(f"Unknown targets: {', '.join(sorted(unknown))}")
+    stack = list(wanted)
+    while stack:
+        for dep in targets[stack.pop()].deps:
+            if dep not in wanted:
+                wanted.add(dep)
+                stack.append(dep)
+
+    addons = sorted({a for n in wanted for a in targets[n].addons})
+    versions = tool_versions(blender, addons)
+    state = load_state()
+
+    done, failed, skipped = set(), set(), set()
+    pending = set(wanted)
+    running = {}
+    jobs = jobs or max(1, min(len(wanted), (os.cpu_count() or 2) // 2))
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for name in sorted(pending):
+                t = targets[name]
+                if t.deps & (failed | skipped):
+                    print(f"[skip] {name}: dependency failed")
+                    skipped.add(name)
+                    pending.discard(name)
+                    continue
+                if not t.deps <= done:
+                    continue
+                pending.discard(name)
+
+                missing = t.missing_inputs()
+                if missing:
+                    print(f"[skip] {name}: missing input {os.path.relpath(missing[0], ROOT_DIR)}")
+                    skipped.add(name)
+                    continue
+                stale, fp = is_stale(t, state, versions)
+                if not (stale or force):
+                    print(f"[ok]   {name}: up to date")
+                    done.add(name)
+                    continue
+                if dry_run:
+                    print(f"[dry]  {name}: would rebuild")
+                    done.add(name)
+                    continue
+                print(f"[run]  {name}")
+                running[pool.submit(run_target, blender, t)] = name
+
+            if not running:
+                if pending and not any(targets[n].deps <= done or targets[n].deps & (failed | skipped)
+                                       for n in pending):
+                    for name in sorted(pending):
+                        print(f"[skip] {name}: dependency cycle")
+                    skipped.update(pending)
+                    pending.clear()
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                name = running.pop(fut)
+                ok, elapsed, log_path = fut.result()
+                if ok:
+                    state[name] = {
+                        "fingerprint": targets[name].fingerprint(versions),
+                        "built_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                        "seconds": round(elapsed, 2),
+                    }
+                    save_state(state)
+                    done.add(name)
+                    print(f"[done] {name} ({elapsed:.1f}s)")
+                else:
+                    failed.add(name)
+                    print(f"[fail] {name} ({elapsed:.1f}s), see {os.path.relpath(log_path, ROOT_DIR)}")
+
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild client GLB assets whose inputs changed.")
+    parser.add_argument("targets", nargs="*", help="Targets to build (default: all)")
+    parser.add_argument("-j", "--jobs", type=int, help="Parallel Blender workers")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if up to date")
+    parser.add_argument("--dry-run", action="store_true", help="Only report stale targets")
+    parser.add_argument("--config", default=CONFIG_PATH)
+    args = parser.parse_args()
+    ok = build(args.targets, jobs=args.jobs, force=args.force, dry_run=args.dry_run, config_path=args.config)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
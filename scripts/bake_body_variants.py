@@ -0,0 +1,299 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+
+from glb_utils import Glb
+from garment_fit import vertex_normals, weld
+
+# Pre-bakes body parameter presets (height / weight sliders) into compact GLBs.
+#
+# For every point of the parameter grid in scripts/body_variants.json the
+# morph targets of the source body are evaluated once, the result is written
+# without any morph targets, and stored content-addressed (sha256 of the
+# bytes) next to an index.json. server/variants.py serves the nearest variant
+# for a request (or blends the neighbouring ones), so the client loads a
+# small static GLB instead of the full model with every target.
+#
+# Grid format, per model:
+#   "params": {"height": {"targets": {"height_incr": 1.0},
+#                         "negative_targets": {"height_decr": 1.0},
+#                         "values": [-1, -0.5, 0, 0.5, 1]}}
+# A parameter value v sets each of its targets to v * coefficient, or the
+# negative_targets to -v * coefficient when v < 0.
+#
+# Targets come from the source's morph targets. Sources exported without
+# shape keys (the bundled mpfb_body.glb is exported with export_apply) can
+# define simple stand-ins per model under "proxy_targets", measured from the
+# mesh bounds (glTF is Y up):
+#   "proxy_targets": {"height_incr": {"height": 0.1},   # stretch up from the feet by 10%
+#                     "weight_incr": {"girth": 0.15}}   # push out from the vertical axis by 15%
+# A morph target of the same name in the source takes precedence.
+#
+#   python scripts/bake_body_variants.py            # all models in the config
+#   python scripts/bake_body_variants.py man -o server/variants
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SCRIPTS_DIR)
+CONFIG_PATH = os.path.join(SCRIPTS_DIR, "body_variants.json")
+OUTPUT_DIR = os.path.join(ROOT_DIR, "server", "variants")
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def target_names(glb, mesh_index):
+    mesh = glb.gltf["meshes"][mesh_index]
+    names = mesh.get("extras", {}).get("targetNames", [])
+    count = len(mesh["primitives"][0].get("targets", []))
+    return list(names) + [f"target_{i}" for i in range(len(names), count)]
+
+
+def add_proxy_targets(glb, proxies):
+    """Appends the "proxy_targets" of the config to every mesh that lacks them.
+
+    Returns the names that were added. Deltas are relative to the mesh bounds:
+    "height" stretches along Y from the lowest vertex, "girth" scales X/Z
+    away from the centre of the bounds.
+    """
+    added = set()
+    for mesh_index, mesh in enumerate(glb.gltf.get("meshes", [])):
+        names = target_names(glb, mesh_index)
+        todo = [(name, spec) for name, spec in sorted(proxies.items()) if name not in names]
+        if not todo:
+            continue
+        positions = [glb.read_accessor(prim["attributes"]["POSITION"]).astype(np.float64)
+                     for prim in mesh["primitives"]]
+        stacked = np.concatenate(positions)
+        lo, hi = stacked.min(axis=0), stacked.max(axis=0)
+        center = (lo + hi) / 2
+        for prim, pos in zip(mesh["primitives"], positions):
+            targets = prim.setdefault("targets", [])
+            for _, spec in todo:
+                delta = np.zeros_like(pos)
+                delta[:, 1] = (pos[:, 1] - lo[1]) * spec.get("height", 0.0)
+                delta[:, [0, 2]] = (pos[:, [0, 2]] - center[[0, 2]]) * spec.get("girth", 0.0)
+                targets.append({"POSITION": glb.add_accessor(delta.astype(np.float32), with_bounds=True)})
+        mesh.setdefault("extras", {})["targetNames"] = names + [name for name, _ in todo]
+        if "weights" in mesh:
+            mesh["weights"] = list(mesh["weights"]) + [0.0] * len(todo)
+        added.update(name for name, _ in todo)
+    return sorted(added)
+
+
+def target_weights(spec, value):
+    """{target name: weight} for one parameter value."""
+    if value >= 0:
+        return {name: value * coef for name, coef in spec.get("targets", {}).items()}
+    if "negative_targets" in spec:
+        return {name: -value * coef for name, coef in spec["negative_targets"].items()}
+    return {name: value * coef for name, coef in spec.get("targets", {}).items()}
+
+
+def _strip_morphs(gltf):
+    """Removes morph targets, their weights/names and weight animation channels."""
+    for mesh in gltf.get("meshes", []):
+        for prim in mesh["primitives"]:
+            prim.pop("targets", None)
+        mesh.pop("weights", None)
+        mesh.get("extras", {}).pop("targetNames", None)
+    for node in gltf.get("nodes", []):
+        node.pop("weights", None)
+
+    animations = []
+    for anim in gltf.get("animations", []):
+        channels = [c for c in anim["channels"] if c.get("target", {}).get("path") != "weights"]
+        if not channels:
+            continue
+        used = sorted({c["sampler"] for c in channels})
+        remap = {old: new for new, old in enumerate(used)}
+        for c in channels:
+            c["sampler"] = remap[c["sampler"]]
+        anim["channels"] = channels
+        anim["samplers"] = [anim["samplers"][i] for i in used]
+        animations.append(anim)
+    if animations:
+        gltf["animations"] = animations
+    else:
+        gltf.pop("animations", None)
+
+
+def bake(source, weights_by_name):
+    """New Glb with `weights_by_name` applied to every mesh and all morph targets removed."""
+    glb = Glb(json.loads(json.dumps(source.gltf)), bytes(source.bin))
+    gltf = glb.gltf
+    for mesh_index, mesh in enumerate(gltf.get("meshes", [])):
+        if not mesh["primitives"][0].get("targets"):
+            continue
+        names = target_names(glb, mesh_index)
+        # Rewritten even for all-zero weights so every variant has the same layout
+        w = np.array([weights_by_name.get(n, 0.0) for n in names], dtype=np.float64)
+        for prim in mesh["primitives"]:
+            targets = prim.get("targets", [])
+            attrs = prim["attributes"]
+            pos = glb.read_accessor(attrs["POSITION"]).astype(np.float64)
+            for wi, target in zip(w, targets):
+                if wi and "POSITION" in target:
+                    pos += wi * glb.read_accessor(target["POSITION"])
+            attrs["POSITION"] = glb.add_accessor(pos.astype(np.float32), with_bounds=True)
+
+            if "NORMAL" not in attrs:
+                continue
+            if all("NORMAL" in t for t in targets):
+                nrm = glb.read_accessor(attrs["NORMAL"]).astype(np.float64)
+                for wi, target in zip(w, targets):
+                    if wi:
+                        nrm += wi * glb.read_accessor(target["NORMAL"])
+                nrm /= np.maximum(np.linalg.norm(nrm, axis=1, keepdims=True), 1e-12)
+            elif prim.get("mode", 4) == 4 and "indices" in prim:
+                # No normal deltas exported: recompute, welded so UV seams stay smooth
+                welded, inverse = weld(pos)
+                faces = inverse[glb.read_accessor(prim["indices"])[:, 0].astype(np.int64).reshape(-1, 3)]
+                nrm = vertex_normals(welded, faces)[inverse]
+            else:
+                continue
+            attrs["NORMAL"] = glb.add_accessor(nrm.astype(np.float32))
+    _strip_morphs(gltf)
+    glb.repack()
+    return glb
+
+
+def blend_layout(glb):
+    """Byte ranges of the POSITION/NORMAL data inside the BIN chunk.
+
+    The server blends neighbouring variants by interpolating these ranges.
+    Positions match baking the in-between weights (morph targets are linear);
+    normals are the renormalised blend of the corner normals, an
+    approximation that improves with a denser grid.
+    """
+    layout = []
+    for mesh in glb.gltf.get("meshes", []):
+        for prim in mesh["primitives"]:
+            for name in ("POSITION", "NORMAL"):
+                index = prim["attributes"].get(name)
+                if index is None:
+                    continue
+                acc = glb.gltf["accessors"][index]
+                view = glb.gltf["bufferViews"][acc["bufferView"]]
+                if view.get("byteStride", 12) != 12 or acc["componentType"] != 5126:
+                    continue
+                layout.append({
+                    "accessor": index,
+                    "attribute": name,
+                    "offset": view.get("byteOffset", 0) + acc.get("byteOffset", 0),
+                    "count": acc["count"],
+                })
+    return layout
+
+
+def bake_model(name, spec, out_dir=OUTPUT_DIR, force=False, log=print):
+    """Bakes one model's grid into out_dir/<name>/ and rewrites its index.json."""
+    source_path = spec["source"] if os.path.isabs(spec["source"]) else os.path.join(ROOT_DIR, spec["source"])
+    with open(source_path, "rb") as f:
+        source_sha = _sha256(f.read())
+    source = Glb.load(source_path)
+    proxies = spec.get("proxy_targets", {})
+    if proxies:
+        added = add_proxy_targets(source, proxies)
+        if added:
+            log(f"  {name}: proxy targets {added}")
+
+    available = set()
+    for mesh_index, _ in enumerate(source.gltf.get("meshes", [])):
+        available.update(target_names(source, mesh_index))
+    params = spec["params"]
+    wanted = {t for p in params.values() for key in ("targets", "negative_targets") for t in p.get(key, {})}
+    missing = sorted(wanted - available)
+    if missing:
+        raise ValueError(f"{name}: morph targets {missing} not in {spec['source']} "
+                         f"(available: {sorted(available) or 'none'})")
+
+    model_dir = os.path.join(out_dir, name)
+    os.makedirs(model_dir, exist_ok=True)
+    index_path = os.path.join(model_dir, "index.json")
+    previous = {}
+    if os.path.exists(index_path) and not force:
+        with open(index_path, "r", encoding="utf-8") as f:
+            previous = {v["key"]: v for v in json.load(f).get("variants", [])}
+
+    names = sorted(params)
+    variants = []
+    for values in itertools.product(*(params[p]["values"] for p in names)):
+        point = dict(zip(names, values))
+        weights = {}
+        for p, v in point.items():
+            for t, w in target_weights(params[p], v).items():
+                weights[t] = weights.get(t, 0.0) + w
+        key = _sha256(json.dumps({"source": source_sha, "proxies": proxies, "weights": weights},
+                                 sort_keys=True).encode())[:24]
+
+        old = previous.get(key)
+        if old and os.path.exists(os.path.join(model_dir, old["file"])):
+            variants.append(dict(old, params=point))
+            continue
+
+        glb = bake(source, weights)
+        data = glb.to_bytes()
+        sha = _sha256(data)
+        file_name = f"{sha[:16]}.glb"
+        path = os.path.join(model_dir, file_name)
+        if not os.path.exists(path):
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+        variants.append({"key": key, "params": point, "file": file_name, "sha256": sha,
+                         "size": len(data), "blend": blend_layout(glb)})
+        log(f"  {name} {point}: {len(data) / 1024:.1f} KB")
+
+    index = {
+        "model": name,
+        "source": spec["source"],
+        "source_sha256": source_sha,
+        "params": {p: sorted(params[p]["values"]) for p in names},
+        "variants": variants,
+    }
+    with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    os.replace(index_path + ".tmp", index_path)
+
+    # Drop variant files no longer referenced by the grid, and the server's
+    # blended variants (they are rebuilt from the new grid on demand)
+    referenced = {v["file"] for v in variants}
+    for entry in os.listdir(model_dir):
+        if entry.endswith(".glb") and entry not in referenced:
+            os.remove(os.path.join(model_dir, entry))
+    shutil.rmtree(os.path.join(model_dir, "blended"), ignore_errors=True)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bake body parameter presets into content-addressed GLBs.")
+    parser.add_argument("models", nargs="*", help="Models from the config (default: all)")
+    parser.add_argument("-c", "--config", default=CONFIG_PATH)
+    parser.add_argument("-o", "--out-dir", default=OUTPUT_DIR)
+    parser.add_argument("--force", action="store_true", help="Rebake every variant")
+    args = parser.parse_args()
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    unknown = [name for name in args.models if name not in config["models"]]
+    if unknown:
+        parser.error(f"unknown models {unknown} (config has {sorted(config['models'])})")
+    for name in args.models or sorted(config["models"]):
+        try:
+            index = bake_model(name, config["models"][name], args.out_dir, force=args.force)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        total = sum(v["size"] for v in index["variants"])
+        print(f"{name}: {len(index['variants'])} variants, {total / 1024:.1f} KB total")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+import argparse
+import json
+import math
+import os
+import sys
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+import asset_build
+from glb_utils import Glb
+from pca_morphs import choose_rank
+
+# Vertex animation textures (VAT) for pre-baked cloth motion.
+#
+# scripts/sample_vertex_animation.py samples the animated / simulated garment
+# per frame in headless Blender; this script matches those samples to the
+# GLB vertices and stores the per-vertex offsets from the rest pose as
+#
+#   raw: one uint16 RGB texture row block per frame, quantised per axis
+#   pca: offsets ~= coefficients (frames x k) @ basis (k x vertices), only the
+#        k basis blocks go into the texture, the coefficients are a small
+#        float32 table (motion is very correlated over time, k << frames)
+#
+# Output, next to a copy of the GLB (mesh extras.vertexAnimation points at it):
+#   <stem>.vat.json   layout, decode ranges, fps, measured max error, size
+#   <stem>.vat.bin    texture data (+ coefficients)
+# The client (client/src/vertexAnimation.ts) plays it back with one or k
+# texture fetches per vertex in the vertex shader.
+#
+#   python scripts/bake_vat.py shirt.glb samples.npz -o client/public/models
+#   python scripts/bake_vat.py shirt.glb --blend scenes/cloth.blend --object Shirt -o ...
+
+CACHE_DIR = os.path.join(asset_build.ROOT_DIR, "cache", "vat")
+SAMPLER = os.path.join(asset_build.SCRIPTS_DIR, "sample_vertex_animation.py")
+
+DEFAULT_MAX_ERROR = 0.001  # metres, any vertex, any frame (besides quantisation)
+DEFAULT_TEXTURE_WIDTH = 1024
+MAX_TEXTURE_SIZE = 4096  # safe on WebGL2 everywhere
+MAP_TOLERANCE = 1e-4
+
+
+def load_samples(path):
+    data = np.load(path)
+    return data["rest"].astype(np.float64), data["frames"].astype(np.float64), float(data["fps"])
+
+
+def sample_blend(blend, obj, frame_start=None, frame_end=None, step=1, blender=None):
+    """Runs the Blender sampler for one object. Returns the .npz path."""
+    params = {"object": obj, "step": step}
+    if frame_start is not None:
+        params["frame_start"] = frame_start
+    if frame_end is not None:
+        params["frame_end"] = frame_end
+    stem = os.path.splitext(os.path.basename(blend))[0]
+    out_path = os.path.join(CACHE_DIR, f"{stem}_{obj}.npz")
+    target = asset_build.Target(f"vat_{stem}_{obj}", {
+        "script": SAMPLER,
+        "blend": blend,
+        "outputs": {"frames": out_path},
+        "params": params,
+    })
+    ok, _, log_path = asset_build.run_target(blender or os.environ.get("BLENDER", "blender"), target)
+    if not ok:
+        raise RuntimeError(f"Blender sampling failed, see {log_path}")
+    return out_path
+
+
+def find_mesh(glb, name=None):
+    """Mesh index by mesh/node name, or the mesh with the most vertices."""
+    gltf = glb.gltf
+    meshes = gltf.get("meshes", [])
+    if name:
+        for node in gltf.get("nodes", []):
+            if node.get("name") == name and "mesh" in node:
+                return node["mesh"]
+        for i, mesh in enumerate(meshes):
+            if mesh.get("name") == name:
+                return i
+        raise ValueError(f"No mesh named '{name}'")
+    if not meshes:
+        raise ValueError("GLB contains no mesh")
+    counts = [sum(gltf["accessors"][p["attributes"]["POSITION"]]["count"] for p in m["primitives"]) for m in meshes]
+    return int(np.argmax(counts))
+
+
+def vertex_map(glb, mesh, rest):
+    """Sample vertex per GLB vertex (the exporter splits vertices at seams) and the primitive layout."""
+    positions, layout, first = [], [], 0
+    for prim in mesh["primitives"]:
+        p = glb.read_accessor(prim["attributes"]["POSITION"]).astype(np.float64)
+        positions.append(p)
+        layout.append({"first": first, "count": len(p)})
+        first += len(p)
+    positions = np.concatenate(positions)
+    dist, index = cKDTree(rest).query(positions)
+    extent = float(np.ptp(rest, axis=0).max()) or 1.0
+    if dist.max() > MAP_TOLERANCE * extent:
+        raise ValueError(f"GLB does not match the sampled mesh (max distance {dist.max():.2e}); "
+                         "re-export the GLB from the same object")
+    return index, layout
+
+
+def quantize(values, lo, hi):
+    scale = np.where(hi > lo, hi - lo, 1.0)
+    return np.round((values - lo) / scale * 65535).astype(np.uint16)
+
+
+def dequantize(q, lo, hi):
+    return lo + q.astype(np.float64) / 65535 * (hi - lo)
+
+
+def texture_layout(n_vertices, n_blocks, width=DEFAULT_TEXTURE_WIDTH):
+    """(width, rows per block) so the whole texture stays within MAX_TEXTURE_SIZE."""
+    width = min(width, max(1, n_vertices))
+    while math.ceil(n_vertices / width) * n_blocks > MAX_TEXTURE_SIZE and width < MAX_TEXTURE_SIZE:
+        width *= 2
+    rows = math.ceil(n_vertices / width)
+    if rows * n_blocks > MAX_TEXTURE_SIZE:
+        raise ValueError(f"{n_blocks} blocks of {n_vertices} vertices do not fit a "
+                         f"{MAX_TEXTURE_SIZE}x{MAX_TEXTURE_SIZE} texture; use pca mode or fewer frames")
+    return width, rows
+
+
+def _texture_bytes(blocks, width, rows):
+    """(B, V, 3) uint16 -> padded (B * rows, width, 3) texture bytes."""
+    padded = np.zeros((len(blocks), rows * width, 3), dtype=np.uint16)
+    padded[:, :blocks.shape[1]] = blocks
+    return padded.tobytes()
+
+
+def encode_raw(offsets):
+    lo, hi = offsets.min(axis=(0, 1)), offsets.max(axis=(0, 1))
+    q = quantize(offsets, lo, hi)
+    decoded = dequantize(q, lo, hi)
+    return {"blocks": q, "min": [lo.tolist()], "max": [hi.tolist()], "decoded": decoded}
+
+
+def encode_pca(offsets, max_error=DEFAULT_MAX_ERROR, max_components=None):
+    n_frames = len(offsets)
+    d = offsets.reshape(n_frames, -1)
+    u, s, vt = np.linalg.svd(d, full_matrices=False)
+    rank = int((s > s[0] * 1e-9).sum()) if len(s) and s[0] > 0 else 0
+    u, s, vt = u[:, :rank], s[:rank], vt[:rank]
+    k, _ = choose_rank(u, s, vt, offsets, max_error)
+    if max_components is not None:
+        k = min(k, max_components)
+    k = max(k, 1)
+
+    basis = vt[:k].reshape(k, -1, 3)
+    coefficients = (u[:, :k] * s[:k]).astype(np.float32)
+    lo, hi = basis.min(axis=1), basis.max(axis=1)
+    q = np.stack([quantize(basis[c], lo[c], hi[c]) for c in range(k)])
+    decoded_basis = np.stack([dequantize(q[c], lo[c], hi[c]) for c in range(k)])
+    decoded = np.einsum("fk,kvc->fvc", coefficients.astype(np.float64), decoded_basis)
+    return {"blocks": q, "min": lo.tolist(), "max": hi.tolist(), "coefficients": coefficients, "decoded": decoded}
+
+
+def encoded_size(mode, n_frames, n_vertices, k=0, width=DEFAULT_TEXTURE_WIDTH):
+    """Bytes of the .vat.bin as bake() writes it: the padded texture (see
+    texture_layout) plus, for pca, the coefficient table. Raises ValueError
+    when the blocks do not fit a texture."""
+    blocks = n_frames if mode == "raw" else k
+    tex_width, rows = texture_layout(n_vertices, blocks, width)
+    size = blocks * rows * tex_width * 6
+    size += -size % 4
+    if mode == "pca":
+        size += n_frames * k * 4
+    return size
+
+
+def max_components(n_frames, n_vertices, max_bytes, width=DEFAULT_TEXTURE_WIDTH):
+    """Most PCA components whose .vat.bin fits max_bytes (0 if not even one does)."""
+    k = 0
+    while k < n_frames:
+        try:
+            if encoded_size("pca", n_frames, n_vertices, k + 1, width) > max_bytes:
+                break
+        except ValueError:
+            break
+        k += 1
+    return k
+
+
+def bake(glb_path, samples_path, out_dir, mode="auto", max_error=DEFAULT_MAX_ERROR, max_bytes=None,
+         mesh_name=None, texture_width=DEFAULT_TEXTURE_WIDTH):
+    """Writes <stem>.glb, <stem>.vat.json and <stem>.vat.bin into out_dir. Returns the header."""
+    rest, frames, fps = load_samples(samples_path)
+    glb = Glb.load(glb_path)
+    mesh_index = find_mesh(glb, mesh_name)
+    mesh = glb.gltf["meshes"][mesh_index]
+    index, layout = vertex_map(glb, mesh, rest)
+    offsets = frames[:, index] - rest[index]
+    n_frames, n_vertices = offsets.shape[:2]
+
+    components = None
+    if max_bytes is not None and mode != "raw":
+        components = max_components(n_frames, n_vertices, max_bytes, texture_width)
+        if components < 1:
+            raise ValueError(f"{max_bytes} bytes cannot hold even one component")
+    if mode == "auto":
+        encoded = encode_pca(offsets, max_error, components)
+        k = len(encoded["blocks"])
+        try:
+            raw_size = encoded_size("raw", n_frames, n_vertices, width=texture_width)
+        except ValueError:
+            raw_size = None  # too many frames for one texture
+        if raw_size is not None and raw_size <= encoded_size("pca", n_frames, n_vertices, k, texture_width) and \
+                (max_bytes is None or raw_size <= max_bytes):
+            mode, encoded = "raw", encode_raw(offsets)
+        else:
+            mode = "pca"
+    elif mode == "pca":
+        encoded = encode_pca(offsets, max_error, components)
+    else:
+        raw_size = encoded_size("raw", n_frames, n_vertices, width=texture_width)
+        if max_bytes is not None and raw_size > max_bytes:
+            raise ValueError(f"Raw VAT needs {raw_size} bytes (> {max_bytes})")
+        encoded = encode_raw(offsets)
+
+    blocks = encoded["blocks"]
+    width, rows = texture_layout(n_vertices, len(blocks), texture_width)
+    texture = _texture_bytes(blocks, width, rows)
+    data = bytearray(texture)
+    data += b"\x00" * (-len(data) % 4)
+    error = float(np.linalg.norm(encoded["decoded"] - offsets, axis=2).max())
+
+    stem = os.path.splitext(os.path.basename(glb_path))[0]
+    header = {
+        "version": 1,
+        "mesh": mesh.get("name", f"mesh_{mesh_index}"),
+        "mode": mode,
+        "fps": fps,
+        "frames": n_frames,
+        "vertices": n_vertices,
+        "primitives": layout,
+        "texture": {"offset": 0, "length": len(texture), "width": width,
+                    "height": rows * len(blocks), "rows_per_block": rows, "blocks": len(blocks)},
+        "decode": {"min": encoded["min"], "max": encoded["max"]},
+        "max_error": error,
+        "bin": f"{stem}.vat.bin",
+    }
+    if mode == "pca":
+        coefficients = encoded["coefficients"].tobytes()
+        header["coefficients"] = {"offset": len(data), "length": len(coefficients), "components": len(blocks)}
+        data += coefficients
+    header["bytes"] = len(data)
+    assert max_bytes is None or len(data) <= max_bytes, f"{len(data)} bytes > --max-bytes {max_bytes}"
+
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, header["bin"]), "wb") as f:
+        f.write(data)
+    with open(os.path.join(out_dir, f"{stem}.vat.json"), "w", encoding="utf-8") as f:
+        json.dump(header, f, indent=2)
+
+    # The client finds the animation through the mesh extras
+    mesh.setdefault("extras", {})["vertexAnimation"] = f"{stem}.vat.json"
+    glb.save(os.path.join(out_dir, f"{stem}.glb"))
+    return header
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bake per-frame garment motion into a vertex animation texture.")
+    parser.add_argument("glb", help="Garment GLB (same mesh as the sampled object)")
+    parser.add_argument("samples", nargs="?", help=".npz from sample_vertex_animation.py")
+    parser.add_argument("-o", "--output", required=True, help="Output directory")
+    parser.add_argument("--blend", help="Sample this .blend in headless Blender first")
+    parser.add_argument("--object", help="Animated object in --blend (also selects the GLB mesh)")
+    parser.add_argument("--frames", type=int, nargs=2, metavar=("START", "END"))
+    parser.add_argument("--step", type=int, default=1, help="Sample every Nth frame")
+    parser.add_argument("--mode", choices=("auto", "raw", "pca"), default="auto")
+    parser.add_argument("--max-error", type=float, default=DEFAULT_MAX_ERROR,
+                        help="PCA truncation bound per vertex (model units)")
+    parser.add_argument("--max-bytes", type=int, help="Upper bound on the .vat.bin size")
+    args = parser.parse_args()
+
+    samples = args.samples
+    if args.blend:
+        if not args.object:
+            parser.error("--blend needs --object")
+        start, end = args.frames or (None, None)
+        samples = sample_blend(args.blend, args.object, start, end, args.step)
+    elif not samples:
+        parser.error("give a samples .npz or --blend")
+
+    try:
+        header = bake(args.glb, samples, args.output, args.mode, args.max_error, args.max_bytes, args.object)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    extra = f", {header['coefficients']['components']} components" if header["mode"] == "pca" else ""
+    print(f"{header['frames']} frames x {header['vertices']} vertices -> {header['mode']}{extra}, "
+          f"{header['bytes'] / 1024:.1f} KB, {header['texture']['width']}x{header['texture']['height']} texture, "
+          f"max error {header['max_error'] * 1000:.3f} mm")
+
+
+if __name__ == "__main__":
+    main()
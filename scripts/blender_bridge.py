@@ -0,0 +1,92 @@
+import importlib.util
+import json
+import os
+import socket
+import sys
+import time
+
+# Helpers for the scripts that drive Blender over the socket bridge (port 9876).
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__)).replace("\\", "/")
+SERVER_DIR = os.path.join(os.path.dirname(SCRIPTS_DIR), "server")
+
+HOST = "127.0.0.1"
+PORT = 9876
+CONNECT_TIMEOUT = 5
+
+
+def _load_tracing():
+    # server/tracing.py only needs the standard library; load it by path so
+    # the rest of server/ doesn't end up on sys.path
+    if "orchid_tracing" not in sys.modules:
+        spec = importlib.util.spec_from_file_location("orchid_tracing", os.path.join(SERVER_DIR, "tracing.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["orchid_tracing"] = module
+        spec.loader.exec_module(module)
+    return sys.modules["orchid_tracing"]
+
+
+tracing = _load_tracing()
+
+
+def import_preamble(*modules):
+    """Python source that makes helper modules from scripts/ importable inside Blender.
+
+    Prepend it to the code sent to Blender. Modules are reloaded so edits are
+    picked up without restarting the Blender session.
+    """
+    lines = [
+        "import sys",
+        "import importlib",
+        f"if r'{SCRIPTS_DIR}' not in sys.path:",
+        f"    sys.path.insert(0, r'{SCRIPTS_DIR}')",
+    ]
+    for name in modules:
+        lines.append(f"import {name}")
+        lines.append(f"importlib.reload({name})")
+    return "\n".join(lines) + "\n"
+
+
+def _recv_json(sock, span):
+    """Reads until the buffered bytes form one JSON document (or the peer closes)."""
+    chunks, waited_since = [], time.perf_counter()
+    while True:
+        chunk = sock.recv(65536)
+        if not chunks:
+            # Time Blender spent running the code before answering
+            span.add_event("first_byte", wait_s=round(time.perf_counter() - waited_since, 4))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        try:
+            return json.loads(b"".join(chunks).decode("utf-8"))
+        except ValueError:
+            continue
+    data = b"".join(chunks).decode("utf-8", errors="replace")
+    if not data:
+        raise ConnectionError("Blender closed the connection without a response")
+    return {"status": "error", "message": "Unparseable response", "raw": data}
+
+
+def send_command(code, name=None, host=HOST, port=PORT, timeout=None):
+    """Runs `code` in Blender over the socket bridge and returns the decoded response.
+
+    Every call is a tracing span (blender.execute_code, or `name`) with
+    connect / sent / first_byte events, so a slow bpy operation or a stalled
+    recv shows up in traces/spans.jsonl. `timeout` bounds the whole wait for
+    the answer (None = wait forever, as heavy scene builds can take minutes).
+    """
+    attributes = {"net.peer.name": host, "net.peer.port": port, "blender.code_bytes": len(code)}
+    with tracing.span(name or "blender.execute_code", "client", **attributes) as span:
+        with socket.create_connection((host, port), timeout=CONNECT_TIMEOUT) as sock:
+            span.add_event("connected")
+            sock.settimeout(timeout)
+            payload = json.dumps({"type": "execute_code", "params": {"code": code}}).encode("utf-8")
+            sock.sendall(payload)
+            span.add_event("sent", bytes=len(payload))
+            response = _recv_json(sock, span)
+        status = response.get("status") if isinstance(response, dict) else None
+        span.set_attribute("blender.status", status)
+        if status not in ("success", None):
+            span.status, span.status_message = tracing.STATUS_ERROR, str(response.get("message", ""))
+        return response
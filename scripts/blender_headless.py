@@ -0,0 +1,48 @@
+import json
+import os
+import runpy
+import sys
+import traceback
+
+# Entry point for headless Blender workers:
+#
+#   blender -b [scene.blend] --python scripts/blender_headless.py -- scripts/some_script.py
+#
+# Socket-driven scripts (remote_create_*.py) keep their Blender code in a
+# BLENDER_SCRIPT string; it is executed here in-process instead of being sent
+# to port 9876. Plain bpy scripts (resize_clothing.py, ...) are run as
+# __main__. Build parameters arrive in the ORCHID_BUILD environment variable.
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    if not argv:
+        print("Usage: blender -b --python blender_headless.py -- <script.py>")
+        sys.exit(2)
+    script = os.path.abspath(argv[0])
+
+    with open(script, "r", encoding="utf-8") as f:
+        is_remote = "BLENDER_SCRIPT" in f.read()
+    try:
+        if is_remote:
+            code = runpy.run_path(script, run_name="__orchid_build__")["BLENDER_SCRIPT"]
+            scope = {"__name__": "__orchid_build__"}
+            exec(compile(code, script + ":BLENDER_SCRIPT", "exec"), scope)
+            result = scope.get("result") or {"status": "success"}
+        else:
+            runpy.run_path(script, run_name="__main__")
+            result = {"status": "success"}
+    except SystemExit as e:
+        result = {"status": "success" if not e.code else "error", "message": f"exit {e.code}"}
+    except Exception as e:
+        result = {"status": "error", "message": str(e), "trace": traceback.format_exc()}
+
+    print("ORCHID_BUILD_RESULT " + json.dumps(result))
+    sys.exit(0 if result.get("status") == "success" else 1)
+
+
+main()
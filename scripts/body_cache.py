@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+
+# Base-body .blend snapshots (runs INSIDE Blender).
+#
+# bpy.ops.mpfb.create_human() is the slowest step of every garment build.
+# load_body() builds each body preset once, writes the resulting objects to
+# cache/bodies/<key>.blend with bpy.data.libraries.write, and afterwards
+# appends that snapshot instead of generating the human again. The key covers
+# the preset parameters plus the Blender and add-on versions, so upgrading
+# MPFB/MB-Lab invalidates old snapshots automatically.
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "bodies")
+
+
+def addon_version(module_name):
+    """bl_info version of an installed add-on (e.g. "mpfb"), or None."""
+    import addon_utils
+
+    for mod in addon_utils.modules():
+        if mod.__name__ == module_name or mod.__name__.endswith("." + module_name):
+            return ".".join(str(v) for v in mod.bl_info.get("version", ()))
+    return None
+
+
+def preset_descriptor(preset, addon="mpfb"):
+    """Preset parameters plus everything else that changes the generated body."""
+    import bpy
+
+    return {
+        "preset": preset,
+        "addon": addon,
+        "addon_version": addon_version(addon),
+        "blender": bpy.app.version_string,
+    }
+
+
+def preset_key(descriptor):
+    blob = json.dumps(descriptor, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(blob).hexdigest()[:16]
+
+
+def snapshot_path(descriptor):
+    return os.path.join(CACHE_DIR, f"body_{preset_key(descriptor)}.blend")
+
+
+def _hierarchy(root):
+    objs = [root]
+    for child in root.children:
+        objs.extend(_hierarchy(child))
+    return objs
+
+
+def _append(path):
+    import bpy
+
+    with bpy.data.libraries.load(path, link=False) as (data_from, data_to):
+        data_to.objects = data_from.objects
+    objs = [o for o in data_to.objects if o is not None]
+    for obj in objs:
+        bpy.context.scene.collection.objects.link(obj)
+        # Snapshots written by older versions carry fake users; without clearing
+        # them the appended data would outlive the scripts' scene clears.
+        obj.use_fake_user = False
+        if obj.data is not None:
+            obj.data.use_fake_user = False
+
+    roots = [o for o in objs if o.parent is None]
+    roots.sort(key=lambda o: o.type != 'ARMATURE')
+    return roots[0] if roots else None
+
+
+def _remove(root):
+    import bpy
+
+    for obj in reversed(_hierarchy(root)):
+        bpy.data.objects.remove(obj, do_unlink=True)
+
+
+def load_body(preset, build, addon="mpfb", log=print, validate=None):
+    """Returns the root object of the body for `preset`, from the snapshot cache when possible.
+
+    `build()` must create the body in the current scene and return its root
+    object (usually the armature). It only runs on a cache miss.
+    `validate(root)` may return False when a body does not match the preset
+    (e.g. build() fell back to a human without the requested rig): such a body
+    is returned but not cached, and such a snapshot is discarded and rebuilt.
+    """
+    import bpy
+
+    descriptor = preset_descriptor(preset, addon)
+    path = snapshot_path(descriptor)
+
+    if os.path.exists(path):
+        log(f"Appending cached body {os.path.basename(path)}")
+        root = _append(path)
+        if root is not None and (validate is None or validate(root)):
+            bpy.context.view_layer.objects.active = root
+            root.select_set(True)
+            return root
+        if root is not None:
+            _remove(root)
+        log("Cached body snapshot is empty or invalid, rebuilding")
+
+    log("Building body (cache miss)...")
+    root = build()
+    if root is None:
+        return None
+    if validate is not None and not validate(root):
+        log("Built body does not match the preset, not caching it")
+        return root
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = path + ".tmp.blend"
+    # No fake users: appended copies must not outlive the scripts' scene clears
+    bpy.data.libraries.write(tmp_path, set(_hierarchy(root)), path_remap='ABSOLUTE')
+    os.replace(tmp_path, path)
+    with open(path[:-len(".blend")] + ".json", "w", encoding="utf-8") as f:
+        json.dump(descriptor, f, indent=2)
+    log(f"Saved body snapshot {os.path.basename(path)}")
+    return root
@@ -4,16 +4,21 @@ import os
 import time
 import math
 
+from blender_bridge import import_preamble
+
 HOST = '127.0.0.1'
 PORT = 9876
 
 # The Blender script to be executed remotely
-BLENDER_SCRIPT = r"""
+BLENDER_SCRIPT = import_preamble("shape_keys", "measurements", "landmarks", "body_cache") + r"""
 import bpy
 import os
 import mathutils
 import math
 
+# Identifies the generated body for the body snapshot and landmark caches
+BODY_PRESET = {"generator": "mpfb", "create_human": {"rig": "rigify"}}
+
 def log(msg):
     print(f"[Blender] {msg}")
     with open(r"E:\Orchid Gesture\scripts\blender_run.log", "a") as f:
@@ -61,21 +66,31 @@ def run():
     # Clean unused data
     for block in bpy.data.meshes: bpy.data.meshes.remove(block)
     for block in bpy.data.materials: bpy.data.materials.remove(block)
+    for block in bpy.data.armatures: bpy.data.armatures.remove(block)
     
     # 2. Create MPFB Human
+    # Generated once per preset/add-on version, then appended from the cached
+    # .blend snapshot (see scripts/body_cache.py).
     log("Creating MPFB Human...")
     if not hasattr(bpy.ops, 'mpfb'):
         return {"status": "error", "message": "MPFB addon not found"}
         
-    try:
-        # Create human with rig
-        bpy.ops.mpfb.create_human(rig="rigify") 
-        # Note: 'rigify' or 'standard' usually creates a rig. 
-        # If args differ, default create_human() usually adds a rig or we can add one.
-        # Let's try default first, then check for rig.
-    except Exception as e:
-        log(f"Create human failed, trying simple: {e}")
-        bpy.ops.mpfb.create_human()
+    def build_human():
+        try:
+            # Create human with rig
+            bpy.ops.mpfb.create_human(rig="rigify") 
+            # Note: 'rigify' or 'standard' usually creates a rig. 
+            # If args differ, default create_human() usually adds a rig or we can add one.
+        except Exception as e:
+            log(f"Create human failed, trying simple: {e}")
+            bpy.ops.mpfb.create_human()
+        return bpy.context.active_object
+    
+    def has_rig(root):
+        # The fallback create_human() may come without a rig; don't cache that as the rigify body
+        return root.type == 'ARMATURE' or (root.parent is not None and root.parent.type == 'ARMATURE')
+
+    body_cache.load_body(BODY_PRESET, build_human, log=log, validate=has_rig)
         
     body = bpy.context.active_object
     log(f"Active Object: {body.name} ({body.type})")
@@ -115,44 +130,31 @@ def run():
     bpy.ops.object.mode_set(mode='OBJECT')
     
     # 3. Analyze Skeleton for Dimensions
-    # We need world coordinates of bones
-    mw = armature.matrix_world
+    # Bone heads/tails come from the cached landmark set (scripts/landmarks.py),
+    # which knows the MPFB, Rigify and MB-Lab bone names.
+    lm = landmarks.extract(armature, target_mesh, preset=body_cache.preset_descriptor(BODY_PRESET))
+    log(f"Landmarks ({lm['source']}): {lm['heights']}")
     
     # Helper to get bone head/tail in world space
-    def get_bone_locs(bone_name):
-        # Rigify names vs Standard names
-        # Common: 'spine', 'spine.001', 'upper_arm.L', 'forearm.L'
-        # MPFB might use 'upperarm01.L' etc.
-        # Let's search for fuzzy matches
-        
-        found_bone = None
-        for bone in armature.data.bones:
-            if bone_name in bone.name:
-                found_bone = bone
-                break
-        
-        if not found_bone:
+    def get_bone_locs(key):
+        if key not in lm["segments"]:
             return None, None
-            
-        return mw @ found_bone.head, mw @ found_bone.tail
+        head, tail = lm["segments"][key]
+        return mathutils.Vector(head), mathutils.Vector(tail)
 
     # Points of interest
     spine_head, spine_tail = get_bone_locs("spine") # Lower spine
     neck_head, neck_tail = get_bone_locs("neck") # Neck
     
-    # If standard spine not found, try to find top and bottom of torso
     # Torso: Pelvis to Neck
     pelvis_head, pelvis_tail = get_bone_locs("pelvis")
-    if not pelvis_head: pelvis_head, pelvis_tail = get_bone_locs("hip")
     
     # Arms
-    arm_l_head, arm_l_tail = get_bone_locs("upper_arm.L")
-    if not arm_l_head: arm_l_head, arm_l_tail = get_bone_locs("upperarm")
-    
-    forearm_l_head, forearm_l_tail = get_bone_locs("forearm.L")
+    arm_l_head, arm_l_tail = get_bone_locs("upper_arm_l")
+    forearm_l_head, forearm_l_tail = get_bone_locs("forearm_l")
     
-    arm_r_head, arm_r_tail = get_bone_locs("upper_arm.R")
-    forearm_r_head, forearm_r_tail = get_bone_locs("forearm.R")
+    arm_r_head, arm_r_tail = get_bone_locs("upper_arm_r")
+    forearm_r_head, forearm_r_tail = get_bone_locs("forearm_r")
     
     # Validate
     if not (neck_head and arm_l_head):
@@ -7,41 +7,46 @@ HOST = '127.0.0.1'
 PORT = 9876
 EXPORT_PATH = os.path.abspath("models/Blue_Outdoor_Shirt.glb").replace("\\", "/")
 
-def export_shirt():
-    print(f"Exporting model to: {EXPORT_PATH}")
+# Output path can be overridden by the asset builder (scripts/asset_build.py)
+BUILD = json.loads(os.environ.get("ORCHID_BUILD") or "{}")
+if BUILD:
+    EXPORT_PATH = BUILD["outputs"]["glb"].replace("\\", "/")
+
+BLENDER_SCRIPT = textwrap.dedent(f"""
+import bpy
+
+# 1. Select the shirt
+obj_name = "Generated_Blue_Shirt.001"
+obj = bpy.data.objects.get(obj_name)
+
+if not obj:
+    print("Error: Shirt object not found")
+else:
+    # Deselect all
+    bpy.ops.object.select_all(action='DESELECT')
     
-    blender_script = textwrap.dedent(f"""
-    import bpy
+    # Select Shirt
+    obj.select_set(True)
+    bpy.context.view_layer.objects.active = obj
     
-    # 1. Select the shirt
-    obj_name = "Generated_Blue_Shirt.001"
-    obj = bpy.data.objects.get(obj_name)
+    # Export
+    # We use 'export_apply=True' to bake the Lattice deformation into the mesh
+    # NOTE: This might remove Shape Keys if they exist. 
+    # If preserving Shape Keys is prioritized over Lattice, set export_apply=False.
     
-    if not obj:
-        print("Error: Shirt object not found")
-    else:
-        # Deselect all
-        bpy.ops.object.select_all(action='DESELECT')
-        
-        # Select Shirt
-        obj.select_set(True)
-        bpy.context.view_layer.objects.active = obj
-        
-        # Export
-        # We use 'export_apply=True' to bake the Lattice deformation into the mesh
-        # NOTE: This might remove Shape Keys if they exist. 
-        # If preserving Shape Keys is prioritized over Lattice, set export_apply=False.
-        
-        print(f"Exporting to {{'{EXPORT_PATH}'}}...")
-        bpy.ops.export_scene.gltf(
-            filepath='{EXPORT_PATH}',
-            check_existing=False,
-            use_selection=True,
-            export_format='GLB',
-            export_apply=True  # Bake modifiers (Subsurf, Lattice)
-        )
-        print("Export successful!")
-    """)
+    print(f"Exporting to {{'{EXPORT_PATH}'}}...")
+    bpy.ops.export_scene.gltf(
+        filepath='{EXPORT_PATH}',
+        check_existing=False,
+        use_selection=True,
+        export_format='GLB',
+        export_apply=True  # Bake modifiers (Subsurf, Lattice)
+    )
+    print("Export successful!")
+""")
+
+def export_shirt():
+    print(f"Exporting model to: {EXPORT_PATH}")
     
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -51,7 +56,7 @@ def export_shirt():
         payload = {
             "type": "execute_code",
             "params": {
-                "code": blender_script
+                "code": BLENDER_SCRIPT
             }
         }
         s.sendall(json.dumps(payload).encode('utf-8'))
@@ -0,0 +1,238 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import asset_build
+from glb_utils import Glb
+from sparse_morphs import sparsify_file
+
+# Batch FBX -> GLB conversion for client/public/models/makehuman.
+#
+# New or changed .fbx files are converted in parallel headless Blender
+# workers (scripts/fbx_to_glb.py via blender_headless.py), morph targets are
+# re-encoded sparse, and the GLB is written next to the FBX. Results are
+# cached by source hash + converter version + Blender version, so renaming
+# or restoring a file never reconverts it. manifest.json lists every model
+# with its bounds, morph names and sizes for the client.
+#
+#   python scripts/fbx_convert.py            # convert what changed, once
+#   python scripts/fbx_convert.py --watch    # keep polling the directory
+
+SOURCE_DIR = os.path.join(asset_build.ROOT_DIR, "client", "public", "models", "makehuman")
+CACHE_DIR = os.path.join(asset_build.ROOT_DIR, "cache", "fbx_convert")
+MANIFEST_NAME = "manifest.json"
+CONVERTER = os.path.join(asset_build.SCRIPTS_DIR, "fbx_to_glb.py")
+PUBLIC_DIR = os.path.join(asset_build.ROOT_DIR, "client", "public")
+
+DEFAULT_OPTIONS = {"animations": False, "draco": False, "morph_normals": False}
+POLL_SECONDS = 2.0
+
+
+def _log(msg):
+    print(f"[{datetime.datetime.now():%H:%M:%S}] {msg}", flush=True)
+
+
+def glb_info(path):
+    """Bounds (world space), morph target names and vertex count of a GLB."""
+    glb = Glb.load(path)
+    gltf = glb.gltf
+    matrices = glb.world_matrices()
+    lo, hi = np.full(3, np.inf), np.full(3, -np.inf)
+    morphs, vertices = [], 0
+    for node_index, mesh_index in glb.mesh_nodes():
+        # Skinned meshes ignore the node transform
+        m = np.eye(4) if "skin" in gltf["nodes"][node_index] else matrices[node_index]
+        mesh = gltf["meshes"][mesh_index]
+        for name in mesh.get("extras", {}).get("targetNames", []):
+            if name not in morphs:
+                morphs.append(name)
+        for prim in mesh["primitives"]:
+            acc = gltf["accessors"][prim["attributes"]["POSITION"]]
+            vertices += acc["count"]
+            if "min" not in acc or "max" not in acc:
+                pts = glb.read_accessor(prim["attributes"]["POSITION"]).astype(np.float64)
+                a_min, a_max = pts.min(axis=0), pts.max(axis=0)
+            else:
+                a_min, a_max = np.array(acc["min"]), np.array(acc["max"])
+            corners = np.array([[x, y, z] for x in (a_min[0], a_max[0])
+                                for y in (a_min[1], a_max[1]) for z in (a_min[2], a_max[2])])
+            corners = corners @ m[:3, :3].T + m[:3, 3]
+            lo, hi = np.minimum(lo, corners.min(axis=0)), np.maximum(hi, corners.max(axis=0))
+    if not np.isfinite(lo).all():
+        lo, hi = np.zeros(3), np.zeros(3)
+    return {"bounds": {"min": lo.tolist(), "max": hi.tolist()}, "morphs": morphs, "vertices": vertices}
+
+
+class Converter:
+    def __init__(self, source_dir=SOURCE_DIR, jobs=None, options=None, blender=None):
+        self.source_dir = os.path.abspath(source_dir)
+        self.manifest_path = os.path.join(self.source_dir, MANIFEST_NAME)
+        self.options = dict(DEFAULT_OPTIONS, **(options or {}))
+        self.jobs = jobs or max(1, (os.cpu_count() or 2) // 2)
+        self.blender = blender or os.environ.get("BLENDER", "blender")
+        self._blender_version = None
+
+    def blender_version(self):
+        if self._blender_version is None:
+            self._blender_version = asset_build.tool_versions(self.blender, [])["blender"]
+        return self._blender_version
+
+    def load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"models": {}}
+
+    def save_manifest(self, manifest):
+        manifest["updated_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def cache_key(self, source_sha):
+        h = hashlib.sha256()
+        h.update(source_sha.encode())
+        for path in asset_build.local_modules(CONVERTER) + [os.path.abspath(__file__)]:
+            h.update(asset_build.file_digest(path).encode())
+        h.update(json.dumps({"options": self.options, "blender": self.blender_version()}, sort_keys=True).encode())
+        return h.hexdigest()[:20]
+
+    def sources(self):
+        if not os.path.isdir(self.source_dir):
+            return []
+        return sorted(os.path.join(self.source_dir, f) for f in os.listdir(self.source_dir)
+                      if f.lower().endswith(".fbx"))
+
+    def convert(self, fbx_path, source_sha):
+        """Converts one FBX (or takes it from the cache). Returns its manifest entry."""
+        stem = os.path.splitext(os.path.basename(fbx_path))[0]
+        out_path = os.path.join(self.source_dir, stem + ".glb")
+        key = self.cache_key(source_sha)
+        cached = os.path.join(CACHE_DIR, key + ".glb")
+
+        start = time.perf_counter()
+        if os.path.exists(cached):
+            _log(f"{stem}: cache hit")
+        else:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp = os.path.join(CACHE_DIR, f"{key}.{os.getpid()}.tmp.glb")
+            target = asset_build.Target(f"fbx_{stem}", {
+                "script": CONVERTER,
+                "inputs": [fbx_path],
+                "outputs": {"glb": tmp},
+                "params": self.options,
+            })
+            _log(f"{stem}: converting")
+            ok, _, log_path = asset_build.run_target(self.blender, target)
+            if not ok:
+                raise RuntimeError(f"Blender conversion failed, see {log_path}")
+            if not self.options.get("draco"):
+                # Draco primitives have no plain accessors to re-encode
+                sparsify_file(tmp)
+            os.replace(tmp, cached)
+
+        shutil.copyfile(cached, out_path + ".tmp")
+        os.replace(out_path + ".tmp", out_path)
+        entry = {
+            "source": os.path.basename(fbx_path),
+            "source_sha256": source_sha,
+            "source_size": os.path.getsize(fbx_path),
+            "glb": os.path.basename(out_path),
+            "url": "/" + os.path.relpath(out_path, PUBLIC_DIR).replace(os.sep, "/"),
+            "size": os.path.getsize(out_path),
+            "cache_key": key,
+            "converted_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        entry.update(glb_info(out_path))
+        _log(f"{stem}: {entry['source_size'] / 1e6:.1f} MB FBX -> {entry['size'] / 1e6:.1f} MB GLB "
+             f"({len(entry['morphs'])} morphs, {time.perf_counter() - start:.1f}s)")
+        return entry
+
+    def sync(self, force=False):
+        """Converts new/changed sources and drops models whose FBX is gone. Returns True if all succeeded."""
+        manifest = self.load_manifest()
+        models = manifest.setdefault("models", {})
+        pending = []
+        present = set()
+        for path in self.sources():
+            stem = os.path.splitext(os.path.basename(path))[0]
+            present.add(stem)
+            sha = asset_build.file_digest(path)
+            entry = models.get(stem)
+            glb_path = os.path.join(self.source_dir, stem + ".glb")
+            if force or not entry or entry.get("source_sha256") != sha or not os.path.exists(glb_path):
+                pending.append((stem, path, sha))
+
+        for stem in sorted(set(models) - present):
+            _log(f"{stem}: source removed")
+            glb_path = os.path.join(self.source_dir, models[stem]["glb"])
+            if os.path.exists(glb_path):
+                os.remove(glb_path)
+            del models[stem]
+
+        ok = True
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(self.jobs, len(pending))) as pool:
+                futures = {stem: pool.submit(self.convert, path, sha) for stem, path, sha in pending}
+                for stem, fut in futures.items():
+                    try:
+                        models[stem] = fut.result()
+                    except Exception as e:
+                        ok = False
+                        _log(f"{stem}: {e}")
+        if pending or not os.path.exists(self.manifest_path):
+            self.save_manifest(manifest)
+        return ok
+
+    def watch(self, interval=POLL_SECONDS):
+        """Polls the directory; a file is converted once its size/mtime stopped changing."""
+        _log(f"Watching {self.source_dir}")
+        last, stable = None, None
+        while True:
+            snapshot = {}
+            for path in self.sources():
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (st.st_size, st.st_mtime_ns)
+            # Sync only after two identical scans, so half-copied files are skipped
+            if snapshot == last and snapshot != stable:
+                self.sync()
+                stable = snapshot
+            last = snapshot
+            time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert MakeHuman FBX files to GLB for the client.")
+    parser.add_argument("--dir", default=SOURCE_DIR, help="Directory with .fbx files")
+    parser.add_argument("-j", "--jobs", type=int, help="Parallel Blender workers")
+    parser.add_argument("--watch", action="store_true", help="Keep polling for new/changed files")
+    parser.add_argument("--force", action="store_true", help="Reconvert everything (cache still applies)")
+    parser.add_argument("--animations", action="store_true", help="Export animations too")
+    parser.add_argument("--draco", action="store_true", help="Draco-compress meshes (needs DRACOLoader)")
+    args = parser.parse_args()
+
+    converter = Converter(args.dir, jobs=args.jobs,
+                          options={"animations": args.animations, "draco": args.draco})
+    if args.watch:
+        try:
+            converter.watch()
+        except KeyboardInterrupt:
+            pass
+    else:
+        sys.exit(0 if converter.sync(force=args.force) else 1)
+
+
+if __name__ == "__main__":
+    main()
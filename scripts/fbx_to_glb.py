@@ -0,0 +1,49 @@
+import bpy
+import os
+import json
+
+# Headless FBX -> GLB conversion (runs INSIDE Blender).
+# Started by scripts/fbx_convert.py through blender_headless.py; input/output
+# paths and export options arrive in the ORCHID_BUILD environment variable:
+#   {"inputs": ["model.fbx"], "outputs": {"glb": "model.glb"},
+#    "params": {"animations": false, "draco": false}}
+
+BUILD = json.loads(os.environ.get("ORCHID_BUILD") or "{}")
+PARAMS = BUILD.get("params", {})
+
+
+def run():
+    in_path = BUILD["inputs"][0]
+    out_path = BUILD["outputs"]["glb"]
+
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+
+    print(f"Importing {in_path}...")
+    bpy.ops.import_scene.fbx(filepath=in_path, use_anim=PARAMS.get("animations", False))
+
+    meshes = [o for o in bpy.context.scene.objects if o.type == 'MESH']
+    if not meshes:
+        raise RuntimeError(f"No mesh object found in {in_path}")
+
+    # MakeHuman exports often carry helper/proxy meshes hidden in the viewport
+    for obj in meshes:
+        if obj.hide_get() or obj.hide_viewport:
+            bpy.data.objects.remove(obj, do_unlink=True)
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    print(f"Exporting {out_path}...")
+    bpy.ops.export_scene.gltf(
+        filepath=out_path,
+        export_format='GLB',
+        export_apply=False,  # Keep shape keys (modifiers would drop them)
+        export_morph=True,
+        export_morph_normal=PARAMS.get("morph_normals", False),
+        export_skins=True,
+        export_animations=PARAMS.get("animations", False),
+        export_draco_mesh_compression_enable=PARAMS.get("draco", False),
+        export_yup=True,
+    )
+    print("Export successful!")
+
+
+run()
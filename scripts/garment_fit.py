@@ -0,0 +1,366 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import sparse
+from scipy.spatial import cKDTree
+
+from glb_utils import Glb
+
+# Offline garment fitting on GLB files (plain Python + NumPy/SciPy, no Blender).
+#
+# Does what the SHRINKWRAP + CORRECTIVE_SMOOTH stack in
+# remote_create_fitted_shirt.py does, directly on the exported data:
+#   1. project every garment vertex onto an offset surface around the body
+#      (closest point on the body via a KD-tree proxy),
+#   2. Laplacian-smooth the resulting displacement field so the garment keeps
+#      its own shape details,
+#   3. push vertices that ended up inside the body back out.
+# Fitting one garment to many body presets runs in parallel processes:
+#
+#   python scripts/garment_fit.py shirt.glb body_a.glb body_b.glb -o fitted/ -j 4
+
+DEFAULT_OFFSET = 0.03       # Same as the Shrinkwrap offset (3cm)
+DEFAULT_CLEARANCE = 0.005   # Minimum gap left between garment and skin
+DEFAULT_ITERATIONS = 20     # Same as the Corrective Smooth iterations
+DEFAULT_FACTOR = 0.5
+WELD_TOLERANCE = 1e-5       # glTF splits vertices at UV seams; weld them for fitting
+
+
+def weld(positions, tol=WELD_TOLERANCE):
+    """(unique positions, inverse index) merging vertices closer than `tol`."""
+    keys = np.round(positions / tol).astype(np.int64)
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    return positions[first], inverse.reshape(-1)
+
+
+def read_mesh(glb, node_index, matrices=None):
+    """World-space positions and triangles of one mesh node, all triangle primitives merged.
+
+    Returns (positions, faces, layout) where layout lists (primitive index,
+    first vertex, vertex count) so results can be written back per primitive.
+    """
+    gltf = glb.gltf
+    node = gltf["nodes"][node_index]
+    mesh = gltf["meshes"][node["mesh"]]
+    # Skinned meshes ignore the node transform (glTF spec); rest pose is mesh space
+    if "skin" in node:
+        matrix = np.eye(4)
+    else:
+        matrix = (matrices or glb.world_matrices())[node_index]
+
+    positions, faces, layout = [], [], []
+    base = 0
+    for p, prim in enumerate(mesh["primitives"]):
+        if prim.get("mode", 4) != 4:
+            continue
+        pos = glb.read_accessor(prim["attributes"]["POSITION"]).astype(np.float64)
+        if "indices" in prim:
+            idx = glb.read_accessor(prim["indices"])[:, 0].astype(np.int64)
+        else:
+            idx = np.arange(len(pos), dtype=np.int64)
+        positions.append(pos @ matrix[:3, :3].T + matrix[:3, 3])
+        faces.append(idx.reshape(-1, 3) + base)
+        layout.append((p, base, len(pos)))
+        base += len(pos)
+    if not positions:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64), layout
+    return np.concatenate(positions), np.concatenate(faces), layout
+
+
+def largest_mesh_node(glb):
+    best, best_count = None, -1
+    for node_index, mesh_index in glb.mesh_nodes():
+        prims = glb.gltf["meshes"][mesh_index]["primitives"]
+        count = sum(glb.gltf["accessors"][p["attributes"]["POSITION"]]["count"] for p in prims)
+        if count > best_count:
+            best, best_count = node_index, count
+    return best
+
+
+def vertex_normals(vertices, faces):
+    """Area-weighted vertex normals."""
+    tri = vertices[faces]
+    face_n = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    normals = np.zeros_like(vertices)
+    for k in range(3):
+        np.add.at(normals, faces[:, k], face_n)
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    return normals / np.where(length > 0, length, 1.0)
+
+
+def closest_on_triangles(p, a, b, c):
+    """Closest points on triangles (a, b, c) to points p, plus barycentrics. All arrays (n, 3)."""
+    ab, ac, ap = b - a, c - a, p - a
+    bp, cp = p - b, p - c
+    dot = lambda x, y: np.einsum("ij,ij->i", x, y)
+    d1, d2 = dot(ab, ap), dot(ac, ap)
+    d3, d4 = dot(ab, bp), dot(ac, bp)
+    d5, d6 = dot(ab, cp), dot(ac, cp)
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    def safe(num, den):
+        return num / np.where(np.abs(den) > 1e-30, den, 1e-30)
+
+    # Interior, then the Voronoi regions of edges and vertices (Ericson, RTCD 5.1.5).
+    # Later assignments win, so the order matches the original early-out order reversed.
+    denom = va + vb + vc
+    v, w = safe(vb, denom), safe(vc, denom)
+    bary = np.stack([1 - v - w, v, w], axis=1)
+
+    t = safe(d4 - d3, (d4 - d3) + (d5 - d6))
+    m = (va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0)
+    bary[m] = np.stack([np.zeros(m.sum()), 1 - t[m], t[m]], axis=1)
+    t = safe(d2, d2 - d6)
+    m = (vb <= 0) & (d2 >= 0) & (d6 <= 0)
+    bary[m] = np.stack([1 - t[m], np.zeros(m.sum()), t[m]], axis=1)
+    bary[(d6 >= 0) & (d5 <= d6)] = (0.0, 0.0, 1.0)
+    t = safe(d1, d1 - d3)
+    m = (vc <= 0) & (d1 >= 0) & (d3 <= 0)
+    bary[m] = np.stack([1 - t[m], t[m], np.zeros(m.sum())], axis=1)
+    bary[(d3 >= 0) & (d4 <= d3)] = (0.0, 1.0, 0.0)
+    bary[(d1 <= 0) & (d2 <= 0)] = (1.0, 0.0, 0.0)
+
+    point = bary[:, :1] * a + bary[:, 1:2] * b + bary[:, 2:] * c
+    return point, bary
+
+
+class BodyProxy:
+    """Closest-point queries against a (welded) body surface.
+
+    A KD-tree over the body vertices finds the nearest vertices of each query
+    point; the exact closest point is then searched among the triangles
+    around them.
+    """
+
+    def __init__(self, vertices, faces, neighbours=6):
+        vertices = np.asarray(vertices, dtype=np.float64)
+        welded, inverse = weld(vertices)
+        source = np.empty(len(welded), dtype=np.int64)
+        source[inverse] = np.arange(len(vertices))
+        faces = inverse[faces]
+        faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])]
+        # Drop vertices no triangle uses so every vertex has at least one face
+        used, faces = np.unique(faces, return_inverse=True)
+        self.vertices = welded[used]
+        # One original (unwelded) vertex per proxy vertex, for reading per-vertex attributes
+        self.source_index = source[used]
+        self.faces = faces.reshape(-1, 3)
+        self.normals = vertex_normals(self.vertices, self.faces)
+        self.tree = cKDTree(self.vertices)
+        self.neighbours = min(neighbours, len(self.vertices))
+
+        # Faces touching each vertex in CSR form: vertex_faces[face_start[v]:face_start[v + 1]].
+        # Ragged rather than padded to the highest valence, so a single pole
+        # vertex doesn't make every query test that many triangles.
+        flat = self.faces.ravel()
+        order = np.argsort(flat, kind="stable")
+        counts = np.bincount(flat, minlength=len(self.vertices))
+        self.face_start = np.concatenate([[0], np.cumsum(counts)])
+        self.vertex_faces = order // 3
+
+    @classmethod
+    def from_glb(cls, glb, node_index=None, **kwargs):
+        if node_index is None:
+            node_index = largest_mesh_node(glb)
+        if node_index is None:
+            raise ValueError("Body GLB contains no mesh")
+        positions, faces, _ = read_mesh(glb, node_index)
+        return cls(positions, faces, **kwargs)
+
+    def query(self, points, chunk=4096):
+        """(closest point, face index, barycentrics) on the body for each of `points`."""
+        points = np.asarray(points, dtype=np.float64)
+        closest = np.empty_like(points)
+        face = np.empty(len(points), dtype=np.int64)
+        bary = np.empty_like(points)
+        for start in range(0, len(points), chunk):
+            p = points[start:start + chunk]
+            _, nn = self.tree.query(p, k=self.neighbours)
+            nn = nn.reshape(len(p), -1).ravel()
+
+            # Candidate faces of each point: the faces around its nearest vertices, flattened
+            counts = self.face_start[nn + 1] - self.face_start[nn]
+            per_point = counts.reshape(len(p), -1).sum(axis=1)
+            offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            cand = self.vertex_faces[np.repeat(self.face_start[nn] - offsets, counts) + np.arange(counts.sum())]
+            owner = np.repeat(np.arange(len(p)), per_point)
+
+            tri = self.faces[cand]
+            pp = p[owner]
+            q, b = closest_on_triangles(pp, *(self.vertices[tri[:, k]] for k in range(3)))
+            d2 = ((q - pp) ** 2).sum(axis=1)
+            # First candidate with the smallest distance per point (owner is sorted)
+            group_start = np.concatenate([[0], np.cumsum(per_point)[:-1]])
+            is_min = d2 == np.minimum.reduceat(d2, group_start)[owner]
+            hits = np.flatnonzero(is_min)
+            best = hits[np.unique(owner[hits], return_index=True)[1]]
+
+            closest[start:start + chunk] = q[best]
+            face[start:start + chunk] = cand[best]
+            bary[start:start + chunk] = b[best]
+        return closest, face, bary
+
+    def interpolate(self, values, face, bary):
+        """Barycentric interpolation of per-proxy-vertex `values` at query results."""
+        tri = self.faces[face]
+        return np.einsum("ij,ij...->i...", bary, values[tri])
+
+    def closest(self, points, chunk=4096):
+        """(closest point, interpolated normal, signed distance) for each of `points`."""
+        points = np.asarray(points, dtype=np.float64)
+        closest, face, bary = self.query(points, chunk)
+        normals = self.interpolate(self.normals, face, bary)
+        length = np.linalg.norm(normals, axis=1, keepdims=True)
+        normals /= np.where(length > 0, length, 1.0)
+        signed = np.einsum("ij,ij->i", points - closest, normals)
+        return closest, normals, signed
+
+
+def smoothing_operator(n_vertices, faces):
+    """Row-normalised adjacency (umbrella Laplacian) as a sparse matrix."""
+    rows = faces[:, [0, 1, 2, 1, 2, 0]].ravel()
+    cols = faces[:, [1, 2, 0, 0, 1, 2]].ravel()
+    adj = sparse.coo_matrix((np.ones(len(rows)), (rows, cols)), shape=(n_vertices, n_vertices)).tocsr()
+    adj.data[:] = 1.0
+    degree = np.asarray(adj.sum(axis=1)).ravel()
+    inv = np.where(degree > 0, 1.0 / np.maximum(degree, 1), 0.0)
+    # Isolated vertices keep their own value
+    return (sparse.diags(inv) @ adj + sparse.diags((degree == 0).astype(np.float64))).tocsr()
+
+
+def smooth(op, field, iterations, factor):
+    for _ in range(iterations):
+        field = (1.0 - factor) * field + factor * (op @ field)
+    return field
+
+
+def fit(vertices, faces, body, offset=DEFAULT_OFFSET, clearance=DEFAULT_CLEARANCE,
+        iterations=DEFAULT_ITERATIONS, factor=DEFAULT_FACTOR, mode="surface", passes=3):
+    """Fitted positions for garment `vertices` (welded, world space) around `body`.
+
+    mode="surface" pulls every vertex onto the offset surface (like Shrinkwrap
+    ON_SURFACE); mode="outside" only moves vertices closer than `offset`, so
+    loose garments stay loose.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    op = smoothing_operator(len(vertices), faces)
+
+    q, n, d = body.closest(vertices)
+    target = q + n * offset
+    if mode == "outside":
+        target = np.where((d < offset)[:, None], target, vertices)
+    elif mode != "surface":
+        raise ValueError(f"Unknown fit mode: {mode}")
+    fitted = vertices + smooth(op, target - vertices, iterations, factor)
+
+    # Collision push-out: spread each correction over its neighbours a little
+    # so it does not leave spikes, then clamp whatever is still inside.
+    for i in range(passes + 1):
+        q, n, d = body.closest(fitted)
+        inside = d < clearance
+        if not inside.any():
+            break
+        push = np.where(inside[:, None], q + n * clearance - fitted, 0.0)
+        fitted = fitted + (push if i == passes else smooth(op, push, 2, factor))
+    return fitted
+
+
+def fit_glb(garment, body, node_index=None, **kwargs):
+    """Fits one mesh node of `garment` (a Glb, modified in place). Returns stats."""
+    if node_index is None:
+        node_index = largest_mesh_node(garment)
+    if node_index is None:
+        raise ValueError("Garment GLB contains no mesh")
+    gltf = garment.gltf
+    node = gltf["nodes"][node_index]
+    matrix = np.eye(4) if "skin" in node else garment.world_matrices()[node_index]
+    inv = np.linalg.inv(matrix)
+
+    positions, faces, layout = read_mesh(garment, node_index)
+    welded, inverse = weld(positions)
+    welded_faces = inverse[faces]
+    _, _, before = body.closest(welded)
+    fitted = fit(welded, welded_faces, body, **kwargs)
+    _, _, after = body.closest(fitted)
+    normals = vertex_normals(fitted, welded_faces)
+
+    # Write back per primitive in the node's local space. Primitives are
+    # rewritten in place, so meshes shared by several nodes move everywhere.
+    mesh = gltf["meshes"][node["mesh"]]
+    for p, first, count in layout:
+        prim = mesh["primitives"][p]
+        idx = inverse[first:first + count]
+        local = fitted[idx] @ inv[:3, :3].T + inv[:3, 3]
+        prim["attributes"]["POSITION"] = garment.add_accessor(local.astype(np.float32), with_bounds=True)
+        if "NORMAL" in prim["attributes"]:
+            nrm = normals[idx] @ matrix[:3, :3]
+            nrm /= np.maximum(np.linalg.norm(nrm, axis=1, keepdims=True), 1e-12)
+            prim["attributes"]["NORMAL"] = garment.add_accessor(nrm.astype(np.float32))
+    garment.repack()
+
+    return {
+        "vertices": int(len(welded)),
+        "penetration_before": float(max(0.0, -before.min())) if len(before) else 0.0,
+        "penetration_after": float(max(0.0, -after.min())) if len(after) else 0.0,
+        "mean_gap": float(after.mean()) if len(after) else 0.0,
+    }
+
+
+def fit_file(garment_path, body_path, out_path, garment_node=None, body_node=None, **kwargs):
+    start = time.perf_counter()
+    garment = Glb.load(garment_path)
+    body = BodyProxy.from_glb(Glb.load(body_path), body_node)
+    stats = fit_glb(garment, body, garment_node, **kwargs)
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    stats["size"] = garment.save(out_path)
+    stats.update(body=body_path, output=out_path, seconds=time.perf_counter() - start)
+    return stats
+
+
+def _fit_job(args):
+    garment_path, body_path, out_path, kwargs = args
+    return fit_file(garment_path, body_path, out_path, **kwargs)
+
+
+def fit_many(garment_path, body_paths, out_dir, jobs=None, **kwargs):
+    """Fits one garment to every body in `body_paths`, one process per body."""
+    stem = os.path.splitext(os.path.basename(garment_path))[0]
+    tasks = []
+    for body_path in body_paths:
+        body_stem = os.path.splitext(os.path.basename(body_path))[0]
+        tasks.append((garment_path, body_path, os.path.join(out_dir, f"{stem}__{body_stem}.glb"), kwargs))
+    if len(tasks) == 1 or jobs == 1:
+        return [_fit_job(t) for t in tasks]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(_fit_job, tasks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit a garment GLB to one or more body GLBs.")
+    parser.add_argument("garment", help="Garment GLB")
+    parser.add_argument("bodies", nargs="+", help="Body GLB(s)")
+    parser.add_argument("-o", "--out-dir", default=".", help="Output directory")
+    parser.add_argument("-j", "--jobs", type=int, help="Parallel worker processes")
+    parser.add_argument("--offset", type=float, default=DEFAULT_OFFSET)
+    parser.add_argument("--clearance", type=float, default=DEFAULT_CLEARANCE)
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--factor", type=float, default=DEFAULT_FACTOR)
+    parser.add_argument("--mode", choices=["surface", "outside"], default="surface")
+    args = parser.parse_args()
+
+    results = fit_many(args.garment, args.bodies, args.out_dir, jobs=args.jobs,
+                       offset=args.offset, clearance=args.clearance, iterations=args.iterations,
+                       factor=args.factor, mode=args.mode)
+    for r in results:
+        print(f"{os.path.basename(r['body'])}: {r['vertices']} verts, "
+              f"penetration {r['penetration_before'] * 1000:.1f}mm -> {r['penetration_after'] * 1000:.1f}mm, "
+              f"mean gap {r['mean_gap'] * 1000:.1f}mm, {r['seconds']:.2f}s -> {r['output']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,19 @@
 import bpy
 import os
+import json
 
 # Settings
 OUTPUT_DIR = os.path.join(os.getcwd(), "client", "public", "models")
 EXPORT_PATH = os.path.join(OUTPUT_DIR, "MBLab_Female.glb")
 BLEND_PATH = os.path.join(os.getcwd(), "temp_mblab.blend")
+CHARACTER = 'f_ca01'
+
+# Overrides when run by the asset builder (scripts/asset_build.py)
+BUILD = json.loads(os.environ.get("ORCHID_BUILD") or "{}")
+if BUILD:
+    EXPORT_PATH = BUILD["outputs"]["glb"]
+    OUTPUT_DIR = os.path.dirname(EXPORT_PATH)
+    CHARACTER = BUILD.get("params", {}).get("character", CHARACTER)
 
 # Ensure output directory exists
 os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -14,7 +23,7 @@ bpy.ops.wm.save_as_mainfile(filepath=BLEND_PATH)
 
 print("Initializing MB-Lab Character...")
 # Set Character Type: Caucasian Female
-bpy.context.scene.mblab_character_name = 'f_ca01' 
+bpy.context.scene.mblab_character_name = CHARACTER
 bpy.context.scene.mblab_use_lamps = False
 bpy.context.scene.mblab_use_cycles = True # Use Cycles for baking if needed, though Eevee is faster
 # bpy.context.scene.mblab_use_eevee = True
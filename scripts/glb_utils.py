@@ -0,0 +1,298 @@
+import json
+import struct
+
+import numpy as np
+
+# Shared GLB (binary glTF 2.0) reader/writer for the offline geometry tools.
+# Runs with plain Python + NumPy, no Blender needed.
+
+GLB_MAGIC = 0x46546C67  # 'glTF'
+CHUNK_JSON = 0x4E4F534A  # 'JSON'
+CHUNK_BIN = 0x004E4942  # 'BIN\0'
+
+COMPONENT_DTYPES = {
+    5120: np.int8,
+    5121: np.uint8,
+    5122: np.int16,
+    5123: np.uint16,
+    5125: np.uint32,
+    5126: np.float32,
+}
+DTYPE_COMPONENTS = {np.dtype(v): k for k, v in COMPONENT_DTYPES.items()}
+
+TYPE_SIZES = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4, "MAT2": 4, "MAT3": 9, "MAT4": 16}
+SIZE_TYPES = {1: "SCALAR", 2: "VEC2", 3: "VEC3", 4: "VEC4", 16: "MAT4"}
+
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+
+def _pad4(data, fill=b"\x00"):
+    rem = len(data) % 4
+    if rem:
+        data += fill * (4 - rem)
+    return data
+
+
+def node_matrix(node):
+    """Local 4x4 transform of a glTF node (matrix or TRS)."""
+    if "matrix" in node:
+        return np.array(node["matrix"], dtype=np.float64).reshape(4, 4).T
+    x, y, z, w = node.get("rotation", [0.0, 0.0, 0.0, 1.0])
+    rot = np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+    m = np.eye(4)
+    m[:3, :3] = rot * np.array(node.get("scale", [1.0, 1.0, 1.0]))
+    m[:3, 3] = node.get("translation", [0.0, 0.0, 0.0])
+    return m
+
+
+class Glb:
+    """In-memory GLB: the glTF JSON dict plus the single binary buffer."""
+
+    def __init__(self, gltf, bin_chunk=b""):
+        self.gltf = gltf
+        self.bin = bytearray(bin_chunk)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, length = struct.unpack_from("<III", data, 0)
+        if magic != GLB_MAGIC:
+            raise ValueError(f"{path} is not a binary glTF file")
+        if version != 2:
+            raise ValueError(f"{path}: unsupported glTF version {version}")
+
+        gltf = None
+        bin_chunk = b""
+        offset = 12
+        while offset < length:
+            chunk_length, chunk_type = struct.unpack_from("<II", data, offset)
+            offset += 8
+            chunk = data[offset:offset + chunk_length]
+            offset += chunk_length
+            if chunk_type == CHUNK_JSON:
+                gltf = json.loads(chunk)
+            elif chunk_type == CHUNK_BIN:
+                bin_chunk = chunk
+        if gltf is None:
+            raise ValueError(f"{path}: missing JSON chunk")
+        return cls(gltf, bin_chunk)
+
+    def to_bytes(self):
+        if self.bin:
+            buffers = self.gltf.setdefault("buffers", [{}])
+            buffers[0]["byteLength"] = len(self.bin)
+            buffers[0].pop("uri", None)
+        json_bytes = _pad4(json.dumps(self.gltf, separators=(",", ":")).encode("utf-8"), b" ")
+        out = bytearray()
+        out += struct.pack("<II", len(json_bytes), CHUNK_JSON) + json_bytes
+        if self.bin:
+            bin_bytes = _pad4(bytes(self.bin))
+            out += struct.pack("<II", len(bin_bytes), CHUNK_BIN) + bin_bytes
+        return struct.pack("<III", GLB_MAGIC, 2, 12 + len(out)) + bytes(out)
+
+    def save(self, path):
+        data = self.to_bytes()
+        with open(path, "wb") as f:
+            f.write(data)
+        return len(data)
+
+    # --- Scene graph -----------------------------------------------------
+
+    def world_matrices(self):
+        """World 4x4 transform of every node, indexed like gltf["nodes"]."""
+        nodes = self.gltf.get("nodes", [])
+        parents = {}
+        for i, node in enumerate(nodes):
+            for child in node.get("children", []):
+                parents[child] = i
+        world = [None] * len(nodes)
+
+        def resolve(i):
+            if world[i] is None:
+                local = node_matrix(nodes[i])
+                world[i] = resolve(parents[i]) @ local if i in parents else local
+            return world[i]
+
+        return [resolve(i) for i in range(len(nodes))]
+
+    def mesh_nodes(self):
+        """(node index, mesh index) for every node that instantiates a mesh."""
+        return [(i, n["mesh"]) for i, n in enumerate(self.gltf.get("nodes", [])) if "mesh" in n]
+
+    # --- Accessors -------------------------------------------------------
+
+    def _view_array(self, view_index, byte_offset, dtype, count, n_comp):
+        view = self.gltf["bufferViews"][view_index]
+        start = view.get("byteOffset", 0) + byte_offset
+        item_size = np.dtype(dtype).itemsize * n_comp
+        stride = view.get("byteStride") or item_size
+        if stride == item_size:
+            arr = np.frombuffer(self.bin, dtype=dtype, count=count * n_comp, offset=start)
+            return arr.reshape(count, n_comp).copy()
+        raw = np.frombuffer(self.bin, dtype=np.uint8, count=stride * (count - 1) + item_size, offset=start)
+        arr = np.lib.stride_tricks.as_strided(
+            raw, shape=(count, item_size), strides=(stride, 1))
+        return np.ascontiguousarray(arr).view(dtype).reshape(count, n_comp)
+
+    def read_accessor(self, index):
+        """Returns accessor data as an (count, components) array, sparse values applied."""
+        acc = self.gltf["accessors"][index]
+        dtype = COMPONENT_DTYPES[acc["componentType"]]
+        n_comp = TYPE_SIZES[acc["type"]]
+        count = acc["count"]
+
+        if "bufferView" in acc:
+            arr = self._view_array(acc["bufferView"], acc.get("byteOffset", 0), dtype, count, n_comp)
+        else:
+            # Per spec an accessor without bufferView is all zeros
+            arr = np.zeros((count, n_comp), dtype=dtype)
+
+        sparse = acc.get("sparse")
+        if sparse:
+            idx = sparse["indices"]
+            idx_dtype = COMPONENT_DTYPES[idx["componentType"]]
+            indices = self._view_array(idx["bufferView"], idx.get("byteOffset", 0), idx_dtype, sparse["count"], 1)[:, 0]
+            val = sparse["values"]
+            values = self._view_array(val["bufferView"], val.get("byteOffset", 0), dtype, sparse["count"], n_comp)
+            arr[indices.astype(np.int64)] = values
+
+        if acc.get("normalized"):
+            info = np.iinfo(dtype)
+            arr = np.maximum(arr.astype(np.float32) / info.max, -1.0)
+        return arr
+
+    def add_buffer_view(self, data, target=None):
+        self.bin += b"\x00" * (-len(self.bin) % 4)
+        view = {"buffer": 0, "byteOffset": len(self.bin), "byteLength": len(data)}
+        if target is not None:
+            view["target"] = target
+        self.bin += data
+        views = self.gltf.setdefault("bufferViews", [])
+        views.append(view)
+        return len(views) - 1
+
+    def add_accessor(self, array, target=ARRAY_BUFFER, with_bounds=False, normalized=False):
+        """Appends a dense accessor for `array` (count x components) and returns its index."""
+        array = np.ascontiguousarray(array)
+        if array.ndim == 1:
+            array = array[:, None]
+        accessor = {
+            "bufferView": self.add_buffer_view(array.tobytes(), target),
+            "componentType": DTYPE_COMPONENTS[array.dtype],
+            "count": int(array.shape[0]),
+            "type": SIZE_TYPES[array.shape[1]],
+        }
+        if normalized:
+            accessor["normalized"] = True
+        if with_bounds and len(array):
+            accessor["min"] = array.min(axis=0).tolist()
+            accessor["max"] = array.max(axis=0).tolist()
+        accessors = self.gltf.setdefault("accessors", [])
+        accessors.append(accessor)
+        return len(accessors) - 1
+
+    def add_sparse_accessor(self, array, indices, with_bounds=False):
+        """Appends an accessor that is zero everywhere except at `indices`.
+
+        With no indices the accessor has neither bufferView nor sparse block,
+        which glTF defines as all zeros.
+        """
+        array = np.ascontiguousarray(array)
+        indices = np.asarray(indices)
+        accessor = {
+            "componentType": DTYPE_COMPONENTS[array.dtype],
+            "count": int(array.shape[0]),
+            "type": SIZE_TYPES[array.shape[1]],
+        }
+        if len(indices):
+            idx_dtype = np.uint16 if array.shape[0] <= 0xFFFF else np.uint32
+            accessor["sparse"] = {
+                "count": int(len(indices)),
+                "indices": {
+                    "bufferView": self.add_buffer_view(indices.astype(idx_dtype).tobytes()),
+                    "componentType": DTYPE_COMPONENTS[np.dtype(idx_dtype)],
+                },
+                "values": {
+                    "bufferView": self.add_buffer_view(np.ascontiguousarray(array[indices]).tobytes()),
+                },
+            }
+        if with_bounds and len(array):
+            accessor["min"] = array.min(axis=0).tolist()
+            accessor["max"] = array.max(axis=0).tolist()
+        accessors = self.gltf.setdefault("accessors", [])
+        accessors.append(accessor)
+        return len(accessors) - 1
+
+    # --- Housekeeping ----------------------------------------------------
+
+    def _accessor_refs(self):
+        """Yields (container, key) pairs for every place an accessor index is stored."""
+        for mesh in self.gltf.get("meshes", []):
+            for prim in mesh.get("primitives", []):
+                attrs = prim.get("attributes", {})
+                for name in attrs:
+                    yield attrs, name
+                if "indices" in prim:
+                    yield prim, "indices"
+                for target in prim.get("targets", []):
+                    for name in target:
+                        yield target, name
+        for skin in self.gltf.get("skins", []):
+            if "inverseBindMatrices" in skin:
+                yield skin, "inverseBindMatrices"
+        for anim in self.gltf.get("animations", []):
+            for sampler in anim.get("samplers", []):
+                yield sampler, "input"
+                yield sampler, "output"
+
+    def _view_refs(self):
+        for acc in self.gltf.get("accessors", []):
+            if "bufferView" in acc:
+                yield acc, "bufferView"
+            sparse = acc.get("sparse")
+            if sparse:
+                yield sparse["indices"], "bufferView"
+                yield sparse["values"], "bufferView"
+        for image in self.gltf.get("images", []):
+            if "bufferView" in image:
+                yield image, "bufferView"
+        for mesh in self.gltf.get("meshes", []):
+            for prim in mesh.get("primitives", []):
+                draco = prim.get("extensions", {}).get("KHR_draco_mesh_compression")
+                if draco:
+                    yield draco, "bufferView"
+
+    def repack(self):
+        """Drops unreferenced accessors/bufferViews and rewrites the binary buffer."""
+        accessors = self.gltf.get("accessors", [])
+        refs = list(self._accessor_refs())
+        used = sorted({c[k] for c, k in refs})
+        remap = {old: new for new, old in enumerate(used)}
+        for c, k in refs:
+            c[k] = remap[c[k]]
+        self.gltf["accessors"] = [accessors[i] for i in used]
+
+        views = self.gltf.get("bufferViews", [])
+        vrefs = list(self._view_refs())
+        used_views = sorted({c[k] for c, k in vrefs})
+        vremap = {old: new for new, old in enumerate(used_views)}
+        new_bin = bytearray()
+        new_views = []
+        for old in used_views:
+            view = dict(views[old])
+            start = view.get("byteOffset", 0)
+            chunk = self.bin[start:start + view["byteLength"]]
+            new_bin += b"\x00" * (-len(new_bin) % 4)
+            view["byteOffset"] = len(new_bin)
+            new_bin += chunk
+            new_views.append(view)
+        for c, k in vrefs:
+            c[k] = vremap[c[k]]
+        self.gltf["bufferViews"] = new_views
+        self.bin = new_bin
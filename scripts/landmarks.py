@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+import measurements
+import shape_keys
+
+# Body landmarks from the MPFB / MB-Lab / Rigify skeleton (runs INSIDE Blender).
+#
+# Instead of guessing the shirt zone from bounding-box ratios, read the bone
+# heads/tails once, combine them with the skin vertex groups for girths, and
+# cache the full measurement set per body preset (in memory and on disk).
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "landmarks")
+
+# Bone names per rig, tried in order. MPFB "default" rig first, then Rigify,
+# then MB-Lab. Right side is derived by swapping the suffix.
+BONE_ALIASES = {
+    "pelvis": ["pelvis", "root", "hips", "spine"],
+    "spine": ["spine03", "spine.002", "spine02"],
+    "chest": ["spine01", "spine.003", "spine03"],
+    "neck": ["neck01", "neck", "spine.004"],
+    "head": ["head", "spine.006"],
+    "upper_arm_l": ["upperarm01.L", "upper_arm.L", "upperarm_L"],
+    "forearm_l": ["lowerarm01.L", "forearm.L", "lowerarm_L"],
+    "hand_l": ["wrist.L", "hand.L", "hand_L"],
+    "thigh_l": ["upperleg01.L", "thigh.L", "thigh_L"],
+}
+for _name in [n for n in BONE_ALIASES if n.endswith("_l")]:
+    BONE_ALIASES[_name[:-2] + "_r"] = [a[:-1] + "R" for a in BONE_ALIASES[_name]]
+
+# Vertex groups that belong to the torso (used to measure girths without arms)
+TORSO_GROUP_KEYWORDS = ("spine", "chest", "pelvis", "hips", "breast", "abdomen", "torso")
+
+if "_CACHE" not in globals():
+    _CACHE = {}
+
+
+def find_bone(bones, aliases):
+    """Exact (case-insensitive) alias match first, then substring match."""
+    by_name = {b.name.lower(): b for b in bones}
+    for alias in aliases:
+        bone = by_name.get(alias.lower())
+        if bone is not None:
+            return bone
+    for alias in aliases:
+        for name, bone in by_name.items():
+            if alias.lower() in name:
+                return bone
+    return None
+
+
+def bone_segments(armature):
+    """World-space [head, tail] per landmark bone that exists in the rig."""
+    mw = np.array(armature.matrix_world, dtype=np.float64)
+    segments = {}
+    for key, aliases in BONE_ALIASES.items():
+        bone = find_bone(armature.data.bones, aliases)
+        if bone is None:
+            continue
+        pts = np.array([bone.head_local, bone.tail_local], dtype=np.float64)
+        pts = pts @ mw[:3, :3].T + mw[:3, 3]
+        segments[key] = pts.tolist()
+    return segments
+
+
+def _hull_perimeter(points):
+    """Perimeter of the 2D convex hull (monotone chain) - a tape-measure girth."""
+    pts = np.unique(np.round(points, 5), axis=0)
+    if len(pts) < 3:
+        return 0.0
+    pts = pts[np.lexsort((pts[:, 1], pts[:, 0]))]
+
+    def half(seq):
+        out = []
+        for p in seq:
+            while len(out) >= 2:
+                (ax, ay), (bx, by) = out[-2], out[-1]
+                if (bx - ax) * (p[1] - ay) - (by - ay) * (p[0] - ax) > 0:
+                    break
+                out.pop()
+            out.append(tuple(p))
+        return out
+
+    hull = np.array(half(pts)[:-1] + half(pts[::-1])[:-1])
+    return float(np.linalg.norm(hull - np.roll(hull, -1, axis=0), axis=1).sum())
+
+
+def _torso_vertices(body, coords, shoulder_width):
+    """Body vertices that belong to the torso, by vertex group or by lateral distance."""
+    names = [vg.name for vg in body.vertex_groups
+             if any(k in vg.name.lower() for k in TORSO_GROUP_KEYWORDS)]
+    if names:
+        weights = shape_keys.read_group_weights(body, names)
+        mask = np.max(np.stack(list(weights.values())), axis=0) > 0.5
+        if mask.any():
+            return coords[mask]
+    center_x = np.median(coords[:, 0])
+    return coords[np.abs(coords[:, 0] - center_x) < shoulder_width * 0.45]
+
+
+def _slice_profile(torso, z_lo, z_hi, bins=24):
+    """(heights, widths, depths, girths) of horizontal torso slices between z_lo and z_hi."""
+    edges = np.linspace(z_lo, z_hi, bins + 1)
+    which = np.digitize(torso[:, 2], edges) - 1
+    heights, widths, depths, girths = [], [], [], []
+    for i in range(bins):
+        s = torso[which == i]
+        if len(s) < 3:
+            continue
+        heights.append((edges[i] + edges[i + 1]) / 2)
+        widths.append(np.ptp(s[:, 0]))
+        depths.append(np.ptp(s[:, 1]))
+        girths.append(_hull_perimeter(s[:, :2]))
+    return np.array(heights), np.array(widths), np.array(depths), np.array(girths)
+
+
+def compute(armature, body):
+    """Full measurement set for a rigged body, in world space (Z up)."""
+    m = measurements.measure(body)
+    seg = bone_segments(armature) if armature is not None else {}
+    lm = {"source": "rig" if seg else "bbox", "body": body.name, "segments": seg, "points": {}}
+
+    def head(key):
+        return np.array(seg[key][0]) if key in seg else None
+
+    pts = {
+        "neck": head("neck"),
+        "shoulder_l": head("upper_arm_l"),
+        "shoulder_r": head("upper_arm_r"),
+        "wrist_l": head("hand_l"),
+        "wrist_r": head("hand_r"),
+        "hip_l": head("thigh_l"),
+        "hip_r": head("thigh_r"),
+    }
+    lm["points"] = {k: v.tolist() for k, v in pts.items() if v is not None}
+
+    heights = dict(m.landmarks)
+    if pts["neck"] is not None:
+        heights["neck"] = float(pts["neck"][2])
+    if pts["shoulder_l"] is not None and pts["shoulder_r"] is not None:
+        heights["shoulder"] = float((pts["shoulder_l"][2] + pts["shoulder_r"][2]) / 2)
+        shoulder_width = float(np.linalg.norm(pts["shoulder_l"] - pts["shoulder_r"]))
+    else:
+        shoulder_width = float(m.dimensions[0] * 0.25)
+    if pts["hip_l"] is not None and pts["hip_r"] is not None:
+        heights["hips"] = float((pts["hip_l"][2] + pts["hip_r"][2]) / 2)
+    else:
+        heights["hips"] = m.height_at(0.47)
+    lm["shoulder_width"] = shoulder_width
+
+    # Chest / waist / hip girths from the skin: waist is the narrowest torso
+    # slice above the hips, chest the deepest one below the shoulders.
+    coords = measurements.evaluated_coords(body)
+    if len(coords) != len(body.data.vertices):
+        coords = shape_keys.read_coords(body.data.vertices)
+    mw = np.array(body.matrix_world, dtype=np.float64)
+    coords = coords.astype(np.float64) @ mw[:3, :3].T + mw[:3, 3]
+    torso = _torso_vertices(body, coords, shoulder_width)
+
+    girths = {}
+    top = heights["shoulder"]
+    bottom = heights["hips"]
+    zs, widths, depths, hull = _slice_profile(torso, bottom, top) if top > bottom else ([], [], [], [])
+    if len(zs):
+        span = top - bottom
+        low = zs <= bottom + span * 0.6
+        high = zs >= bottom + span * 0.45
+        if low.any():
+            i = np.flatnonzero(low)[np.argmin(widths[low])]
+            heights["waist"], girths["waist"] = float(zs[i]), float(hull[i])
+        if high.any():
+            i = np.flatnonzero(high)[np.argmax(depths[high])]
+            heights["chest"], girths["chest"] = float(zs[i]), float(hull[i])
+        girths["hips"] = float(hull[0])
+
+    lm["heights"] = heights
+    lm["girths"] = girths
+    return lm
+
+
+def _matrices(armature, body):
+    """World matrices of the armature and body (the landmarks are in world space)."""
+    return b"".join(np.array(obj.matrix_world, dtype=np.float64).round(6).tobytes()
+                    for obj in (armature, body) if obj is not None)
+
+
+def _preset_key(preset, armature, body):
+    """Disk key: the preset plus cheap data that is stable across sessions. Blender keeps
+    bound_box up to date (it reflects the evaluated mesh), so a body that was rebuilt
+    differently or deformed has a different key without reading its vertices."""
+    blob = json.dumps(preset, sort_keys=True, default=str).encode("utf-8")
+    h = hashlib.sha1(blob)
+    h.update(_matrices(armature, body))
+    h.update(str(len(body.data.vertices)).encode("utf-8"))
+    h.update(np.array([list(c) for c in body.bound_box], dtype=np.float64).round(5).tobytes())
+    return h.hexdigest()[:16]
+
+
+def extract(armature, body, preset=None):
+    """Cached landmarks for a body.
+
+    `preset` identifies the body (e.g. MPFB macro settings or an MB-Lab
+    character name). With a preset the result is also stored on disk under
+    cache/landmarks, so new Blender sessions reuse it. The landmarks are in
+    world space, so the keys also cover the armature/body transforms: a moved,
+    scaled or rebuilt body is measured again. In memory the body's geometry
+    revision (measurements.geometry_key) is part of the key, so a hit never
+    reads the mesh. Bones are measured in rest pose; posing only matters
+    through the deformed skin, which changes the geometry revision.
+    """
+    mw = _matrices(armature, None)
+    if preset is not None:
+        path = os.path.join(CACHE_DIR, _preset_key(preset, armature, body) + ".json")
+        key = ("preset", path) + measurements.geometry_key(body) + (mw,)
+    else:
+        key = measurements.geometry_key(body) + (mw,)
+        path = None
+
+    if key in _CACHE:
+        return _CACHE[key]
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            _CACHE[key] = json.load(f)
+        return _CACHE[key]
+
+    lm = compute(armature, body)
+    if preset is not None:
+        lm["preset"] = preset
+    _CACHE[key] = lm
+    if path:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(lm, f, indent=2)
+    return lm
+
+
+def find_rig(obj):
+    """(armature, body mesh) for an MPFB/MB-Lab object, whichever of the two was given."""
+    if obj.type == 'ARMATURE':
+        meshes = [c for c in obj.children if c.type == 'MESH']
+        meshes.sort(key=lambda c: len(c.data.vertices), reverse=True)
+        return obj, (meshes[0] if meshes else None)
+    if obj.parent is not None and obj.parent.type == 'ARMATURE':
+        return obj.parent, obj
+    for mod in getattr(obj, "modifiers", []):
+        if mod.type == 'ARMATURE' and mod.object is not None:
+            return mod.object, obj
+    return None, obj
@@ -0,0 +1,260 @@
+import argparse
+import hashlib
+import json
+import os
+from math import comb
+
+import numpy as np
+
+from glb_utils import Glb
+from garment_fit import largest_mesh_node, read_mesh
+
+# Lattice free-form deformation (FFD) for garment GLBs, without Blender.
+#
+# Same setup as setup_lattice_deformation.py: a 5x5x5 lattice padded 20%
+# around the garment's bounding box. Control point offsets are blended with
+# trivariate B-spline (Blender's default lattice interpolation) or Bernstein
+# (Bezier) basis functions. Size presets (S/M/L/XL) can be applied to write
+# a variant GLB, or baked into morph targets of a single GLB:
+#
+#   python scripts/lattice_ffd.py shirt.glb -o shirt_sized.glb --bake S M L XL
+#   python scripts/lattice_ffd.py shirt.glb -o shirt_xl.glb --apply XL
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "ffd")
+
+DEFAULT_RESOLUTION = (5, 5, 5)
+DEFAULT_PADDING = 0.2
+UP_AXIS = 1  # glTF is Y-up
+
+# girth: horizontal scale around the lattice centre
+# length: vertical scale anchored at the top of the lattice (shoulders stay put)
+SIZE_PRESETS = {
+    "S": {"girth": 0.94, "length": 0.97},
+    "M": {"girth": 1.0, "length": 1.0},
+    "L": {"girth": 1.06, "length": 1.02},
+    "XL": {"girth": 1.12, "length": 1.04},
+}
+
+
+def bernstein_basis(s, n_points):
+    """(len(s), n_points) Bernstein polynomial weights of degree n_points - 1."""
+    n = n_points - 1
+    s = np.clip(s, 0.0, 1.0)[:, None]
+    i = np.arange(n_points)
+    coeff = np.array([comb(n, k) for k in i], dtype=np.float64)
+    return coeff * s ** i * (1.0 - s) ** (n - i)
+
+
+def bspline_knots(n_points, degree):
+    interior = np.linspace(0.0, 1.0, n_points - degree + 1)[1:-1]
+    return np.concatenate([np.zeros(degree + 1), interior, np.ones(degree + 1)])
+
+
+def bspline_basis(s, n_points, degree=3):
+    """(len(s), n_points) clamped uniform B-spline weights (Cox-de Boor)."""
+    degree = min(degree, n_points - 1)
+    knots = bspline_knots(n_points, degree)
+    s = np.clip(s, 0.0, 1.0 - 1e-12)[:, None]
+    # Degree 0: indicator of the knot span
+    basis = ((knots[:-1] <= s) & (s < knots[1:])).astype(np.float64)
+    for p in range(1, degree + 1):
+        left_den = knots[p:-1] - knots[:-p - 1]
+        right_den = knots[p + 1:] - knots[1:-p]
+        left = np.where(left_den > 0, (s - knots[:-p - 1]) / np.where(left_den > 0, left_den, 1), 0.0)
+        right = np.where(right_den > 0, (knots[p + 1:] - s) / np.where(right_den > 0, right_den, 1), 0.0)
+        basis = left * basis[:, :-1] + right * basis[:, 1:]
+    return basis
+
+
+class Lattice:
+    """Axis-aligned FFD lattice with per-control-point offsets."""
+
+    def __init__(self, bbox_min, bbox_max, resolution=DEFAULT_RESOLUTION, interpolation="bspline"):
+        if interpolation not in ("bspline", "bezier"):
+            raise ValueError(f"Unknown interpolation: {interpolation}")
+        self.bbox_min = np.asarray(bbox_min, dtype=np.float64)
+        self.bbox_max = np.asarray(bbox_max, dtype=np.float64)
+        self.resolution = tuple(int(r) for r in resolution)
+        self.interpolation = interpolation
+        self.offsets = np.zeros(self.resolution + (3,))
+
+    @classmethod
+    def around(cls, vertices, padding=DEFAULT_PADDING, **kwargs):
+        """Lattice padded by `padding` (fraction of the size) around `vertices`, like the Blender setup."""
+        lo, hi = vertices.min(axis=0), vertices.max(axis=0)
+        center, half = (lo + hi) / 2, (hi - lo) * (1.0 + padding) / 2
+        half = np.maximum(half, 1e-6)
+        return cls(center - half, center + half, **kwargs)
+
+    def _basis(self, s, n_points):
+        if self.interpolation == "bezier":
+            return bernstein_basis(s, n_points)
+        return bspline_basis(s, n_points)
+
+    def parameters(self, n_points):
+        """Rest positions of the control points along one axis, in [0, 1] (Greville abscissae)."""
+        if self.interpolation == "bezier" or n_points < 2:
+            return np.linspace(0.0, 1.0, n_points)
+        degree = min(3, n_points - 1)
+        knots = bspline_knots(n_points, degree)
+        return np.array([knots[i + 1:i + degree + 1].mean() for i in range(n_points)])
+
+    def rest_points(self):
+        """(l, m, n, 3) undeformed control point positions."""
+        axes = [self.bbox_min[a] + self.parameters(r) * (self.bbox_max[a] - self.bbox_min[a])
+                for a, r in enumerate(self.resolution)]
+        return np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1)
+
+    def displacement(self, vertices):
+        """Per-vertex displacement produced by the current control point offsets."""
+        local = (vertices - self.bbox_min) / (self.bbox_max - self.bbox_min)
+        bu, bv, bw = (self._basis(local[:, a], r) for a, r in enumerate(self.resolution))
+        return np.einsum("ni,nj,nk,ijkc->nc", bu, bv, bw, self.offsets, optimize=True)
+
+    def deform(self, vertices):
+        return vertices + self.displacement(vertices)
+
+    def set_preset(self, preset):
+        """Sets offsets from a preset dict (girth/length factors and/or explicit offsets)."""
+        rest = self.rest_points()
+        center = (self.bbox_min + self.bbox_max) / 2
+        target = rest.copy()
+
+        girth = preset.get("girth", 1.0)
+        for axis in range(3):
+            if axis != UP_AXIS:
+                target[..., axis] = center[axis] + (rest[..., axis] - center[axis]) * girth
+        top = self.bbox_max[UP_AXIS]
+        target[..., UP_AXIS] = top + (rest[..., UP_AXIS] - top) * preset.get("length", 1.0)
+
+        self.offsets = target - rest
+        if "offsets" in preset:
+            self.offsets = self.offsets + np.asarray(preset["offsets"], dtype=np.float64).reshape(self.offsets.shape)
+        return self
+
+
+def _resolve_preset(preset):
+    if isinstance(preset, str):
+        if preset not in SIZE_PRESETS:
+            raise ValueError(f"Unknown size preset: {preset}")
+        return SIZE_PRESETS[preset]
+    return preset
+
+
+def _node_space(glb, node_index):
+    node = glb.gltf["nodes"][node_index]
+    return np.eye(4) if "skin" in node else glb.world_matrices()[node_index]
+
+
+def apply_glb(glb, preset, node_index=None, **lattice_kwargs):
+    """Deforms one mesh node of `glb` in place with a size preset."""
+    if node_index is None:
+        node_index = largest_mesh_node(glb)
+    positions, _, layout = read_mesh(glb, node_index)
+    lattice = Lattice.around(positions, **lattice_kwargs).set_preset(_resolve_preset(preset))
+    inv = np.linalg.inv(_node_space(glb, node_index))
+
+    deformed = lattice.deform(positions)
+    mesh = glb.gltf["meshes"][glb.gltf["nodes"][node_index]["mesh"]]
+    for p, first, count in layout:
+        local = deformed[first:first + count] @ inv[:3, :3].T + inv[:3, 3]
+        mesh["primitives"][p]["attributes"]["POSITION"] = glb.add_accessor(local.astype(np.float32), with_bounds=True)
+    glb.repack()
+    return lattice
+
+
+def bake_glb(glb, presets, node_index=None, **lattice_kwargs):
+    """Adds one morph target per preset to a mesh node of `glb` (in place).
+
+    The lattice is fitted once to the undeformed mesh, so all targets share
+    the same control grid and can be blended in the client.
+    """
+    if node_index is None:
+        node_index = largest_mesh_node(glb)
+    gltf = glb.gltf
+    node = gltf["nodes"][node_index]
+    mesh = gltf["meshes"][node["mesh"]]
+    positions, _, layout = read_mesh(glb, node_index)
+    lattice = Lattice.around(positions, **lattice_kwargs)
+    linear_inv = np.linalg.inv(_node_space(glb, node_index)[:3, :3])
+
+    names = mesh.setdefault("extras", {}).setdefault("targetNames", [])
+    existing = len(mesh["primitives"][0].get("targets", []))
+    if len(names) < existing:
+        names.extend(f"target_{i}" for i in range(len(names), existing))
+
+    for i, preset in enumerate(presets):
+        name = preset if isinstance(preset, str) else preset.get("name", f"preset_{len(names)}")
+        lattice.set_preset(_resolve_preset(preset))
+        delta = lattice.displacement(positions) @ linear_inv.T
+        for prim in mesh["primitives"]:
+            prim.setdefault("targets", [])
+        for p, first, count in layout:
+            d = delta[first:first + count].astype(np.float32)
+            mesh["primitives"][p]["targets"].append({"POSITION": glb.add_accessor(d, with_bounds=True)})
+        # Non-triangle primitives still need a target per index
+        for prim in mesh["primitives"]:
+            if len(prim["targets"]) < existing + i + 1:
+                count = gltf["accessors"][prim["attributes"]["POSITION"]]["count"]
+                prim["targets"].append({"POSITION": glb.add_sparse_accessor(np.zeros((count, 3), np.float32), [], with_bounds=True)})
+        names.append(name)
+
+    mesh["weights"] = mesh.get("weights", [0.0] * existing) + [0.0] * len(presets)
+    for n in gltf.get("nodes", []):
+        if n.get("mesh") == node["mesh"] and "weights" in n:
+            n["weights"] = n["weights"] + [0.0] * len(presets)
+    glb.repack()
+    return names
+
+
+def cached_variant(in_path, preset, cache_dir=CACHE_DIR, **lattice_kwargs):
+    """Path of the `preset` variant of a garment GLB, generated on first use.
+
+    Variants are content-addressed by the source bytes, the preset and the
+    lattice settings, so edits to any of them produce a new file.
+    """
+    with open(in_path, "rb") as f:
+        source = f.read()
+    h = hashlib.sha1(source)
+    h.update(json.dumps({"preset": _resolve_preset(preset), "lattice": lattice_kwargs},
+                        sort_keys=True, default=list).encode("utf-8"))
+    stem = os.path.splitext(os.path.basename(in_path))[0]
+    label = preset if isinstance(preset, str) else "custom"
+    path = os.path.join(cache_dir, f"{stem}_{label}_{h.hexdigest()[:12]}.glb")
+    if not os.path.exists(path):
+        glb = Glb.load(in_path)
+        apply_glb(glb, preset, **lattice_kwargs)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = path + ".tmp"
+        glb.save(tmp)
+        os.replace(tmp, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lattice (FFD) size variants for garment GLBs.")
+    parser.add_argument("input", help="Garment GLB")
+    parser.add_argument("-o", "--output", required=True)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--apply", metavar="PRESET", help="Write the garment deformed by one size preset")
+    group.add_argument("--bake", nargs="+", metavar="PRESET", help="Bake presets as morph targets")
+    parser.add_argument("--interpolation", choices=["bspline", "bezier"], default="bspline")
+    parser.add_argument("--resolution", type=int, nargs=3, default=list(DEFAULT_RESOLUTION))
+    parser.add_argument("--padding", type=float, default=DEFAULT_PADDING)
+    args = parser.parse_args()
+
+    lattice_kwargs = {"interpolation": args.interpolation, "resolution": tuple(args.resolution),
+                      "padding": args.padding}
+    glb = Glb.load(args.input)
+    if args.apply:
+        apply_glb(glb, args.apply, **lattice_kwargs)
+        print(f"Applied {args.apply}")
+    else:
+        names = bake_glb(glb, args.bake, **lattice_kwargs)
+        print(f"Morph targets: {', '.join(names)}")
+    size = glb.save(args.output)
+    print(f"Saved {args.output} ({size / 1024:.1f} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from glb_utils import Glb, COMPONENT_DTYPES, ELEMENT_ARRAY_BUFFER
+from garment_fit import weld
+
+# Level-of-detail generation for body and garment GLBs (no Blender).
+#
+# Each level is a vertex-clustering decimation: vertices are grouped on a
+# grid whose cell size is searched to hit the target vertex ratio, and each
+# cell collapses to the point minimising the summed face quadric error of
+# its triangles (Garland-Heckbert QEM, regularised towards the cell mean).
+# Clusters are additionally split by UV chart (connected components of the
+# glTF index graph), so UV seams survive while the two sides still share
+# the same collapsed position. Every other attribute - UVs, normals, skin
+# joints/weights and morph target deltas - is taken from the source vertex
+# closest to the collapsed position, so skinning and sliders keep working
+# on every level.
+#
+#   python scripts/lod_generator.py body.glb -o lods/            # separate files + manifest
+#   python scripts/lod_generator.py body.glb -o lods/ --msft-lod # one file, MSFT_lod extension
+
+DEFAULT_RATIOS = (0.5, 0.25, 0.1)
+# MSFT_screencoverage thresholds for LOD0..LOD3 (fraction of the screen height)
+DEFAULT_COVERAGE = (0.5, 0.25, 0.1, 0.0)
+
+
+def _read_primitive(glb, prim):
+    attrs = {name: glb.read_accessor(i) for name, i in prim["attributes"].items()}
+    n = len(attrs["POSITION"])
+    if "indices" in prim:
+        faces = glb.read_accessor(prim["indices"])[:, 0].astype(np.int64).reshape(-1, 3)
+    else:
+        faces = np.arange(n, dtype=np.int64).reshape(-1, 3)
+    targets = [{name: glb.read_accessor(i) for name, i in t.items()} for t in prim.get("targets", [])]
+    return attrs, faces, targets
+
+
+def face_quadrics(positions, faces):
+    """Area-weighted plane quadric (4x4) of every triangle."""
+    tri = positions[faces]
+    n = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    area = np.linalg.norm(n, axis=1)
+    n = n / np.where(area > 0, area, 1.0)[:, None]
+    plane = np.concatenate([n, -np.einsum("ij,ij->i", n, tri[:, 0])[:, None]], axis=1)
+    return 0.5 * area[:, None, None] * plane[:, :, None] * plane[:, None, :]
+
+
+def cluster_cells(positions, target_count):
+    """Grid cell index per position, with the cell size chosen to give ~target_count cells."""
+    lo = positions.min(axis=0)
+    extent = float((positions.max(axis=0) - lo).max()) or 1.0
+    low, high = extent / max(len(positions), 1) * 1e-3, extent
+    best = None
+    for _ in range(32):
+        size = np.sqrt(low * high)
+        keys = np.floor((positions - lo) / size).astype(np.int64)
+        _, cells = np.unique(keys, axis=0, return_inverse=True)
+        count = int(cells.max()) + 1
+        best = cells.reshape(-1)
+        if abs(count - target_count) <= max(1, target_count // 50):
+            break
+        if count > target_count:
+            low = size
+        else:
+            high = size
+    return best
+
+
+def representatives(positions, faces, cells, n_cells):
+    """QEM-optimal position per cell, regularised towards the cell mean and clamped to its bounds."""
+    q = np.zeros((n_cells, 4, 4))
+    fq = face_quadrics(positions, faces)
+    for k in range(3):
+        np.add.at(q, cells[faces[:, k]], fq)
+
+    counts = np.bincount(cells, minlength=n_cells).astype(np.float64)
+    mean = np.zeros((n_cells, 3))
+    np.add.at(mean, cells, positions)
+    mean /= np.maximum(counts, 1)[:, None]
+    cmin = np.full((n_cells, 3), np.inf)
+    cmax = np.full((n_cells, 3), -np.inf)
+    np.minimum.at(cmin, cells, positions)
+    np.maximum.at(cmax, cells, positions)
+
+    a, b = q[:, :3, :3], q[:, :3, 3]
+    eps = (np.trace(a, axis1=1, axis2=2) * 1e-3 + 1e-12)[:, None, None]
+    # argmin x'Ax + 2b'x + eps|x - mean|^2
+    x = np.linalg.solve(a + eps * np.eye(3), (eps[:, :, 0] * mean - b)[:, :, None])[:, :, 0]
+    return np.clip(x, cmin, cmax)
+
+
+def _write_attribute(glb, src_accessor, values):
+    acc = glb.gltf["accessors"][src_accessor]
+    if acc.get("normalized"):
+        values = values.astype(np.float32)
+    else:
+        values = values.astype(COMPONENT_DTYPES[acc["componentType"]])
+    return glb.add_accessor(values, with_bounds=("min" in acc))
+
+
+def _write_target(glb, values):
+    # Most sliders move a region of the body only; keep those targets sparse
+    moved = np.flatnonzero(np.any(values != 0, axis=1))
+    values = values.astype(np.float32)
+    if len(moved) * 3 < len(values):
+        return glb.add_sparse_accessor(values, moved, with_bounds=True)
+    return glb.add_accessor(values, with_bounds=True)
+
+
+def simplify_mesh(glb, mesh, ratio):
+    """New mesh dict with about `ratio` of the vertices (accessors are added to `glb`)."""
+    prims = mesh["primitives"]
+    data = []
+    for prim in prims:
+        if prim.get("mode", 4) != 4 or "KHR_draco_mesh_compression" in prim.get("extensions", {}):
+            raise ValueError("Only uncompressed triangle meshes are supported")
+        data.append(_read_primitive(glb, prim))
+
+    offsets = np.cumsum([0] + [len(d[0]["POSITION"]) for d in data])
+    positions = np.concatenate([d[0]["POSITION"] for d in data]).astype(np.float64)
+    faces = np.concatenate([d[1] + off for d, off in zip(data, offsets)])
+    prim_of = np.repeat(np.arange(len(prims)), np.diff(offsets))
+
+    welded, wid = weld(positions)
+    # UV charts: glTF duplicates vertices along seams, so the index graph splits there
+    graph = sparse.coo_matrix((np.ones(faces.size), (np.repeat(faces[:, 0], 3), faces.ravel())),
+                              shape=(len(positions), len(positions)))
+    _, chart = connected_components(graph, directed=False)
+
+    cells_w = cluster_cells(welded, max(4, int(len(welded) * ratio)))
+    n_cells = int(cells_w.max()) + 1
+    rep = representatives(welded, wid[faces], cells_w, n_cells)
+    cells = cells_w[wid]
+
+    # One output vertex per (primitive, cell, chart); attributes from the source
+    # vertex nearest to the collapsed position
+    _, group = np.unique(np.stack([prim_of, cells, chart], axis=1), axis=0, return_inverse=True)
+    group = group.reshape(-1)
+    dist = np.linalg.norm(positions - rep[cells], axis=1)
+    order = np.lexsort((dist, group))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = group[order][1:] != group[order][:-1]
+    chosen = order[first]  # source vertex per group, groups in ascending order
+
+    new_mesh = {k: v for k, v in mesh.items() if k != "primitives"}
+    new_mesh["primitives"] = []
+    for p, (prim, (attrs, _, targets)) in enumerate(zip(prims, data)):
+        mask = prim_of[chosen] == p
+        src = chosen[mask]
+        local_index = np.full(len(chosen), -1, dtype=np.int64)
+        local_index[mask] = np.arange(mask.sum())
+
+        tri = local_index[group[faces[prim_of[faces[:, 0]] == p]]]
+        tri = tri[(tri[:, 0] != tri[:, 1]) & (tri[:, 1] != tri[:, 2]) & (tri[:, 0] != tri[:, 2])]
+        _, keep = np.unique(np.sort(tri, axis=1), axis=0, return_index=True)
+        tri = tri[np.sort(keep)]
+
+        local_src = src - offsets[p]
+        new_prim = {k: v for k, v in prim.items() if k not in ("attributes", "indices", "targets", "extensions")}
+        new_prim["attributes"] = {}
+        for name, index in prim["attributes"].items():
+            values = rep[cells[src]] if name == "POSITION" else attrs[name][local_src]
+            if name == "NORMAL":
+                values = values / np.maximum(np.linalg.norm(values, axis=1, keepdims=True), 1e-12)
+            new_prim["attributes"][name] = _write_attribute(glb, index, values)
+        if targets:
+            new_prim["targets"] = [
+                {name: _write_target(glb, values[local_src]) for name, values in target.items()}
+                for target in targets]
+        idx_dtype = np.uint16 if mask.sum() < 0xFFFF else np.uint32
+        new_prim["indices"] = glb.add_accessor(tri.astype(idx_dtype).ravel(), target=ELEMENT_ARRAY_BUFFER)
+        new_mesh["primitives"].append(new_prim)
+    return new_mesh
+
+
+def mesh_stats(glb, mesh):
+    vertices = sum(glb.gltf["accessors"][p["attributes"]["POSITION"]]["count"] for p in mesh["primitives"])
+    triangles = sum((glb.gltf["accessors"][p["indices"]]["count"] if "indices" in p else
+                     glb.gltf["accessors"][p["attributes"]["POSITION"]]["count"]) // 3 for p in mesh["primitives"])
+    return vertices, triangles
+
+
+def _copy(glb):
+    return Glb(json.loads(json.dumps(glb.gltf)), bytes(glb.bin))
+
+
+def generate_separate(in_path, out_dir, ratios=DEFAULT_RATIOS, coverage=DEFAULT_COVERAGE):
+    """Writes <stem>_lod<N>.glb per level plus <stem>.lod.json. Returns the manifest."""
+    source = Glb.load(in_path)
+    stem = os.path.splitext(os.path.basename(in_path))[0]
+    os.makedirs(out_dir, exist_ok=True)
+
+    levels = []
+    for level, ratio in enumerate((1.0,) + tuple(ratios)):
+        glb = _copy(source)
+        if level:
+            glb.gltf["meshes"] = [simplify_mesh(glb, m, ratio) for m in glb.gltf.get("meshes", [])]
+            glb.repack()
+        counts = [mesh_stats(glb, m) for m in glb.gltf.get("meshes", [])]
+        name = f"{stem}_lod{level}.glb"
+        size = glb.save(os.path.join(out_dir, name))
+        levels.append({
+            "level": level,
+            "file": name,
+            "ratio": ratio,
+            "size": size,
+            "vertices": sum(c[0] for c in counts),
+            "triangles": sum(c[1] for c in counts),
+            "screen_coverage": coverage[level] if level < len(coverage) else 0.0,
+        })
+
+    manifest = {"source": os.path.basename(in_path), "levels": levels}
+    with open(os.path.join(out_dir, f"{stem}.lod.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def generate_msft_lod(in_path, out_path, ratios=DEFAULT_RATIOS, coverage=DEFAULT_COVERAGE):
+    """Writes one GLB where every mesh node lists its lower levels via MSFT_lod."""
+    glb = Glb.load(in_path)
+    gltf = glb.gltf
+    meshes = gltf.get("meshes", [])
+    lod_meshes = {}
+    for i in range(len(meshes)):
+        lod_meshes[i] = []
+        for ratio in ratios:
+            meshes.append(simplify_mesh(glb, meshes[i], ratio))
+            lod_meshes[i].append(len(meshes) - 1)
+
+    nodes = gltf["nodes"]
+    for node_index, mesh_index in [(i, n["mesh"]) for i, n in enumerate(nodes) if "mesh" in n]:
+        ids = []
+        for lod_mesh in lod_meshes[mesh_index]:
+            lod_node = {k: v for k, v in nodes[node_index].items() if k not in ("children", "extensions", "extras")}
+            lod_node["mesh"] = lod_mesh
+            nodes.append(lod_node)
+            ids.append(len(nodes) - 1)
+        node = nodes[node_index]
+        node.setdefault("extensions", {})["MSFT_lod"] = {"ids": ids}
+        node.setdefault("extras", {})["MSFT_screencoverage"] = list(coverage[:len(ids) + 1])
+
+    used = gltf.setdefault("extensionsUsed", [])
+    if "MSFT_lod" not in used:
+        used.append("MSFT_lod")
+    glb.repack()
+    return glb.save(out_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate LOD levels for a GLB.")
+    parser.add_argument("input", help="Body or garment GLB")
+    parser.add_argument("-o", "--output", required=True, help="Output directory (or .glb with --msft-lod)")
+    parser.add_argument("--ratios", type=float, nargs="+", default=list(DEFAULT_RATIOS),
+                        help="Vertex ratio of each extra level")
+    parser.add_argument("--msft-lod", action="store_true", help="Single file using the MSFT_lod extension")
+    args = parser.parse_args()
+
+    if args.msft_lod:
+        size = generate_msft_lod(args.input, args.output, args.ratios)
+        print(f"Saved {args.output} ({size / 1024:.1f} KB)")
+        return
+    manifest = generate_separate(args.input, args.output, args.ratios)
+    for lvl in manifest["levels"]:
+        print(f"  LOD{lvl['level']}: {lvl['vertices']} verts, {lvl['triangles']} tris, "
+              f"{lvl['size'] / 1024:.1f} KB -> {lvl['file']}")
+
+
+if __name__ == "__main__":
+    main()
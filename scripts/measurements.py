@@ -0,0 +1,168 @@
+from collections import OrderedDict
+
+import numpy as np
+
+# Bounds / body measurements for mesh objects, computed once per mesh
+# revision and shared by the fitting scripts (runs INSIDE Blender).
+#
+# Results are cached by object + a revision counter that a depsgraph handler
+# bumps whenever Blender re-evaluates the object's geometry or transform
+# (mesh edits, shape key values, modifier parameters, armature pose, moving
+# it or its parent), so asking again for an unchanged body is a dictionary
+# lookup instead of a full mesh pass. Edits only count once Blender sees them
+# (mesh.update() / depsgraph tagging), same as for evaluated_coords().
+# The cache survives importlib.reload() of this module (see
+# blender_bridge.import_preamble).
+
+# Landmark heights as a fraction of body height, measured from the feet.
+# Same values the fitting scripts used inline before.
+HEIGHT_RATIOS = {
+    "waist": 0.50,
+    "chest": 0.72,
+    "shoulder": 0.82,
+    "neck": 0.87,
+}
+
+MAX_CACHE_ENTRIES = 64
+
+# Each piece of module state has its own guard: a session that imported an
+# older version of this module already has _CACHE but not _REVISIONS.
+if "_CACHE" not in globals():
+    _CACHE = OrderedDict()
+if "_REVISIONS" not in globals():
+    _REVISIONS = {}  # object name -> revision, bumped by _on_depsgraph_update
+
+
+class Measurements:
+    """Axis-aligned bounds plus landmark heights of one mesh object."""
+
+    def __init__(self, name, bbox_min, bbox_max, vertex_count):
+        self.name = name
+        self.bbox_min = np.asarray(bbox_min, dtype=np.float64)
+        self.bbox_max = np.asarray(bbox_max, dtype=np.float64)
+        self.vertex_count = vertex_count
+        self.dimensions = self.bbox_max - self.bbox_min
+        self.center = (self.bbox_min + self.bbox_max) / 2
+
+        # Up axis: Z unless the object is clearly taller along Y (raw Y-up imports)
+        dx, dy, dz = self.dimensions
+        self.up_axis = 1 if (dy > dz and dy > dx) else 2
+        self.height = float(self.dimensions[self.up_axis])
+        self.landmarks = {name: self.height_at(r) for name, r in HEIGHT_RATIOS.items()}
+
+    def height_at(self, fraction):
+        """Absolute coordinate along the up axis at `fraction` of the height."""
+        return float(self.bbox_min[self.up_axis] + self.height * fraction)
+
+    def bounds(self):
+        """Legacy tuple used by get_bounds(): (min_x, max_x, min_y, max_y, min_z, max_z)."""
+        mn, mx = self.bbox_min, self.bbox_max
+        return (mn[0], mx[0], mn[1], mx[1], mn[2], mx[2])
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "bbox_min": self.bbox_min.tolist(),
+            "bbox_max": self.bbox_max.tolist(),
+            "dimensions": self.dimensions.tolist(),
+            "up_axis": "XYZ"[self.up_axis],
+            "landmarks": self.landmarks,
+        }
+
+
+def _coords(mesh):
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    return co.reshape(-1, 3)
+
+
+def _on_depsgraph_update(scene, depsgraph):
+    import bpy
+
+    for update in depsgraph.updates:
+        if not (update.is_updated_geometry or update.is_updated_transform):
+            continue
+        obj = update.id.original
+        if isinstance(obj, bpy.types.Object):
+            _REVISIONS[obj.name] = _REVISIONS.get(obj.name, 0) + 1
+
+
+def _on_load(*args):
+    # Objects of a newly loaded file may reuse names and revisions
+    _REVISIONS.clear()
+    _CACHE.clear()
+
+
+def _install_handlers():
+    import bpy
+
+    for handlers, fn in ((bpy.app.handlers.depsgraph_update_post, _on_depsgraph_update),
+                         (bpy.app.handlers.load_post, _on_load)):
+        if fn in handlers:
+            continue
+        # Drop the copy registered by this module before an importlib.reload()
+        for old in [h for h in handlers if getattr(h, "__module__", None) == __name__
+                    and getattr(h, "__name__", None) == fn.__name__]:
+            handlers.remove(old)
+        handlers.append(bpy.app.handlers.persistent(fn))
+
+
+def geometry_key(obj, space="world", evaluated=True):
+    """Cache key for the current revision of `obj`'s geometry (no mesh pass)."""
+    import bpy
+
+    _install_handlers()
+    # Evaluating pending changes runs the handler, so the revision is current
+    bpy.context.evaluated_depsgraph_get()
+    return (obj.name, space, evaluated, obj.as_pointer(), _REVISIONS.get(obj.name, 0))
+
+
+def evaluated_coords(obj):
+    """Vertex coordinates with shape keys and modifiers applied (what bound_box reflects)."""
+    if not obj.modifiers and not obj.data.shape_keys:
+        return _coords(obj.data)
+
+    import bpy
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    eval_obj = obj.evaluated_get(depsgraph)
+    mesh = eval_obj.to_mesh()
+    try:
+        return _coords(mesh)
+    finally:
+        eval_obj.to_mesh_clear()
+
+
+def measure(obj, space="world", evaluated=True):
+    """Returns (cached) Measurements for a mesh object in world or local space.
+
+    With evaluated=False the raw mesh data is measured, ignoring shape keys
+    and modifiers.
+    """
+    key = geometry_key(obj, space, evaluated)
+    cached = _CACHE.get(key)
+    if cached is not None:
+        _CACHE.move_to_end(key)
+        return cached
+
+    coords = evaluated_coords(obj) if evaluated else _coords(obj.data)
+    coords = coords.astype(np.float64)
+    if space == "world" and len(coords):
+        mw = np.array(obj.matrix_world, dtype=np.float64)
+        coords = coords @ mw[:3, :3].T + mw[:3, 3]
+
+    if len(coords):
+        result = Measurements(obj.name, coords.min(axis=0), coords.max(axis=0), len(coords))
+    else:
+        result = Measurements(obj.name, np.zeros(3), np.zeros(3), 0)
+
+    # Drop stale revisions of the same object before storing the new one
+    for stale in [k for k in _CACHE if k[:3] == key[:3]]:
+        del _CACHE[stale]
+    _CACHE[key] = result
+    while len(_CACHE) > MAX_CACHE_ENTRIES:
+        _CACHE.popitem(last=False)
+    return result
+
+
+def clear_cache():
+    _CACHE.clear()
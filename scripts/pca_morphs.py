@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from glb_utils import Glb
+from sparse_morphs import animated_meshes
+
+# Compresses a body's morph targets into a smaller shape basis.
+#
+# The MakeHuman/MPFB sliders are strongly correlated (height, proportions,
+# weight... all move the same regions), so the T dense targets of a mesh
+# span far fewer than T independent directions. Stacking the deltas as a
+# (T x 3V) matrix D and taking its SVD, D = U S Vt, gives
+#
+#     D ~= M @ B    with    M = U_k S_k (T x k),  B = Vt_k (k x 3V)
+#
+# B becomes the new morph targets and M maps the original slider weights to
+# component weights (c = w @ M), so the sliders stay the same for the user.
+# k is the smallest rank whose reconstruction error stays within the bound
+# for every slider at weight 1. The basis is not mean-centred: all sliders
+# at 0 must still give the base mesh.
+#
+#   python scripts/pca_morphs.py man.glb -o man_pca.glb --max-error 0.0005
+
+DEFAULT_MAX_ERROR = 0.0005  # metres, per vertex, for any single slider at weight 1
+
+
+def _mesh_targets(glb, mesh):
+    """(names, deltas (T, V, 3), normal deltas or None, primitive vertex counts)."""
+    prims = mesh["primitives"]
+    n_targets = len(prims[0].get("targets", []))
+    names = list(mesh.get("extras", {}).get("targetNames", []))
+    names += [f"target_{i}" for i in range(len(names), n_targets)]
+
+    counts = [glb.gltf["accessors"][p["attributes"]["POSITION"]]["count"] for p in prims]
+    has_normals = all("NORMAL" in t for p in prims for t in p.get("targets", []))
+    deltas = np.zeros((n_targets, sum(counts), 3), dtype=np.float64)
+    normals = np.zeros_like(deltas) if has_normals else None
+    first = 0
+    for prim, count in zip(prims, counts):
+        for t, target in enumerate(prim.get("targets", [])):
+            if "POSITION" in target:
+                deltas[t, first:first + count] = glb.read_accessor(target["POSITION"])
+            if has_normals:
+                normals[t, first:first + count] = glb.read_accessor(target["NORMAL"])
+        first += count
+    return names, deltas, normals, counts
+
+
+def choose_rank(u, s, vt, deltas, max_error):
+    """Smallest k with max per-vertex error <= max_error for every target. Returns (k, error)."""
+    residual = deltas.reshape(len(deltas), -1).copy()
+    error = float(np.linalg.norm(residual.reshape(len(deltas), -1, 3), axis=2).max()) if residual.size else 0.0
+    if error <= max_error:
+        return 0, error
+    for k in range(len(s)):
+        residual -= np.outer(u[:, k] * s[k], vt[k])
+        error = float(np.linalg.norm(residual.reshape(len(deltas), -1, 3), axis=2).max())
+        if error <= max_error:
+            return k + 1, error
+    return len(s), error
+
+
+def compress_mesh(glb, mesh, max_error=DEFAULT_MAX_ERROR, max_components=None):
+    """Replaces the mesh's targets by a PCA basis. Returns the mapping record."""
+    names, deltas, normals, counts = _mesh_targets(glb, mesh)
+    d = deltas.reshape(len(names), -1)
+    u, s, vt = np.linalg.svd(d, full_matrices=False)
+    # Directions with (numerically) zero energy never help
+    rank = int((s > s[0] * 1e-9).sum()) if len(s) and s[0] > 0 else 0
+    u, s, vt = u[:, :rank], s[:rank], vt[:rank]
+    k, error = choose_rank(u, s, vt, deltas, max_error)
+    if max_components is not None and k > max_components:
+        k = max_components
+        approx = (u[:, :k] * s[:k]) @ vt[:k]
+        error = float(np.linalg.norm((d - approx).reshape(len(names), -1, 3), axis=2).max())
+
+    mapping = u[:, :k] * s[:k]               # slider weight -> component weight
+    basis = vt[:k].reshape(k, -1, 3)
+    if normals is not None and k:
+        # Same coefficients for normals: least-squares basis for the normal deltas
+        normal_basis = ((u[:, :k] / s[:k]).T @ normals.reshape(len(names), -1)).reshape(k, -1, 3)
+
+    prims = mesh["primitives"]
+    for prim in prims:
+        prim["targets"] = []
+    for c in range(k):
+        first = 0
+        for prim, count in zip(prims, counts):
+            target = {"POSITION": glb.add_accessor(basis[c, first:first + count].astype(np.float32), with_bounds=True)}
+            if normals is not None:
+                target["NORMAL"] = glb.add_accessor(normal_basis[c, first:first + count].astype(np.float32))
+            prim["targets"].append(target)
+            first += count
+    for prim in prims:
+        if not prim["targets"]:
+            del prim["targets"]
+
+    component_names = [f"pca_{c}" for c in range(k)]
+    extras = mesh.setdefault("extras", {})
+    if k:
+        mesh["weights"] = [0.0] * k
+        extras["targetNames"] = component_names
+    else:
+        mesh.pop("weights", None)
+        extras.pop("targetNames", None)
+    record = {
+        "sliders": names,
+        "components": component_names,
+        "matrix": mapping.astype(np.float32).tolist(),
+        "max_error": error,
+    }
+    extras["morphBasis"] = record
+    return record
+
+
+def compress(glb, max_error=DEFAULT_MAX_ERROR, max_components=None, log=print):
+    """Compresses every mesh with morph targets. Returns {mesh name: mapping record}."""
+    gltf = glb.gltf
+    animated = animated_meshes(gltf)
+    records = {}
+    for i, mesh in enumerate(gltf.get("meshes", [])):
+        if not mesh["primitives"][0].get("targets"):
+            continue
+        name = mesh.get("name", f"mesh_{i}")
+        if i in animated:
+            log(f"  {name}: morph weights are animated, skipped")
+            continue
+        before = len(mesh["primitives"][0]["targets"])
+        records[name] = compress_mesh(glb, mesh, max_error, max_components)
+        for node in gltf.get("nodes", []):
+            if node.get("mesh") == i:
+                node.pop("weights", None)
+        log(f"  {name}: {before} targets -> {len(records[name]['components'])} components "
+            f"(max error {records[name]['max_error'] * 1000:.3f} mm)")
+    glb.repack()
+    return records
+
+
+def slider_weights_to_components(record, weights):
+    """Component weights for a {slider name: weight} dict - what the client does per update."""
+    w = np.array([weights.get(n, 0.0) for n in record["sliders"]], dtype=np.float64)
+    if not record["components"]:
+        return []
+    return (w @ np.array(record["matrix"], dtype=np.float64)).tolist()
+
+
+def compress_file(in_path, out_path, max_error=DEFAULT_MAX_ERROR, max_components=None):
+    glb = Glb.load(in_path)
+    records = compress(glb, max_error, max_components)
+    size_before = os.path.getsize(in_path)
+    size_after = glb.save(out_path)
+    with open(os.path.splitext(out_path)[0] + ".morphs.json", "w", encoding="utf-8") as f:
+        json.dump(records, f)
+    return records, size_before, size_after
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress GLB morph targets into a PCA shape basis.")
+    parser.add_argument("input", help="GLB with morph targets")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--max-error", type=float, default=DEFAULT_MAX_ERROR,
+                        help="Max per-vertex error (model units) for any slider at weight 1")
+    parser.add_argument("--max-components", type=int, help="Hard cap on the number of components")
+    args = parser.parse_args()
+
+    records, size_before, size_after = compress_file(args.input, args.output, args.max_error, args.max_components)
+    if not records:
+        print("No morph targets found")
+    print(f"Size: {size_before / 1024:.1f} KB -> {size_after / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,14 @@
-import socket
 import json
 import os
 import time
 
+from blender_bridge import import_preamble, send_command
+
 HOST = '127.0.0.1'
 PORT = 9876
 
 # The Blender script to be executed remotely
-BLENDER_SCRIPT = r"""
+BLENDER_SCRIPT = import_preamble("measurements") + r"""
 import bpy
 import os
 import math
@@ -19,27 +20,11 @@ def log(msg):
 
 def get_bounds(obj):
     '''Returns world space bounds: min_x, max_x, min_y, max_y, min_z, max_z'''
-    # Force update
-    bpy.context.view_layer.update()
-    
-    min_x, max_x = float('inf'), float('-inf')
-    min_y, max_y = float('inf'), float('-inf')
-    min_z, max_z = float('inf'), float('-inf')
-    
-    mw = obj.matrix_world
-    if not obj.bound_box:
+    # Cached per mesh revision (see scripts/measurements.py)
+    m = measurements.measure(obj)
+    if not m.vertex_count:
         return None
-        
-    for corner in obj.bound_box:
-        v = mw @ mathutils.Vector(corner)
-        if v.x < min_x: min_x = v.x
-        if v.x > max_x: max_x = v.x
-        if v.y < min_y: min_y = v.y
-        if v.y > max_y: max_y = v.y
-        if v.z < min_z: min_z = v.z
-        if v.z > max_z: max_z = v.z
-        
-    return (min_x, max_x, min_y, max_y, min_z, max_z)
+    return m.bounds()
 
 def run():
     EXPORT_PATH = os.path.abspath(r"E:\Orchid Gesture\client\public\models\fitted_shirt.glb")
@@ -210,22 +195,8 @@ except Exception as e:
 def main():
     print(f"Connecting to Blender on {HOST}:{PORT}...")
     try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.connect((HOST, PORT))
-            
-            # Send script
-            payload = {
-                "type": "execute_code",
-                "params": {
-                    "code": BLENDER_SCRIPT
-                }
-            }
-            msg = json.dumps(payload)
-            s.sendall(msg.encode('utf-8'))
-            
-            # Receive response
-            data = s.recv(4096).decode('utf-8')
-            print(f"Blender Response: {data}")
+        response = send_command(BLENDER_SCRIPT, "blender.create_fitted_shirt", HOST, PORT)
+        print(f"Blender Response: {json.dumps(response)}")
             
     except ConnectionRefusedError:
         print("ERROR: Could not connect to Blender. Is the socket server running?")
@@ -1,49 +1,40 @@
-import socket
 import json
 import os
 import time
 
+from blender_bridge import import_preamble, send_command
+
 HOST = '127.0.0.1'
 PORT = 9876
 
 # The Blender script to be executed remotely
-BLENDER_SCRIPT = r"""
+BLENDER_SCRIPT = import_preamble("shape_keys", "measurements", "landmarks", "body_cache") + r"""
 import bpy
 import os
+import json
 import mathutils
 import traceback
 
+# Identifies the generated body for the body snapshot and landmark caches
+BODY_PRESET = {"generator": "mpfb", "create_human": {}}
+
 def log(msg):
     print(f"[Blender] {msg}")
     with open(r"E:\Orchid Gesture\scripts\blender_run.log", "a") as f:
         f.write(f"{msg}\n")
 
 def get_bounds(obj):
-    # Force update
-    bpy.context.view_layer.update()
-    
-    min_x, max_x = float('inf'), float('-inf')
-    min_y, max_y = float('inf'), float('-inf')
-    min_z, max_z = float('inf'), float('-inf')
-    
-    mw = obj.matrix_world
-    if not obj.bound_box:
+    # Cached per mesh revision (see scripts/measurements.py)
+    m = measurements.measure(obj)
+    if not m.vertex_count:
         return None
-        
-    for corner in obj.bound_box:
-        v = mw @ mathutils.Vector(corner)
-        if v.x < min_x: min_x = v.x
-        if v.x > max_x: max_x = v.x
-        if v.y < min_y: min_y = v.y
-        if v.y > max_y: max_y = v.y
-        if v.z < min_z: min_z = v.z
-        if v.z > max_z: max_z = v.z
-        
-    return (min_x, max_x, min_y, max_y, min_z, max_z)
+    return m.bounds()
 
 def run():
-    BODY_EXPORT_PATH = os.path.abspath(r"E:\Orchid Gesture\client\public\models\mpfb_body.glb")
-    SHIRT_EXPORT_PATH = os.path.abspath(r"E:\Orchid Gesture\client\public\models\fitted_shirt.glb")
+    # Output paths can be overridden by the asset builder (scripts/asset_build.py)
+    outputs = json.loads(os.environ.get("ORCHID_BUILD") or "{}").get("outputs", {})
+    BODY_EXPORT_PATH = outputs.get("body", os.path.abspath(r"E:\Orchid Gesture\client\public\models\mpfb_body.glb"))
+    SHIRT_EXPORT_PATH = outputs.get("shirt", os.path.abspath(r"E:\Orchid Gesture\client\public\models\fitted_shirt.glb"))
     
     # 1. Clear Scene
     log("Clearing Scene...")
@@ -54,14 +45,21 @@ def run():
     for block in bpy.data.meshes: bpy.data.meshes.remove(block)
     for block in bpy.data.materials: bpy.data.materials.remove(block)
     for block in bpy.data.textures: bpy.data.textures.remove(block)
+    for block in bpy.data.armatures: bpy.data.armatures.remove(block)
     
     # 2. Create MPFB Human
+    # The body is generated once per preset/add-on version and appended from
+    # a cached .blend snapshot afterwards (see scripts/body_cache.py).
     log("Creating MPFB Human...")
     if not hasattr(bpy.ops, 'mpfb'):
         return {"status": "error", "message": "MPFB addon not found"}
         
-    try:
+    def build_human():
         bpy.ops.mpfb.create_human()
+        return bpy.context.active_object
+    
+    try:
+        body_cache.load_body(BODY_PRESET, build_human, log=log)
     except Exception as e:
         return {"status": "error", "message": f"Failed to create MPFB human: {str(e)}"}
         
@@ -84,6 +82,9 @@ def run():
     bpy.ops.object.mode_set(mode='OBJECT')
     
     # 3. Construct Loose Shirt
+    # One update so the new human's transform is current; measurements are
+    # cached afterwards, so later lookups don't repeat the mesh pass.
+    bpy.context.view_layer.update()
     bounds = get_bounds(target_mesh)
     if not bounds:
         return {"status": "error", "message": "Could not calculate bounds"}
@@ -100,9 +101,13 @@ def run():
     center_y = (bounds[2] + bounds[3]) / 2
     
     # Define Shirt Zone (Torso)
-    # Z-up: Waist to Neck
-    waist_z = bounds[4] + dim_z * 0.50 # Hips
-    neck_z = bounds[4] + dim_z * 0.87 # Neck
+    # Z-up: Hips to Neck, from the rig (scripts/landmarks.py) rather than
+    # fixed height ratios; falls back to bbox ratios if the rig is missing.
+    lm = landmarks.extract(body if body.type == 'ARMATURE' else None, target_mesh,
+                            preset=body_cache.preset_descriptor(BODY_PRESET))
+    log(f"Landmarks ({lm['source']}): {lm['heights']}")
+    waist_z = lm["heights"]["hips"] # Hips
+    neck_z = lm["heights"]["neck"] # Neck
     shirt_height = neck_z - waist_z
     shirt_center_z = waist_z + shirt_height / 2
     
@@ -352,22 +357,8 @@ except Exception as e:
 def main():
     print(f"Connecting to Blender on {HOST}:{PORT}...")
     try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.connect((HOST, PORT))
-            
-            # Send script
-            payload = {
-                "type": "execute_code",
-                "params": {
-                    "code": BLENDER_SCRIPT
-                }
-            }
-            msg = json.dumps(payload)
-            s.sendall(msg.encode('utf-8'))
-            
-            # Receive response
-            data = s.recv(4096).decode('utf-8')
-            print(f"Blender Response: {data}")
+        response = send_command(BLENDER_SCRIPT, "blender.create_mpfb_scene", HOST, PORT)
+        print(f"Blender Response: {json.dumps(response)}")
             
     except ConnectionRefusedError:
         print("ERROR: Could not connect to Blender. Is the socket server running?")
@@ -1,5 +1,6 @@
 import bpy
 import os
+import json
 import mathutils
 
 # 配置
@@ -13,12 +14,21 @@ OFFSET_X = -0.382
 OFFSET_Z = 1.086
 TARGET_SHOULDER_Z = 1.45
 
+# 由 scripts/asset_build.py 调用时，输入/输出路径和参数从 ORCHID_BUILD 环境变量传入
+BUILD = json.loads(os.environ.get("ORCHID_BUILD") or "{}")
+if BUILD:
+    _params = BUILD.get("params", {})
+    SCALE_FACTOR = _params.get("scale_factor", SCALE_FACTOR)
+    OFFSET_X = _params.get("offset_x", OFFSET_X)
+    OFFSET_Z = _params.get("offset_z", OFFSET_Z)
+    TARGET_SHOULDER_Z = _params.get("target_shoulder_z", TARGET_SHOULDER_Z)
+
 def run():
     # 清除场景
     bpy.ops.wm.read_factory_settings(use_empty=True)
     
-    in_path = os.path.join(MODELS_DIR, INPUT_FILE)
-    out_path = os.path.join(MODELS_DIR, OUTPUT_FILE)
+    in_path = BUILD["inputs"][0] if BUILD else os.path.join(MODELS_DIR, INPUT_FILE)
+    out_path = BUILD["outputs"]["glb"] if BUILD else os.path.join(MODELS_DIR, OUTPUT_FILE)
     
     if not os.path.exists(in_path):
         print(f"Error: Input file not found: {in_path}")
@@ -0,0 +1,82 @@
+import bpy
+import os
+import json
+
+import numpy as np
+
+# Samples an animated / simulated mesh once per frame (runs INSIDE Blender).
+# Started by scripts/bake_vat.py through blender_headless.py with the scene
+# .blend opened; the object, frame range and output paths arrive in the
+# ORCHID_BUILD environment variable:
+#   {"outputs": {"frames": "cache/vat/shirt.npz", "glb": "shirt.glb"},
+#    "params": {"object": "DeformableCloth_Demo", "frame_start": 1, "frame_end": 200, "step": 1}}
+#
+# Positions are stored in object space and already converted to glTF axes
+# (Y up), so they line up with the exported GLB vertices. Frames are stepped
+# in order from frame_start, which is what cloth caches need.
+
+BUILD = json.loads(os.environ.get("ORCHID_BUILD") or "{}")
+PARAMS = BUILD.get("params", {})
+
+
+def to_gltf_axes(co):
+    # Blender Z-up -> glTF Y-up, same as export_yup=True
+    return np.stack([co[:, 0], co[:, 2], -co[:, 1]], axis=1)
+
+
+def mesh_positions(mesh):
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    return to_gltf_axes(co.reshape(-1, 3))
+
+
+def run():
+    out_path = BUILD["outputs"]["frames"]
+    scene = bpy.context.scene
+    obj = bpy.data.objects.get(PARAMS.get("object", ""))
+    if obj is None or obj.type != 'MESH':
+        raise RuntimeError(f"Mesh object '{PARAMS.get('object')}' not found")
+
+    start = int(PARAMS.get("frame_start", scene.frame_start))
+    end = int(PARAMS.get("frame_end", scene.frame_end))
+    step = max(1, int(PARAMS.get("step", 1)))
+
+    # Rest pose = the mesh data itself (what the glTF exporter writes without export_apply)
+    rest = mesh_positions(obj.data)
+    frames = []
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    for frame in range(start, end + 1, step):
+        scene.frame_set(frame)
+        evaluated = obj.evaluated_get(depsgraph)
+        mesh = evaluated.to_mesh()
+        if len(mesh.vertices) != len(rest):
+            evaluated.to_mesh_clear()
+            raise RuntimeError(f"Frame {frame}: vertex count changed ({len(mesh.vertices)} != {len(rest)}), "
+                               "modifiers that add/remove geometry can't be baked")
+        frames.append(mesh_positions(mesh))
+        evaluated.to_mesh_clear()
+    print(f"Sampled {len(frames)} frames of {obj.name} ({len(rest)} vertices)")
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    np.savez(out_path, rest=rest, frames=np.stack(frames),
+             fps=np.float32(scene.render.fps / scene.render.fps_base * 1.0 / step))
+
+    glb_path = BUILD["outputs"].get("glb")
+    if glb_path:
+        bpy.ops.object.select_all(action='DESELECT')
+        obj.select_set(True)
+        scene.frame_set(start)
+        print(f"Exporting {glb_path}...")
+        bpy.ops.export_scene.gltf(
+            filepath=glb_path,
+            export_format='GLB',
+            use_selection=True,
+            export_apply=False,  # Base mesh; the motion lives in the VAT
+            export_morph=True,
+            export_skins=True,
+            export_animations=False,
+            export_yup=True,
+        )
+
+
+run()
@@ -0,0 +1,112 @@
+import numpy as np
+
+# Garment part segmentation (collar / sleeves / torso) computed in NumPy.
+#
+# A segmentation is an ordered list of rules. Each rule maps vertex
+# coordinates to a membership in [0, 1]; earlier rules take precedence and
+# later rules only get what is left, so the resulting weights always sum to 1
+# per vertex. The last rule usually takes everything that remains (Torso).
+# New rules (e.g. geodesic distance from the armpit) only need to follow the
+# same signature: rule(coords, bbox_min, bbox_max) -> (V,) float array.
+
+AXES = {"x": 0, "y": 1, "z": 2}
+
+
+def ramp(values, edge, width):
+    """0 below `edge`, 1 above it, with a smoothstep band of `width` centred on the edge."""
+    if width <= 0:
+        return (values > edge).astype(np.float32)
+    t = np.clip((values - edge) / width + 0.5, 0.0, 1.0)
+    return (t * t * (3.0 - 2.0 * t)).astype(np.float32)
+
+
+def above(axis, fraction, falloff=0.0, max_abs_x=None):
+    """Vertices in the top `fraction` of the bbox along `axis` (e.g. collar = top 15% of Z).
+
+    `falloff` is the width of the blend band as a fraction of that extent.
+    `max_abs_x` optionally restricts the part to |x| < max_abs_x * bbox width.
+    """
+    a = AXES[axis]
+
+    def rule(coords, bbox_min, bbox_max):
+        extent = bbox_max[a] - bbox_min[a]
+        m = ramp(coords[:, a], bbox_max[a] - extent * fraction, extent * falloff)
+        if max_abs_x is not None:
+            width = bbox_max[0] - bbox_min[0]
+            m *= 1.0 - ramp(np.abs(coords[:, 0]), width * max_abs_x, width * falloff)
+        return m
+    return rule
+
+
+def beyond_x(fraction, side, falloff=0.0):
+    """Vertices with side * x > fraction * bbox width (sleeves: outer part on each side)."""
+
+    def rule(coords, bbox_min, bbox_max):
+        width = bbox_max[0] - bbox_min[0]
+        return ramp(side * coords[:, 0], width * fraction, width * falloff)
+    return rule
+
+
+def remainder():
+    def rule(coords, bbox_min, bbox_max):
+        return np.ones(len(coords), dtype=np.float32)
+    return rule
+
+
+def shirt_rules(falloff=0.05, collar_max_abs_x=None):
+    """Bbox-threshold rules used by add_part_controls.py / setup_blue_shirt_controls.py."""
+    return [
+        ("Collar", above("z", 0.15, falloff, collar_max_abs_x)),
+        ("Sleeve_L", beyond_x(0.25, 1.0, falloff)),
+        ("Sleeve_R", beyond_x(0.25, -1.0, falloff)),
+        ("Torso", remainder()),
+    ]
+
+
+def segment(coords, rules, bbox_min=None, bbox_max=None):
+    """Returns {part name: (V,) float32 weights} for the given (V, 3) coordinates."""
+    coords = np.asarray(coords, dtype=np.float32)
+    if bbox_min is None:
+        bbox_min = coords.min(axis=0)
+    if bbox_max is None:
+        bbox_max = coords.max(axis=0)
+
+    remaining = np.ones(len(coords), dtype=np.float32)
+    weights = {}
+    for name, rule in rules:
+        w = remaining * np.clip(rule(coords, bbox_min, bbox_max), 0.0, 1.0)
+        weights[name] = w
+        remaining = remaining - w
+    return weights
+
+
+def quantize(weights, levels=32):
+    return np.round(np.asarray(weights) * levels) / levels
+
+
+def assign_groups(obj, weights, levels=32):
+    """Writes part weights into vertex groups (runs inside Blender).
+
+    VertexGroup.add takes one weight for a list of indices, so weights are
+    quantized to `levels` steps and each group gets one add() call per
+    distinct weight: a single call for hard masks, at most `levels` for soft
+    boundaries. Returns the quantized weights actually written.
+    """
+    written = {}
+    for name, w in weights.items():
+        vg = obj.vertex_groups.get(name)
+        if vg is not None:
+            obj.vertex_groups.remove(vg)
+        vg = obj.vertex_groups.new(name=name)
+
+        q = quantize(w, levels).astype(np.float32)
+        nonzero = np.flatnonzero(q > 0)
+        values = q[nonzero]
+        order = np.argsort(values, kind="stable")
+        nonzero, values = nonzero[order], values[order]
+        splits = np.flatnonzero(np.diff(values)) + 1
+        for idx, val in zip(np.split(nonzero, splits), np.split(values, splits)):
+            if len(idx):
+                vg.add(idx.tolist(), float(val[0]), 'REPLACE')
+        written[name] = q
+    return written
@@ -1,8 +1,10 @@
-import socket
 import json
 import textwrap
 import os
 
+from blender_bridge import import_preamble, send_command
+from sparse_morphs import sparsify_file
+
 HOST = '127.0.0.1'
 PORT = 9876
 EXPORT_PATH = os.path.abspath("models/Blue_Outdoor_Shirt.glb").replace("\\", "/")
@@ -10,7 +12,7 @@ EXPORT_PATH = os.path.abspath("models/Blue_Outdoor_Shirt.glb").replace("\\", "/"
 def setup_controls():
     print("Setting up controls for Blue Shirt...")
     
-    blender_script = textwrap.dedent(f"""
+    blender_script = import_preamble("shape_keys", "segmentation") + textwrap.dedent(f"""
     import bpy
     import math
     import mathutils
@@ -39,81 +41,25 @@ def setup_controls():
         # 2. Setup Vertex Groups
         obj.vertex_groups.clear()
         
-        vg_sleeve_l = obj.vertex_groups.new(name="Sleeve_L")
-        vg_sleeve_r = obj.vertex_groups.new(name="Sleeve_R")
-        vg_collar = obj.vertex_groups.new(name="Collar")
-        vg_torso = obj.vertex_groups.new(name="Torso")
-        
-        # Calculate bounding box
-        bbox_min = [min(v.co[i] for v in obj.data.vertices) for i in range(3)]
-        bbox_max = [max(v.co[i] for v in obj.data.vertices) for i in range(3)]
-        
-        width = bbox_max[0] - bbox_min[0]
-        height = bbox_max[2] - bbox_min[2]
-        
         # Thresholds (tuned for a shirt)
-        # Center is roughly 0. Sleeves are at +/- X.
-        # Collar is at +Z.
-        
-        x_limit = width * 0.25 
-        z_collar_limit = bbox_max[2] - (height * 0.15)
-        
-        for v in obj.data.vertices:
-            co = v.co
-            if co.z > z_collar_limit and abs(co.x) < width * 0.2:
-                vg_collar.add([v.index], 1.0, 'REPLACE')
-            elif co.x > x_limit:
-                vg_sleeve_l.add([v.index], 1.0, 'REPLACE')
-            elif co.x < -x_limit:
-                vg_sleeve_r.add([v.index], 1.0, 'REPLACE')
-            else:
-                vg_torso.add([v.index], 1.0, 'REPLACE')
+        # Center is roughly 0. Sleeves are at +/- X (outer 25%).
+        # Collar is at +Z (top 15%, within 20% of the width around the center).
+        # One bulk add() per group/weight level (see scripts/segmentation.py).
+        coords = shape_keys.read_coords(obj.data.vertices)
+        rules = segmentation.shirt_rules(falloff=0.05, collar_max_abs_x=0.2)
+        weights = segmentation.assign_groups(obj, segmentation.segment(coords, rules))
                 
         # 3. Add Shape Keys
-        if not obj.data.shape_keys:
-            obj.shape_key_add(name="Basis")
-            
-        # Helper to translate vertices
-        def add_translation_key(name, vg_name, vec):
-             if name in obj.data.shape_keys.key_blocks:
-                obj.shape_key_remove(obj.data.shape_keys.key_blocks[name])
-             
-             key = obj.shape_key_add(name=name)
-             vg_idx = obj.vertex_groups[vg_name].index
-             
-             for v in obj.data.vertices:
-                 w = 0
-                 for g in v.groups:
-                     if g.group == vg_idx:
-                         w = g.weight
-                         break
-                 if w > 0:
-                     key.data[v.index].co += mathutils.Vector(vec) * w
+        # Deltas are computed in NumPy from the part weights and written back
+        # with foreach_set (see scripts/shape_keys.py).
+        base = shape_keys.basis_coords(obj)
 
         # Sleeve Length
-        add_translation_key("Sleeve_L_Longer", "Sleeve_L", (0.5, 0, 0))
-        add_translation_key("Sleeve_R_Longer", "Sleeve_R", (-0.5, 0, 0))
-        
-        # Collar Height/Scale
-        # For collar, we might want to scale it up.
-        if "Collar_Bigger" in obj.data.shape_keys.key_blocks:
-            obj.shape_key_remove(obj.data.shape_keys.key_blocks["Collar_Bigger"])
+        shape_keys.add_translation_key(obj, "Sleeve_L_Longer", weights["Sleeve_L"], (0.5, 0, 0), base)
+        shape_keys.add_translation_key(obj, "Sleeve_R_Longer", weights["Sleeve_R"], (-0.5, 0, 0), base)
         
-        key_collar = obj.shape_key_add(name="Collar_Bigger")
-        vg_collar_idx = vg_collar.index
-        
-        # Find center of collar
-        collar_verts = [v for v in obj.data.vertices if vg_collar_idx in [g.group for g in v.groups]]
-        if collar_verts:
-            avg_x = sum(v.co.x for v in collar_verts) / len(collar_verts)
-            avg_y = sum(v.co.y for v in collar_verts) / len(collar_verts)
-            avg_z = sum(v.co.z for v in collar_verts) / len(collar_verts)
-            center = mathutils.Vector((avg_x, avg_y, avg_z))
-            
-            for v in collar_verts:
-                # Scale out from center
-                dir = (v.co - center) * 0.5 # 50% bigger
-                key_collar.data[v.index].co += dir
+        # Collar Height/Scale: scale out from the collar center, 50% bigger
+        shape_keys.add_scale_key(obj, "Collar_Bigger", weights["Collar"], 1.5, base)
 
         print("Shape Keys created.")
 
@@ -130,24 +76,23 @@ def setup_controls():
     """)
     
     try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(60)
-        s.connect((HOST, PORT))
-        
-        payload = {
-            "type": "execute_code",
-            "params": {
-                "code": blender_script
-            }
-        }
-        s.sendall(json.dumps(payload).encode('utf-8'))
-        
-        resp = s.recv(4096)
-        print(f"Response: {resp.decode('utf-8')}")
-        s.close()
+        resp = send_command(blender_script, "blender.setup_blue_shirt_controls", HOST, PORT, timeout=60)
+        print(f"Response: {json.dumps(resp)}")
         
     except Exception as e:
         print(f"Error: {e}")
+        return
+
+    # 5. Shrink the exported morph targets (each key only moves one vertex group)
+    if os.path.exists(EXPORT_PATH):
+        try:
+            stats, size_before, size_after = sparsify_file(EXPORT_PATH)
+            sparse = sum(1 for st in stats if st["encoding"] == "sparse")
+            dropped = sum(1 for st in stats if st["encoding"] == "dropped")
+            print(f"Sparse morphs: {sparse} sparse, {dropped} dropped, "
+                  f"{size_before / 1024:.1f} KB -> {size_after / 1024:.1f} KB")
+        except Exception as e:
+            print(f"Sparse morph pass failed, keeping dense export: {e}")
 
 if __name__ == "__main__":
     setup_controls()
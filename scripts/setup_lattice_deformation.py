@@ -1,14 +1,15 @@
-import socket
 import json
 import textwrap
 
+from blender_bridge import import_preamble, send_command
+
 HOST = '127.0.0.1'
 PORT = 9876
 
 def setup_lattice():
     print("Connecting to Blender to setup Lattice Deformation...")
     
-    blender_script = textwrap.dedent("""
+    blender_script = import_preamble("measurements") + textwrap.dedent("""
     import bpy
     import math
 
@@ -37,6 +38,10 @@ def setup_lattice():
             obj.rotation_euler[0] += math.radians(90)
             bpy.ops.object.transform_apply(location=False, rotation=True, scale=False)
             
+        # Measure the base mesh before the subdivision modifier is added
+        # (cached per mesh revision, see scripts/measurements.py)
+        m = measurements.measure(obj, space="local", evaluated=False)
+        
         # 3. Add Subdivision Surface (High density for "pixel" control)
         mod_subsurf = obj.modifiers.new(name="HighRes_Subsurf", type='SUBSURF')
         mod_subsurf.levels = 2
@@ -45,11 +50,8 @@ def setup_lattice():
         
         # 4. Add Lattice
         # Calculate bounds
-        bbox_min = [min(v.co[i] for v in obj.data.vertices) for i in range(3)]
-        bbox_max = [max(v.co[i] for v in obj.data.vertices) for i in range(3)]
-        
-        center = [(bbox_min[i] + bbox_max[i])/2 for i in range(3)]
-        size = [(bbox_max[i] - bbox_min[i]) * 1.2 for i in range(3)] # 20% padding
+        center = m.center.tolist()
+        size = (m.dimensions * 1.2).tolist() # 20% padding
         
         bpy.ops.object.add(type='LATTICE', location=center)
         lat = bpy.context.active_object
@@ -75,21 +77,8 @@ def setup_lattice():
     """)
     
     try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(10)
-        s.connect((HOST, PORT))
-        
-        payload = {
-            "type": "execute_code",
-            "params": {
-                "code": blender_script
-            }
-        }
-        s.sendall(json.dumps(payload).encode('utf-8'))
-        
-        resp = s.recv(4096)
-        print(f"Response: {resp.decode('utf-8')}")
-        s.close()
+        resp = send_command(blender_script, "blender.setup_lattice", HOST, PORT, timeout=10)
+        print(f"Response: {json.dumps(resp)}")
         
     except Exception as e:
         print(f"Error: {e}")
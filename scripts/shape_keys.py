@@ -0,0 +1,92 @@
+import numpy as np
+
+# Shape key helpers that run INSIDE Blender (imported by the remote scripts).
+# Coordinates and weights are moved in and out of Blender in bulk with
+# foreach_get/foreach_set; all per-vertex math happens in NumPy.
+
+
+def read_coords(collection):
+    """Reads `.co` from mesh.vertices or key_block.data into a (V, 3) float32 array."""
+    co = np.empty(len(collection) * 3, dtype=np.float32)
+    collection.foreach_get("co", co)
+    return co.reshape(-1, 3)
+
+
+def write_coords(collection, coords):
+    collection.foreach_set("co", np.ascontiguousarray(coords, dtype=np.float32).ravel())
+
+
+def read_group_weights(obj, names):
+    """Returns {group name: (V,) weights} for the given vertex groups.
+
+    Blender has no bulk accessor for vertex group weights, so this walks the
+    vertices once for all requested groups instead of once per shape key.
+    """
+    n = len(obj.data.vertices)
+    by_index = {}
+    result = {}
+    for name in names:
+        vg = obj.vertex_groups.get(name)
+        result[name] = np.zeros(n, dtype=np.float32)
+        if vg is not None:
+            by_index[vg.index] = result[name]
+    if not by_index:
+        return result
+
+    for v in obj.data.vertices:
+        for g in v.groups:
+            w = by_index.get(g.group)
+            if w is not None:
+                w[v.index] = g.weight
+    return result
+
+
+def basis_coords(obj):
+    """Coordinates of the reference (Basis) key, creating it if needed."""
+    if not obj.data.shape_keys:
+        obj.shape_key_add(name="Basis")
+    return read_coords(obj.data.shape_keys.reference_key.data)
+
+
+def new_key(obj, name):
+    """(Re)creates a shape key initialised from the Basis."""
+    if not obj.data.shape_keys:
+        obj.shape_key_add(name="Basis")
+    old = obj.data.shape_keys.key_blocks.get(name)
+    if old is not None:
+        obj.shape_key_remove(old)
+    return obj.shape_key_add(name=name, from_mix=False)
+
+
+def translation_deltas(weights, vec):
+    return weights[:, None] * np.asarray(vec, dtype=np.float32)[None, :]
+
+
+def scale_deltas(coords, weights, factor, center=None):
+    """Deltas that scale weighted vertices about `center` (default: mean of the group)."""
+    members = weights > 0
+    if not members.any():
+        return np.zeros_like(coords)
+    if center is None:
+        center = coords[members].mean(axis=0)
+    center = np.asarray(center, dtype=np.float32)
+    return (coords - center) * ((factor - 1.0) * weights)[:, None]
+
+
+def set_key_deltas(obj, name, deltas, base=None):
+    """Creates/replaces shape key `name` as Basis + deltas."""
+    if base is None:
+        base = basis_coords(obj)
+    key = new_key(obj, name)
+    write_coords(key.data, base + deltas)
+    return key
+
+
+def add_translation_key(obj, name, weights, vec, base=None):
+    return set_key_deltas(obj, name, translation_deltas(weights, vec), base)
+
+
+def add_scale_key(obj, name, weights, factor, base=None, center=None):
+    if base is None:
+        base = basis_coords(obj)
+    return set_key_deltas(obj, name, scale_deltas(base, weights, factor, center), base)
@@ -0,0 +1,164 @@
+import argparse
+import os
+
+import numpy as np
+
+from glb_utils import Glb
+
+# Post-export pass for garment GLBs.
+# Blender's glTF exporter writes every shape key as a dense delta for every
+# vertex, even though our part controls (Sleeve_L_Longer, Collar_Bigger,
+# Torso_Wider, ...) only move one vertex group each. This rewrites those
+# targets as sparse accessors and drops targets that do not move anything.
+
+DEFAULT_MAX_DENSITY = 0.5  # Go sparse when at most 50% of the deltas are non-zero
+
+
+def animated_meshes(gltf):
+    """Meshes whose morph weights are driven by an animation (target indices must stay stable)."""
+    nodes = gltf.get("nodes", [])
+    meshes = set()
+    for anim in gltf.get("animations", []):
+        for channel in anim.get("channels", []):
+            target = channel.get("target", {})
+            if target.get("path") == "weights" and "node" in target:
+                mesh = nodes[target["node"]].get("mesh")
+                if mesh is not None:
+                    meshes.add(mesh)
+    return meshes
+
+
+def _drop_targets(gltf, mesh_index, drop):
+    """Removes target indices `drop` from every primitive of a mesh plus the matching weights/names."""
+    mesh = gltf["meshes"][mesh_index]
+    keep = lambda seq: [x for i, x in enumerate(seq) if i not in drop]
+
+    for prim in mesh["primitives"]:
+        prim["targets"] = keep(prim["targets"])
+        if not prim["targets"]:
+            del prim["targets"]
+    if "weights" in mesh:
+        mesh["weights"] = keep(mesh["weights"])
+    extras = mesh.get("extras", {})
+    if "targetNames" in extras:
+        extras["targetNames"] = keep(extras["targetNames"])
+    for node in gltf.get("nodes", []):
+        if node.get("mesh") == mesh_index and "weights" in node:
+            node["weights"] = keep(node["weights"])
+
+    if not mesh.get("weights"):
+        mesh.pop("weights", None)
+    if "targetNames" in extras and not extras["targetNames"]:
+        del extras["targetNames"]
+
+
+def sparsify(glb, max_density=DEFAULT_MAX_DENSITY, drop_zero=True):
+    """Rewrites morph targets of `glb` in place. Returns a list of per-target stats."""
+    gltf = glb.gltf
+    animated = animated_meshes(gltf)
+    stats = []
+
+    for mesh_index, mesh in enumerate(gltf.get("meshes", [])):
+        names = mesh.get("extras", {}).get("targetNames", [])
+        n_targets = max((len(p.get("targets", [])) for p in mesh["primitives"]), default=0)
+        if not n_targets:
+            continue
+
+        zero_targets = set(range(n_targets))
+        for prim in mesh["primitives"]:
+            for t, target in enumerate(prim.get("targets", [])):
+                for attr, acc_index in list(target.items()):
+                    original = glb.read_accessor(acc_index)
+                    moved = np.flatnonzero(np.any(original != 0, axis=1))
+                    density = len(moved) / max(len(original), 1)
+                    if len(moved):
+                        zero_targets.discard(t)
+
+                    if density > max_density:
+                        encoding = "dense"
+                    else:
+                        encoding = "sparse"
+                        target[attr] = glb.add_sparse_accessor(
+                            original, moved, with_bounds=(attr == "POSITION"))
+                        # Verification: the rewritten accessor must decode to the
+                        # exact same deltas, so any weight mix deforms identically.
+                        if not np.array_equal(glb.read_accessor(target[attr]), original):
+                            raise RuntimeError(
+                                f"Sparse re-encoding changed mesh {mesh_index} target {t} {attr}")
+
+                    stats.append({
+                        "mesh": mesh.get("name", str(mesh_index)),
+                        "target": names[t] if t < len(names) else str(t),
+                        "attribute": attr,
+                        "moved": int(len(moved)),
+                        "count": int(len(original)),
+                        "encoding": encoding,
+                    })
+
+        if drop_zero and zero_targets and mesh_index not in animated:
+            _drop_targets(gltf, mesh_index, zero_targets)
+            for t in sorted(zero_targets):
+                stats.append({
+                    "mesh": mesh.get("name", str(mesh_index)),
+                    "target": names[t] if t < len(names) else str(t),
+                    "attribute": "*",
+                    "moved": 0,
+                    "count": 0,
+                    "encoding": "dropped",
+                })
+
+    glb.repack()
+    return stats
+
+
+def deformed_positions(glb, mesh_index, prim_index, weights):
+    """Base POSITION + weighted target deltas, as the client would evaluate it."""
+    prim = glb.gltf["meshes"][mesh_index]["primitives"][prim_index]
+    pos = glb.read_accessor(prim["attributes"]["POSITION"]).astype(np.float64)
+    for w, target in zip(weights, prim.get("targets", [])):
+        if w and "POSITION" in target:
+            pos += w * glb.read_accessor(target["POSITION"])
+    return pos
+
+
+def sparsify_file(in_path, out_path=None, max_density=DEFAULT_MAX_DENSITY, drop_zero=True):
+    """Runs the pass on a GLB file and checks the fully-deformed meshes match the input."""
+    out_path = out_path or in_path
+    before = Glb.load(in_path)
+    glb = Glb.load(in_path)
+    stats = sparsify(glb, max_density=max_density, drop_zero=drop_zero)
+
+    # End-to-end check: every mesh with all surviving targets at weight 1.0
+    # must land on the same positions as the original with all targets at 1.0
+    # (dropped targets were zero, so they contribute nothing either way).
+    for m, mesh in enumerate(before.gltf.get("meshes", [])):
+        for p, prim in enumerate(mesh["primitives"]):
+            ref = deformed_positions(before, m, p, [1.0] * len(prim.get("targets", [])))
+            new_prim = glb.gltf["meshes"][m]["primitives"][p]
+            new = deformed_positions(glb, m, p, [1.0] * len(new_prim.get("targets", [])))
+            if not np.array_equal(ref, new):
+                raise RuntimeError(f"Deformed result differs for mesh {m} primitive {p}")
+
+    size_before = os.path.getsize(in_path)
+    size_after = glb.save(out_path)
+    return stats, size_before, size_after
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite GLB morph targets as sparse accessors.")
+    parser.add_argument("input", help="GLB exported from Blender")
+    parser.add_argument("-o", "--output", help="Output path (default: overwrite input)")
+    parser.add_argument("--max-density", type=float, default=DEFAULT_MAX_DENSITY,
+                        help="Use sparse encoding when moved/total <= this ratio")
+    parser.add_argument("--keep-zero", action="store_true", help="Do not drop all-zero targets")
+    args = parser.parse_args()
+
+    stats, size_before, size_after = sparsify_file(
+        args.input, args.output, max_density=args.max_density, drop_zero=not args.keep_zero)
+    for s in stats:
+        print(f"  {s['mesh']}/{s['target']} {s['attribute']}: {s['encoding']} ({s['moved']}/{s['count']} moved)")
+    print(f"Size: {size_before / 1024:.1f} KB -> {size_after / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from glb_utils import Glb
+from garment_fit import BodyProxy, largest_mesh_node, read_mesh, weld
+
+# Skin weight transfer from a rigged body GLB to garment GLBs (no Blender).
+#
+# Replaces the ARMATURE_AUTO parenting + DATA_TRANSFER modifier round trip in
+# auto_rig_clothing.py: every garment vertex takes the bone weights of the
+# closest point on the body surface (barycentric blend of the three body
+# vertices), limited to 4 influences and normalised. The body's skeleton and
+# inverse bind matrices are copied into the garment so it can be skinned on
+# its own or bound to the body skeleton by joint name in the client.
+#
+#   python scripts/weight_transfer.py body_rigged.glb shirt.glb pants.glb -o rigged/ -j 4
+
+MAX_INFLUENCES = 4  # JOINTS_0/WEIGHTS_0 are VEC4
+
+
+def skinned_body_node(glb):
+    """Largest mesh node that has a skin."""
+    best, best_count = None, -1
+    for node_index, mesh_index in glb.mesh_nodes():
+        if "skin" not in glb.gltf["nodes"][node_index]:
+            continue
+        prims = glb.gltf["meshes"][mesh_index]["primitives"]
+        count = sum(glb.gltf["accessors"][p["attributes"]["POSITION"]]["count"] for p in prims)
+        if count > best_count:
+            best, best_count = node_index, count
+    return best
+
+
+def read_skin_weights(glb, node_index, layout):
+    """Dense (vertex, joint) weight matrix for a skinned node, vertices in read_mesh() order."""
+    node = glb.gltf["nodes"][node_index]
+    n_joints = len(glb.gltf["skins"][node["skin"]]["joints"])
+    mesh = glb.gltf["meshes"][node["mesh"]]
+    n_vertices = sum(count for _, _, count in layout)
+    dense = np.zeros((n_vertices, n_joints), dtype=np.float32)
+
+    for p, first, count in layout:
+        attrs = mesh["primitives"][p]["attributes"]
+        rows = np.arange(first, first + count)
+        s = 0
+        while f"JOINTS_{s}" in attrs and f"WEIGHTS_{s}" in attrs:
+            joints = glb.read_accessor(attrs[f"JOINTS_{s}"]).astype(np.int64)
+            weights = glb.read_accessor(attrs[f"WEIGHTS_{s}"]).astype(np.float32)
+            np.add.at(dense, (np.repeat(rows, joints.shape[1]), joints.ravel()), weights.ravel())
+            s += 1
+    return dense
+
+
+def limit_influences(weights, max_influences=MAX_INFLUENCES):
+    """(joints, weights) with the `max_influences` (at most 4) largest weights per row, normalised."""
+    k = min(max_influences, MAX_INFLUENCES, weights.shape[1])
+    joints = np.argpartition(-weights, k - 1, axis=1)[:, :k]
+    top = np.take_along_axis(weights, joints, axis=1)
+    order = np.argsort(-top, axis=1)
+    joints = np.take_along_axis(joints, order, axis=1)
+    top = np.clip(np.take_along_axis(top, order, axis=1), 0.0, None)
+
+    total = top.sum(axis=1, keepdims=True)
+    unweighted = total[:, 0] <= 0
+    # Vertices with no influence at all follow the most used joint (usually the root/pelvis)
+    top[unweighted] = 0.0
+    top[unweighted, 0] = 1.0
+    joints[unweighted, 0] = int(np.argmax(weights.sum(axis=0)))
+    top /= np.maximum(top.sum(axis=1, keepdims=True), 1e-12)
+    joints[top == 0] = 0
+
+    if k < MAX_INFLUENCES:
+        pad = MAX_INFLUENCES - k
+        joints = np.pad(joints, ((0, 0), (0, pad)))
+        top = np.pad(top, ((0, 0), (0, pad)))
+    return joints, top.astype(np.float32)
+
+
+class SkinnedBody:
+    """Body surface proxy plus per-vertex bone weights and the skeleton to copy."""
+
+    def __init__(self, glb, node_index=None):
+        if node_index is None:
+            node_index = skinned_body_node(glb)
+        if node_index is None:
+            raise ValueError("Body GLB contains no skinned mesh")
+        self.glb = glb
+        self.node_index = node_index
+        self.skin = glb.gltf["skins"][glb.gltf["nodes"][node_index]["skin"]]
+
+        positions, faces, layout = read_mesh(glb, node_index)
+        self.proxy = BodyProxy(positions, faces)
+        dense = read_skin_weights(glb, node_index, layout)
+        self.weights = dense[self.proxy.source_index]
+
+        ibm = self.skin.get("inverseBindMatrices")
+        if ibm is not None:
+            self.inverse_bind = glb.read_accessor(ibm).astype(np.float32)
+        else:
+            self.inverse_bind = np.tile(np.eye(4, dtype=np.float32).T.ravel(), (len(self.skin["joints"]), 1))
+
+    def transfer(self, points, max_influences=MAX_INFLUENCES):
+        """(joints, weights, distance) for garment points in the body's bind space."""
+        closest, face, bary = self.proxy.query(points)
+        dense = self.proxy.interpolate(self.weights, face, bary)
+        joints, weights = limit_influences(dense, max_influences)
+        return joints, weights, np.linalg.norm(points - closest, axis=1)
+
+    def copy_skeleton(self, garment):
+        """Copies joint nodes (plus their ancestors) into `garment`. Returns the new skin index."""
+        src_nodes = self.glb.gltf["nodes"]
+        parents = {c: i for i, n in enumerate(src_nodes) for c in n.get("children", [])}
+        needed = set()
+        for j in self.skin["joints"]:
+            while j is not None and j not in needed:
+                needed.add(j)
+                j = parents.get(j)
+
+        gltf = garment.gltf
+        nodes = gltf.setdefault("nodes", [])
+        remap = {old: len(nodes) + i for i, old in enumerate(sorted(needed))}
+        for old in sorted(needed):
+            node = {k: v for k, v in src_nodes[old].items() if k not in ("mesh", "skin", "camera", "children")}
+            children = [remap[c] for c in src_nodes[old].get("children", []) if c in remap]
+            if children:
+                node["children"] = children
+            nodes.append(node)
+
+        roots = [remap[old] for old in sorted(needed) if parents.get(old) not in needed]
+        scene = gltf.setdefault("scenes", [{"nodes": []}])[gltf.get("scene", 0)]
+        scene.setdefault("nodes", []).extend(roots)
+
+        skin = {
+            "joints": [remap[j] for j in self.skin["joints"]],
+            "inverseBindMatrices": garment.add_accessor(self.inverse_bind, target=None),
+        }
+        if "skeleton" in self.skin and self.skin["skeleton"] in remap:
+            skin["skeleton"] = remap[self.skin["skeleton"]]
+        if "name" in self.skin:
+            skin["name"] = self.skin["name"]
+        skins = gltf.setdefault("skins", [])
+        skins.append(skin)
+        return len(skins) - 1
+
+
+def _bake_transform(glb, prim, matrix):
+    """Moves a primitive from node-local space into the parent-independent mesh space."""
+    attrs = prim["attributes"]
+    linear = matrix[:3, :3]
+    normal_matrix = np.linalg.inv(linear).T
+    pos = glb.read_accessor(attrs["POSITION"]).astype(np.float64)
+    attrs["POSITION"] = glb.add_accessor((pos @ linear.T + matrix[:3, 3]).astype(np.float32), with_bounds=True)
+    if "NORMAL" in attrs:
+        nrm = glb.read_accessor(attrs["NORMAL"]).astype(np.float64) @ normal_matrix.T
+        nrm /= np.maximum(np.linalg.norm(nrm, axis=1, keepdims=True), 1e-12)
+        attrs["NORMAL"] = glb.add_accessor(nrm.astype(np.float32))
+    if "TANGENT" in attrs:
+        tan = glb.read_accessor(attrs["TANGENT"]).astype(np.float64)
+        xyz = tan[:, :3] @ linear.T
+        xyz /= np.maximum(np.linalg.norm(xyz, axis=1, keepdims=True), 1e-12)
+        attrs["TANGENT"] = glb.add_accessor(np.hstack([xyz, tan[:, 3:]]).astype(np.float32))
+    for target in prim.get("targets", []):
+        for name in ("POSITION", "NORMAL", "TANGENT"):
+            if name in target:
+                delta = glb.read_accessor(target[name]).astype(np.float64) @ linear.T
+                target[name] = glb.add_accessor(delta.astype(np.float32), with_bounds=(name == "POSITION"))
+
+
+def transfer_glb(garment, body, node_index=None, max_influences=MAX_INFLUENCES):
+    """Writes JOINTS_0/WEIGHTS_0 and a copy of the body skeleton into `garment` (in place)."""
+    if node_index is None:
+        node_index = largest_mesh_node(garment)
+    if node_index is None:
+        raise ValueError("Garment GLB contains no mesh")
+    gltf = garment.gltf
+    node = gltf["nodes"][node_index]
+    mesh = gltf["meshes"][node["mesh"]]
+
+    # Skinned meshes ignore their node transform, so bake it into the vertices
+    if "skin" not in node:
+        matrix = garment.world_matrices()[node_index]
+        if not np.allclose(matrix, np.eye(4)):
+            for prim in mesh["primitives"]:
+                _bake_transform(garment, prim, matrix)
+        for key in ("matrix", "translation", "rotation", "scale"):
+            node.pop(key, None)
+
+    positions, _, layout = read_mesh(garment, node_index)
+    welded, inverse = weld(positions)
+    joints, weights, distance = body.transfer(welded, max_influences)
+
+    joint_dtype = np.uint8 if len(body.skin["joints"]) <= 256 else np.uint16
+    for p, first, count in layout:
+        prim = mesh["primitives"][p]
+        idx = inverse[first:first + count]
+        for key in [k for k in prim["attributes"] if k.startswith(("JOINTS_", "WEIGHTS_"))]:
+            del prim["attributes"][key]
+        prim["attributes"]["JOINTS_0"] = garment.add_accessor(joints[idx].astype(joint_dtype))
+        prim["attributes"]["WEIGHTS_0"] = garment.add_accessor(weights[idx])
+
+    node["skin"] = body.copy_skeleton(garment)
+    garment.repack()
+    return {
+        "vertices": int(len(welded)),
+        "joints_used": int(len(np.unique(joints[weights > 0]))),
+        "max_distance": float(distance.max()) if len(distance) else 0.0,
+    }
+
+
+def transfer_file(body_path, garment_path, out_path, body_node=None, garment_node=None,
+                  max_influences=MAX_INFLUENCES):
+    start = time.perf_counter()
+    body = SkinnedBody(Glb.load(body_path), body_node)
+    garment = Glb.load(garment_path)
+    stats = transfer_glb(garment, body, garment_node, max_influences)
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    stats["size"] = garment.save(out_path)
+    stats.update(garment=garment_path, output=out_path, seconds=time.perf_counter() - start)
+    return stats
+
+
+def _transfer_job(args):
+    body_path, garment_path, out_path, kwargs = args
+    return transfer_file(body_path, garment_path, out_path, **kwargs)
+
+
+def transfer_many(body_path, garment_paths, out_dir, jobs=None, **kwargs):
+    """Rigs every garment in `garment_paths` to the body, one process per garment."""
+    tasks = [(body_path, g, os.path.join(out_dir, os.path.basename(g)), kwargs) for g in garment_paths]
+    if len(tasks) == 1 or jobs == 1:
+        return [_transfer_job(t) for t in tasks]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(_transfer_job, tasks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transfer skin weights from a rigged body GLB to garment GLBs.")
+    parser.add_argument("body", help="Rigged body GLB (skinned mesh)")
+    parser.add_argument("garments", nargs="+", help="Garment GLB(s)")
+    parser.add_argument("-o", "--out-dir", required=True, help="Output directory")
+    parser.add_argument("-j", "--jobs", type=int, help="Parallel worker processes")
+    parser.add_argument("--max-influences", type=int, default=MAX_INFLUENCES)
+    args = parser.parse_args()
+
+    results = transfer_many(args.body, args.garments, args.out_dir, jobs=args.jobs,
+                            max_influences=args.max_influences)
+    for r in results:
+        print(f"{os.path.basename(r['garment'])}: {r['vertices']} verts, {r['joints_used']} joints, "
+              f"max distance {r['max_distance'] * 100:.1f}cm, {r['seconds']:.2f}s -> {r['output']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import deque
+
+try:
+    from .metrics import Counter, Gauge, log
+except ImportError:  # 作为顶层模块导入时（见 comfy_client.py）
+    from metrics import Counter, Gauge, log
+
+# 熔断器
+# ComfyUI 挂掉时，每个请求都要等连接超时才失败，线程池和排队名额都被占住。
+# 熔断器记录最近 WINDOW 次调用的结果：
+#   closed     正常放行；至少 MIN_CALLS 次调用且失败率 >= FAILURE_RATE 时打开
+#   open       直接拒绝（抛 CircuitOpenError，几乎不耗时），open_seconds 后转为 half_open
+#   half_open  只放一个探测请求过去：成功则关闭；失败则重新打开，等待时间加倍（有上限）
+# 只统计连接/超时/5xx 这类"服务不可用"的失败，工作流本身报错不算。
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+WINDOW = 20
+MIN_CALLS = 4
+FAILURE_RATE = 0.5
+OPEN_SECONDS = 5.0
+MAX_OPEN_SECONDS = 120.0
+
+STATE = Gauge("orchid_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ["circuit"])
+REJECTED = Counter("orchid_circuit_rejected_total", "Calls rejected by an open circuit", ["circuit"])
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时调用被直接拒绝"""
+
+
+class CircuitBreaker:
+    def __init__(self, name, window=WINDOW, min_calls=MIN_CALLS, failure_rate=FAILURE_RATE,
+                 open_seconds=OPEN_SECONDS, max_open_seconds=MAX_OPEN_SECONDS):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.open_seconds = open_seconds
+        self.results = deque(maxlen=window)  # True = 成功
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self._lock = threading.Lock()
+        STATE.set(0, circuit=name)
+
+    def _set_state(self, state):
+        if state != self.state:
+            log("circuit_state", level="warning" if state == OPEN else "info", circuit=self.name,
+                previous=self.state, state=state, open_seconds=self.open_seconds)
+            self.state = state
+            STATE.set(STATE_VALUES[state], circuit=self.name)
+
+    def is_open(self):
+        """是否处于拒绝状态（不占用 half_open 的探测名额）"""
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self.opened_at < self.open_seconds
+
+    def before_call(self):
+        """调用前检查；不允许时抛 CircuitOpenError"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                self._set_state(HALF_OPEN)
+                self.probing = False
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return
+        REJECTED.inc(circuit=self.name)
+        raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def record_success(self):
+        with self._lock:
+            self.results.append(True)
+            if self.state == HALF_OPEN:
+                self.results.clear()
+                self.open_seconds = self.base_open_seconds
+                self.probing = False
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.results.append(False)
+            if self.state == HALF_OPEN:
+                # 探测失败：重新打开，等待时间加倍
+                self.open_seconds = min(self.open_seconds * 2, self.max_open_seconds)
+                self._open()
+            elif self.state == CLOSED and len(self.results) >= self.min_calls:
+                failures = self.results.count(False)
+                if failures / len(self.results) >= self.failure_rate:
+                    self._open()
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self.probing = False
+        self._set_state(OPEN)
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "recent_calls": len(self.results),
+                    "recent_failures": self.results.count(False), "open_seconds": self.open_seconds}
@@ -1,116 +1,232 @@
 import websocket
 import uuid
 import json
+import urllib.error
 import urllib.request
 import urllib.parse
 import requests
 import os
+import time
+
+try:
+    from .circuit_breaker import CircuitBreaker, CircuitOpenError
+    from .metrics import COMFY_QUEUE_DEPTH, ERRORS, log, observe_stage, stage
+    from .tracing import add_event, current_span, span, traced
+except ImportError:  # check_models.py 等脚本直接 import comfy_client
+    from circuit_breaker import CircuitBreaker, CircuitOpenError
+    from metrics import COMFY_QUEUE_DEPTH, ERRORS, log, observe_stage, stage
+    from tracing import add_event, current_span, span, traced
+
+# 超时（秒）。不设超时时 ComfyUI 挂掉会让请求一直卡到系统默认超时；
+# 连续失败后由熔断器直接拒绝，几毫秒就返回（见 circuit_breaker.py）
+CONNECT_TIMEOUT = float(os.environ.get("ORCHID_COMFY_CONNECT_TIMEOUT", "3"))
+REQUEST_TIMEOUT = float(os.environ.get("ORCHID_COMFY_TIMEOUT", "30"))
+# 等待执行结果时两条 websocket 消息的最长间隔（执行中每一步都有 progress 消息）
+IDLE_TIMEOUT = float(os.environ.get("ORCHID_COMFY_IDLE_TIMEOUT", "120"))
+
+# 说明 ComfyUI 不可用的异常（连不上、超时、连接断开），计入熔断器；
+# requests 的异常和 urllib 的 URLError 都是 OSError 的子类
+UNAVAILABLE_ERRORS = (OSError, websocket.WebSocketException)
 
 class ComfyUIClient:
-    def __init__(self, server_address="127.0.0.1:8188"):
+    def __init__(self, server_address="127.0.0.1:8188", timeout=REQUEST_TIMEOUT,
+                 connect_timeout=CONNECT_TIMEOUT, idle_timeout=IDLE_TIMEOUT):
         self.server_address = server_address
         self.client_id = str(uuid.uuid4())
         self.ws = None
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self.breaker = CircuitBreaker(f"comfyui:{server_address}")
+
+    def _call(self, fn, *args, **kwargs):
+        """经过熔断器调用一次 ComfyUI；熔断时抛 CircuitOpenError"""
+        self.breaker.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except urllib.error.HTTPError as e:
+            # 4xx 说明服务是通的，只是请求有问题
+            if e.code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except UNAVAILABLE_ERRORS:
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def _get(self, path):
+        with urllib.request.urlopen(f"http://{self.server_address}{path}", timeout=self.timeout) as response:
+            return response.read()
+
+    def _post(self, path, data):
+        req = urllib.request.Request(f"http://{self.server_address}{path}", data=data)
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            return response.read()
 
-    def queue_prompt(self, prompt):
-        p = {"prompt": prompt, "client_id": self.client_id}
+    @traced("comfyui.queue_prompt", kind="client")
+    def queue_prompt(self, prompt, client_id=None):
+        p = {"prompt": prompt, "client_id": client_id or self.client_id}
         data = json.dumps(p).encode('utf-8')
-        req =  urllib.request.Request(f"http://{self.server_address}/prompt", data=data)
-        return json.loads(urllib.request.urlopen(req).read())
+        return json.loads(self._call(self._post, "/prompt", data))
 
+    @traced("comfyui.get_image", kind="client")
     def get_image(self, filename, subfolder, folder_type):
         data = {"filename": filename, "subfolder": subfolder, "type": folder_type}
         url_values = urllib.parse.urlencode(data)
-        with urllib.request.urlopen(f"http://{self.server_address}/view?{url_values}") as response:
-            return response.read()
+        return self._call(self._get, f"/view?{url_values}")
 
+    @traced("comfyui.get_history", kind="client")
     def get_history(self, prompt_id):
-        with urllib.request.urlopen(f"http://{self.server_address}/history/{prompt_id}") as response:
-            return json.loads(response.read())
+        return json.loads(self._call(self._get, f"/history/{prompt_id}"))
 
+    @traced("comfyui.get_object_info", kind="client")
     def get_object_info(self):
         """获取所有节点的信息，包括模型列表"""
-        with urllib.request.urlopen(f"http://{self.server_address}/object_info") as response:
-            return json.loads(response.read())
+        return json.loads(self._call(self._get, "/object_info"))
 
+    @traced("comfyui.upload_image", kind="client")
     def upload_image(self, file_path, subfolder="", overwrite=True):
         """
         上传本地图片到 ComfyUI
         """
-        try:
+        def post():
             with open(file_path, 'rb') as f:
                 files = {'image': f}
                 data = {'overwrite': str(overwrite).lower(), 'subfolder': subfolder}
                 response = requests.post(
                     f"http://{self.server_address}/upload/image", 
                     files=files, 
-                    data=data
+                    data=data,
+                    timeout=(self.connect_timeout, self.timeout)
                 )
+            if response.status_code >= 500:
+                response.raise_for_status()  # 计入熔断器
+            return response
+
+        try:
+            with stage("comfy_upload", file=os.path.basename(str(file_path))):
+                response = self._call(post)
             
             if response.status_code == 200:
                 result = response.json()
                 # ComfyUI 返回的是 name, subfolder, type
                 return result
             else:
-                print(f"Upload failed: {response.status_code} - {response.text}")
+                ERRORS.inc(stage="comfy_upload", type=f"HTTP{response.status_code}")
+                log("comfy_upload_failed", level="error", status=response.status_code, body=response.text[:500])
                 return None
-        except Exception as e:
-            print(f"Error uploading image: {e}")
+        except Exception:
+            # stage() 已经记录了错误和耗时
             return None
 
-    def connect_websocket(self):
-        self.ws = websocket.WebSocket()
-        self.ws.connect(f"ws://{self.server_address}/ws?clientId={self.client_id}")
+    @traced("comfyui.connect_websocket", kind="client")
+    def connect_websocket(self, client_id=None):
+        ws = websocket.WebSocket()
+        url = f"ws://{self.server_address}/ws?clientId={client_id or self.client_id}"
+        self._call(ws.connect, url, timeout=self.connect_timeout)
+        ws.settimeout(self.idle_timeout)
+        self.ws = ws
+        return ws
 
     def close_websocket(self):
         if self.ws:
             self.ws.close()
 
+    @traced("comfyui.generate")
     def generate(self, prompt_workflow):
         """
         执行完整的生成流程：连接WS -> 提交任务 -> 等待完成 -> 获取结果
         """
+        # 每次生成用独立的 client_id 和 websocket：ComfyUI 按 clientId 推送消息，
+        # 同一个 id 的新连接会顶掉旧连接，并发生成时会互相收不到完成消息
+        client_id = str(uuid.uuid4())
+        ws = None
         try:
-            self.connect_websocket()
+            ws = self.connect_websocket(client_id)
             
-            print("Sending prompt to ComfyUI...")
-            prompt_id = self.queue_prompt(prompt_workflow)['prompt_id']
-            print(f"Prompt ID: {prompt_id}")
+            log("comfy_queue_prompt")
+            queued_at = time.perf_counter()
+            prompt_id = self.queue_prompt(prompt_workflow, client_id)['prompt_id']
+            log("comfy_prompt_queued", prompt_id=prompt_id)
             
             output_images = {}
+            started_at = None
             
-            while True:
-                out = self.ws.recv()
-                if isinstance(out, str):
+            # 每条 websocket 消息记为一个 span 事件，带上与上一条的间隔，
+            # 卡在 recv 上的时间可以直接在 trace 里看到
+            with span("comfyui.wait", "client", prompt_id=prompt_id) as wait:
+                last_recv, longest_gap, messages = time.perf_counter(), 0.0, 0
+                while True:
+                    try:
+                        out = ws.recv()
+                    except UNAVAILABLE_ERRORS:
+                        # 等待中连接断开或超过 idle_timeout 没有消息
+                        self.breaker.record_failure()
+                        raise
+                    now = time.perf_counter()
+                    gap, last_recv = now - last_recv, now
+                    longest_gap = max(longest_gap, gap)
+                    messages += 1
+                    if not isinstance(out, str):
+                        continue
                     message = json.loads(out)
-                    # print(f"WS Message: {message['type']}")
-                    
-                    if message['type'] == 'executing':
-                        data = message['data']
+                    data = message.get('data', {})
+                    add_event(f"ws.{message['type']}", gap_s=round(gap, 4), node=data.get('node'))
+
+                    if message['type'] == 'status':
+                        remaining = data.get('status', {}).get('exec_info', {}).get('queue_remaining')
+                        if remaining is not None:
+                            COMFY_QUEUE_DEPTH.set(remaining)
+                    elif message['type'] == 'execution_start' and data.get('prompt_id') == prompt_id:
+                        # 排队结束，开始执行
+                        started_at = now
+                        observe_stage("queue_wait", started_at - queued_at, prompt_id=prompt_id)
+                    elif message['type'] == 'executing':
                         if data['node'] is None and data['prompt_id'] == prompt_id:
                             # 执行完成
                             break
-                else:
-                    continue
+                wait.set_attribute("ws.messages", messages)
+                wait.set_attribute("ws.longest_gap_s", round(longest_gap, 4))
+
+            finished_at = time.perf_counter()
+            if started_at is None:
+                # 没收到 execution_start（例如结果直接命中 ComfyUI 缓存），全部算作执行
+                started_at = queued_at
+            observe_stage("execution", finished_at - started_at, prompt_id=prompt_id)
 
             # 获取历史记录以找到输出图片
-            history = self.get_history(prompt_id)[prompt_id]
-            for node_id in history['outputs']:
-                node_output = history['outputs'][node_id]
-                if 'images' in node_output:
-                    images_output = []
-                    for image in node_output['images']:
-                        image_data = self.get_image(image['filename'], image['subfolder'], image['type'])
-                        images_output.append({
-                            'filename': image['filename'],
-                            'data': image_data
-                        })
-                    output_images[node_id] = images_output
+            with stage("fetch", prompt_id=prompt_id):
+                history = self.get_history(prompt_id)[prompt_id]
+                for node_id in history['outputs']:
+                    node_output = history['outputs'][node_id]
+                    if 'images' in node_output:
+                        images_output = []
+                        for image in node_output['images']:
+                            image_data = self.get_image(image['filename'], image['subfolder'], image['type'])
+                            images_output.append({
+                                'filename': image['filename'],
+                                'data': image_data
+                            })
+                        output_images[node_id] = images_output
 
             return output_images
             
+        except CircuitOpenError as e:
+            # 熔断中直接放弃，不当作新的错误刷日志
+            current_span().record_exception(e)
+            log("comfy_generate_rejected", level="warning", error=str(e))
+            return None
         except Exception as e:
-            print(f"Generation error: {e}")
+            ERRORS.inc(stage="comfy_generate", type=type(e).__name__)
+            current_span().record_exception(e)
+            log("comfy_generate_error", level="error", error=str(e))
             return None
         finally:
-            self.close_websocket()
+            if ws is not None:
+                ws.close()
@@ -0,0 +1,114 @@
+import hashlib
+import re
+
+import cv2
+import numpy as np
+
+from .metrics import cache_result, log, stage
+
+# ComfyUI 不可用时的快速降级结果
+# 1. 结果缓存：同一工作流指纹以前生成过（outputs/<指纹>_0.png），直接返回那张图；
+# 2. 否则生成一张程序纹理：按 Prompt 里的颜色/面料关键词（没有就按 Prompt 的哈希）
+#    选底色和织纹，四方连续可直接平铺，几毫秒出图。
+# 返回里带 "fallback" 字段，前端可以提示"AI 暂不可用，显示的是预览纹理"。
+
+PROCEDURAL_SIZE = 512
+
+# BGR（cv2 的通道顺序）
+COLORS = {
+    "red": (40, 40, 190), "红": (40, 40, 190),
+    "blue": (170, 90, 40), "蓝": (170, 90, 40),
+    "denim": (120, 80, 50), "牛仔": (120, 80, 50),
+    "navy": (90, 40, 20),
+    "green": (60, 140, 60), "绿": (60, 140, 60),
+    "yellow": (60, 200, 230), "黄": (60, 200, 230),
+    "pink": (180, 150, 235), "粉": (180, 150, 235),
+    "purple": (140, 60, 120), "紫": (140, 60, 120),
+    "black": (35, 35, 35), "黑": (35, 35, 35),
+    "white": (235, 235, 235), "白": (235, 235, 235),
+    "grey": (140, 140, 140), "gray": (140, 140, 140), "灰": (140, 140, 140),
+    "brown": (40, 75, 120), "棕": (40, 75, 120),
+    "beige": (170, 205, 225),
+}
+
+# 织纹：twill 斜纹 / plain 平纹 / knit 针织 / satin 缎面
+WEAVES = {
+    "denim": "twill", "牛仔": "twill", "twill": "twill", "斜纹": "twill",
+    "knit": "knit", "wool": "knit", "sweater": "knit", "针织": "knit", "毛": "knit",
+    "silk": "satin", "satin": "satin", "丝": "satin", "缎": "satin",
+}
+
+
+def cached_output(output_dir, key):
+    """同一指纹之前生成过的图片文件名，没有返回 None"""
+    name = f"{key[:16]}_0.png"
+    return name if (output_dir / name).exists() else None
+
+
+def _mentions(text, word):
+    """英文关键词按整词匹配（"red" 不匹配 "colored"），中文没有词边界，按子串匹配"""
+    if word.isascii():
+        return re.search(rf"\b{re.escape(word)}\b", text) is not None
+    return word in text
+
+
+def _tileable_noise(rng, size, scale):
+    """周期为 size 的低频噪声（FFT 低通），值域约 [-1, 1]"""
+    white = rng.standard_normal((size, size))
+    f = np.fft.fftfreq(size)
+    radius = np.sqrt(f[:, None] ** 2 + f[None, :] ** 2)
+    smooth = np.real(np.fft.ifft2(np.fft.fft2(white) * np.exp(-(radius * scale) ** 2)))
+    return smooth / (np.abs(smooth).max() + 1e-9)
+
+
+def procedural_texture(prompt, size=PROCEDURAL_SIZE):
+    """按 Prompt 生成一张可平铺的面料纹理，返回 BGR uint8 数组"""
+    text = (prompt or "").lower()
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    rng = np.random.default_rng(int.from_bytes(digest[:8], "little"))
+
+    color = next((c for word, c in COLORS.items() if _mentions(text, word)), None)
+    if color is None:
+        color = tuple(int(60 + b % 160) for b in digest[8:11])
+    weave = next((w for word, w in WEAVES.items() if _mentions(text, word)), "plain")
+
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32)
+    period = 2 * np.pi / size
+    threads = size // 8  # 每个周期整数根纱线，保证四方连续
+    if weave == "twill":
+        pattern = np.sin((x + y) * period * threads)
+    elif weave == "knit":
+        pattern = np.abs(np.sin(x * period * threads / 2)) * np.cos(y * period * threads)
+    elif weave == "satin":
+        pattern = 0.3 * np.sin((x + 0.2 * y) * period * 4)
+    else:
+        pattern = np.sin(x * period * threads) * np.sin(y * period * threads)
+
+    shade = 1.0 + 0.08 * pattern + 0.06 * _tileable_noise(rng, size, 40.0) \
+        + 0.03 * rng.standard_normal((size, size))
+    image = np.clip(np.asarray(color, dtype=np.float32)[None, None, :] * shade[..., None], 0, 255)
+    return image.astype(np.uint8)
+
+
+def fallback_response(output_dir, key, prompt, part, reason, size=PROCEDURAL_SIZE):
+    """ComfyUI 不可用时的结果：先查结果缓存，没有就生成 size x size 的程序纹理"""
+    with stage("fallback", reason=reason):
+        filename = cached_output(output_dir, key)
+        cache_result("texture_fallback", filename is not None)
+        if filename is not None:
+            kind = "cache"
+        else:
+            kind = "procedural"
+            filename = f"procedural_{key[:16]}.png"
+            path = output_dir / filename
+            if not path.exists():
+                cv2.imwrite(str(path), procedural_texture(prompt, size))
+    log("generate_texture_fallback", reason=reason, fallback=kind, file=filename)
+    return {
+        "status": "success",
+        "message": "AI generation unavailable, served a cached result" if kind == "cache"
+        else "AI generation unavailable, served a procedural preview texture",
+        "texture_url": f"http://localhost:8000/outputs/{filename}",
+        "part": part,
+        "fallback": kind,
+    }
@@ -1,46 +1,26 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 import uvicorn
-import shutil
+import asyncio
+import hashlib
 import os
 import cv2
 import numpy as np
 from pathlib import Path
 import json
-from .comfy_client import ComfyUIClient
+from .variants import router as variants_router
+from .residency import router as residency_router, residency, WARMUP_ENABLED
+from .scheduler import router as scheduler_router, scheduler
+from . import metrics, profiling, tracing
+from .metrics import log, stage
+from .singleflight import SingleFlight, fingerprint
+from .fallback import PROCEDURAL_SIZE, fallback_response
+from . import tiled
 
 app = FastAPI()
 
-# 初始化 ComfyUI 客户端
-# 注意：确保 ComfyUI 已经启动并监听 8188 端口
-comfy_client = ComfyUIClient(server_address="127.0.0.1:8188")
-
-# 全局变量存储当前使用的模型名称
-CURRENT_CKPT_NAME = None
-
-def ensure_model_selected():
-    """
-    尝试从 ComfyUI 获取可用的 Checkpoint 模型列表，并选择第一个。
-    如果获取失败，返回 None。
-    """
-    global CURRENT_CKPT_NAME
-    if CURRENT_CKPT_NAME:
-        return CURRENT_CKPT_NAME
-        
-    try:
-        print("Fetching available models from ComfyUI...")
-        info = comfy_client.get_object_info()
-        # CheckpointLoaderSimple 节点的 input.required.ckpt_name[0] 是列表
-        checkpoints = info['CheckpointLoaderSimple']['input']['required']['ckpt_name'][0]
-        if checkpoints:
-            CURRENT_CKPT_NAME = checkpoints[0]
-            print(f"Auto-selected model: {CURRENT_CKPT_NAME}")
-            return CURRENT_CKPT_NAME
-    except Exception as e:
-        print(f"Failed to fetch models: {e}")
-        return None
-
 # 配置 CORS
 app.add_middleware(
     CORSMiddleware,
@@ -59,101 +39,288 @@ OUTPUT_DIR.mkdir(exist_ok=True)
 # 挂载静态文件目录，以便前端访问生成的图片
 app.mount("/outputs", StaticFiles(directory="outputs"), name="outputs")
 
+# 体型参数预烘焙模型（见 variants.py）
+app.include_router(variants_router)
+
+# 生成任务的排队情况（见 scheduler.py）
+app.include_router(scheduler_router)
+
+# ComfyUI worker 和各自加载的模型（见 residency.py）
+# 注意：确保 ComfyUI 已经启动并监听 8188 端口；多个 ComfyUI 用逗号分隔写在 COMFYUI_ADDRESS 里
+# （压测时用 COMFYUI_ADDRESS 指向 benchmarks/fake_comfyui.py）
+app.include_router(residency_router)
+
+# 按需性能分析，平时关闭（见 profiling.py）
+# 注册在最前面：它是最内层的中间件，只分析请求本身
+profiling.install(app)
+
+# /metrics、request_id 和访问日志（见 metrics.py）
+metrics.install(app)
+
+# 每个请求一个 trace span，接受/返回 traceparent 头（见 tracing.py）
+# 后注册的中间件在外层，这样访问日志里也能带上 trace_id
+tracing.install(app)
+
 @app.get("/")
 async def root():
     return {"message": "Orchid Gesture AI Backend is running"}
 
+# 工作流模板的节点编号（见 workflow_template.json）
+WORKFLOW_TEMPLATE = Path(__file__).with_name("workflow_template.json")
+NODE_SAMPLER = "3"
+NODE_CHECKPOINT = "4"
+NODE_POSITIVE = "6"
+NODE_LOAD_IMAGE = "10"
+NODE_LATENT = "12"
+
+# 相同工作流的并发请求只提交一次 ComfyUI（见 singleflight.py）
+generation_flight = SingleFlight("comfy_generate")
+
+
+def build_workflow(prompt, image, ckpt_name):
+    """按模板构建工作流。有图片时走图生图，只有 Prompt 时换成空 latent 文生图。"""
+    with open(WORKFLOW_TEMPLATE, "r", encoding="utf-8") as f:
+        workflow = json.load(f)
+    if ckpt_name:
+        workflow[NODE_CHECKPOINT]["inputs"]["ckpt_name"] = ckpt_name
+    if prompt:
+        workflow[NODE_POSITIVE]["inputs"]["text"] = prompt
+    if image:
+        workflow[NODE_LOAD_IMAGE]["inputs"]["image"] = image
+    else:
+        del workflow[NODE_LOAD_IMAGE]
+        workflow[NODE_LATENT] = {
+            "inputs": {"width": 512, "height": 512, "batch_size": 1},
+            "class_type": "EmptyLatentImage",
+        }
+        workflow[NODE_SAMPLER]["inputs"]["denoise"] = 1.0
+    return workflow
+
+
+def warmup_workflow(ckpt_name, run=0):
+    """预热用的最小工作流：64x64、1 步，只为让 ComfyUI 把模型加载好；
+    run 改变 seed，重复预热时 ComfyUI 不会直接返回缓存结果"""
+    workflow = build_workflow("warm-up", None, ckpt_name)
+    workflow[NODE_LATENT]["inputs"].update(width=64, height=64)
+    workflow[NODE_SAMPLER]["inputs"]["steps"] = 1
+    workflow[NODE_SAMPLER]["inputs"]["seed"] += run
+    return workflow
+
+
+@app.on_event("startup")
+async def warm_up_models():
+    # 后台预热，不阻塞启动；ComfyUI 没起来时只记一条日志
+    if WARMUP_ENABLED:
+        asyncio.get_running_loop().create_task(residency.warm_up(warmup_workflow))
+
+
+async def run_generation(key, workflow, file_location, ticket):
+    """排队等 ComfyUI worker、上传图片、提交并保存结果，返回输出文件名列表；
+    ComfyUI 不可用时返回 None。
+
+    每个指纹只会有一个请求执行这里，其它相同请求在 singleflight 里等结果。
+    """
+    images = None
+    try:
+        await scheduler.wait(ticket)
+        client = ticket.worker.client
+        if file_location is not None:
+            # 上传到分配到的那个 ComfyUI（耗时记在 comfy_upload 阶段）
+            upload_resp = await run_in_threadpool(client.upload_image, file_location)
+            if not upload_resp:
+                return None
+            workflow[NODE_LOAD_IMAGE]["inputs"]["image"] = upload_resp.get("name")
+
+        images = await run_in_threadpool(client.generate, workflow)
+    finally:
+        scheduler.release(ticket, succeeded=bool(images))
+    if not images:
+        return None
+
+    filenames = []
+    with stage("postprocess", fingerprint=key[:16]):
+        for node_images in images.values():
+            for image in node_images:
+                filename = f"{key[:16]}_{len(filenames)}.png"
+                with open(OUTPUT_DIR / filename, "wb") as f:
+                    f.write(image["data"])
+                filenames.append(filename)
+    return filenames or None
+
+
+async def submit(key, workflow, file_location, tenant, priority, kind, ckpt_name):
+    """同一指纹已在生成中就直接等它的结果，不占排队名额；否则先过准入控制，
+    排进该租户的队列。返回 (输出文件名列表或 None, 是否用的是别人的结果)"""
+    ticket = None
+    if not generation_flight.running(key):
+        ticket = scheduler.admit(tenant, priority, kind, ckpt_name)
+    return await generation_flight.do(key, run_generation, key, workflow, file_location, ticket)
+
+
+async def generate_tiled(key, prompt, ckpt_name, base_image, size, tenant, priority):
+    """分块生成 size x size 的无缝纹理（见 tiled.py），返回输出文件名列表；
+    一个图块都没生成出来时返回 None。"""
+    origins, overlap = tiled.plan(size)
+    # 全部图块作为一个作业一次接纳：排不下时整个请求 429（图块太多时 413），不会只生成一部分。
+    # 图块还没有测量过耗时时，用同模型图生图的估计
+    tickets = scheduler.admit_job(tenant, priority, f"tile:{ckpt_name or 'default'}", ckpt_name,
+                                  count=len(origins), seed_kind=f"img2img:{ckpt_name or 'default'}")
+    log("tiled_generation", fingerprint=key[:16], size=size, tiles=len(origins), overlap=overlap)
+    # 还没交给 run_generation 的 ticket（交出去的由它释放）；中途出错时在 finally 里统一释放
+    pending = set(tickets)
+
+    def drop(ticket):
+        pending.discard(ticket)
+        scheduler.release(ticket, succeeded=False)
+
+    async def run_tile(index, crop):
+        ticket = tickets[index]
+        try:
+            ok, encoded = await run_in_threadpool(cv2.imencode, ".png", crop)
+            data = encoded.tobytes()
+            digest = hashlib.sha256(data).hexdigest()
+            tile_location = UPLOAD_DIR / f"tile_{digest[:16]}.png"
+            with open(tile_location, "wb") as buffer:
+                buffer.write(data)
+            workflow = build_workflow(prompt, f"sha256:{digest}", ckpt_name)
+            workflow[NODE_SAMPLER]["inputs"]["denoise"] = tiled.TILE_DENOISE
+            tile_key = fingerprint(workflow)
+            if generation_flight.running(tile_key):
+                # 相同的图块已经在生成：先让出自己排的队，再等它的结果
+                drop(ticket)
+            else:
+                pending.discard(ticket)
+            filenames, _ = await generation_flight.do(tile_key, run_generation, tile_key, workflow,
+                                                      tile_location, ticket)
+            if not filenames:
+                return None
+            image = await run_in_threadpool(cv2.imread, str(OUTPUT_DIR / filenames[0]))
+            if image is None:
+                return None
+            if image.shape[:2] != crop.shape[:2]:
+                image = cv2.resize(image, (crop.shape[1], crop.shape[0]), interpolation=cv2.INTER_AREA)
+            return image
+        except Exception as e:
+            if ticket in pending:
+                drop(ticket)
+            log("tile_failed", level="error", index=index, error=str(e))
+            return None
+
+    try:
+        with stage("postprocess", step="tile_upscale", size=size):
+            base = await run_in_threadpool(cv2.resize, base_image, (size, size), interpolation=cv2.INTER_CUBIC)
+        image, done = await tiled.generate(base, origins, overlap, run_tile)
+    finally:
+        for ticket in list(pending):
+            drop(ticket)
+    if not done:
+        return None
+    if done < len(origins):
+        log("tiled_generation_partial", level="warning", fingerprint=key[:16], tiles=len(origins), generated=done)
+    filename = f"{key[:16]}_0.png"
+    await run_in_threadpool(cv2.imwrite, str(OUTPUT_DIR / filename), image)
+    return [filename]
+
+
 @app.post("/generate-texture")
 async def generate_texture(
+    request: Request,
     file: UploadFile = File(None), 
     part: str = Form(None),
-    prompt: str = Form(None)
+    prompt: str = Form(None),
+    priority: str = Form(None),
+    checkpoint: str = Form(None),
+    size: int = Form(None)
 ):
     """
     接收前端上传的图片或 Prompt，通过 ComfyUI 进行 AI 处理，返回结果。
+    租户取 X-Tenant 头（没有则按客户端 IP），priority 为 interactive（默认）或 batch，
+    排队预计等待超过上限时返回 429 + Retry-After（见 scheduler.py）。
+    checkpoint 不填时用默认模型（见 residency.py）。
+    ComfyUI 不可用时返回缓存结果或程序纹理，带 "fallback" 字段（见 fallback.py）。
+    size 大于图块尺寸（默认 512，最大 4096）时分块生成无缝大图（见 tiled.py），
+    这时 priority 默认为 batch。
     """
     try:
-        print(f"Request received. Part: {part}, Prompt: {prompt}, File: {file.filename if file else 'None'}")
-        
-        # 暂时模拟返回结果，为了验证前端流程
-        # 如果是 AI 设计模式（只有 Prompt，没有 File），或者有 File
-        # 在真实场景中，这里会构建不同的 ComfyUI 工作流
-        
-        # 1. 如果有文件，保存文件
-        comfy_filename = None
+        log("generate_texture_request", part=part, prompt=prompt, file=file.filename if file else None,
+            size=size)
+        if size is not None and not 0 < size <= tiled.MAX_SIZE:
+            raise HTTPException(status_code=400, detail=f"size must be between 1 and {tiled.MAX_SIZE}")
+        tiled_mode = size is not None and size > tiled.TILE_SIZE
+
+        # 1. 如果有文件，保存文件。文件名带内容哈希，同名不同内容的上传不会互相覆盖；
+        #    指纹里也用内容哈希而不是文件名
+        file_location = None
+        image_digest = None
         if file:
-            file_location = UPLOAD_DIR / file.filename
-            with open(file_location, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            print(f"Received file: {file.filename}")
-            
-            # 上传到 ComfyUI
-            print("Uploading to ComfyUI...")
-            upload_resp = comfy_client.upload_image(file_location)
-            if upload_resp:
-                comfy_filename = upload_resp.get("name")
-        
-        # 2. 如果没有 ComfyUI 连接，或者为了快速测试 UI，直接返回一个测试图片
-        # 检查 outputs 目录下有没有现成的图片，随便返回一张作为演示
-        # 或者如果有 prompt，我们假装生成了一张
-        
-        # TODO: 这里应该根据 prompt 动态生成
-        # 现在我们先查找 outputs 目录下的最新图片返回，如果没有，就返回一个默认的
-        
-        # 模拟处理时间
-        import time
-        # time.sleep(2) 
-        
-        # 寻找最近生成的图片
-        output_files = sorted(OUTPUT_DIR.glob("*.png"), key=os.path.getmtime, reverse=True)
-        if output_files:
-            latest_image = output_files[0]
-            filename = latest_image.name
-            print(f"Returning cached/latest image: {filename}")
-            return {
-                "status": "success",
-                "message": "Texture generated successfully",
-                "texture_url": f"http://localhost:8000/outputs/{filename}",
-                "part": part
-            }
+            with stage("ingest", file=file.filename):
+                data = await file.read()
+                image_digest = hashlib.sha256(data).hexdigest()
+                file_location = UPLOAD_DIR / f"{image_digest[:16]}_{Path(file.filename).name}"
+                with open(file_location, "wb") as buffer:
+                    buffer.write(data)
+
+        # 2. 构建工作流，按规范化后的工作流算指纹
+        checkpoints = await run_in_threadpool(residency.available)
+        if checkpoint and checkpoints and checkpoint not in checkpoints:
+            raise HTTPException(status_code=400, detail=f"Unknown checkpoint: {checkpoint}")
+        ckpt_name = checkpoint or residency.default_checkpoint()
+        workflow = build_workflow(prompt, f"sha256:{image_digest}" if image_digest else None, ckpt_name)
+        key = fingerprint(workflow)
+        if tiled_mode:
+            key = fingerprint({"workflow": workflow,
+                               "tiled": [size, tiled.TILE_SIZE, tiled.TILE_OVERLAP, tiled.TILE_DENOISE]})
+
+        # 3. 所有 ComfyUI 的熔断器都打开了：不排队，直接降级（毫秒级返回）
+        if residency.unavailable() and not generation_flight.running(key):
+            return await run_in_threadpool(fallback_response, OUTPUT_DIR, key, prompt, part, "circuit_open",
+                                           size if tiled_mode else PROCEDURAL_SIZE)
+
+        # 4. 排队生成
+        tenant = request.headers.get("x-tenant") or (request.client.host if request.client else "anonymous")
+        priority = (priority or request.headers.get("x-priority") or ("batch" if tiled_mode else "interactive")).lower()
+        if not tiled_mode:
+            kind = f"{'img2img' if image_digest else 'txt2img'}:{ckpt_name or 'default'}"
+            filenames, shared = await submit(key, workflow, file_location, tenant, priority, kind, ckpt_name)
         else:
-            # 如果没有生成的图片，返回一个 placeholder 或者错误
-            # 这里为了演示，我们假设有一张 placeholder
-            return {
-                "status": "success", 
-                "message": "Mock generation (no outputs found)",
-                "texture_url": "https://via.placeholder.com/512x512.png?text=AI+Texture",
-                "part": part
-            }
-
-        # --- 以下是原本的 ComfyUI 逻辑，暂时注释掉或保留作为参考 ---
-        # 真实逻辑应该根据 prompt 修改 workflow["6"]["inputs"]["text"] = prompt
-        
-        """
-        # 3. 加载工作流模板
-        with open("workflow_template.json", "r", encoding="utf-8") as f:
-            workflow = json.load(f)
-
-        # 4. 修改参数
-        if comfy_filename:
-            workflow["3"]["inputs"]["image"] = comfy_filename
-            
-        if prompt:
-             # 假设节点 6 是 CLIP Text Encode (Prompt)
-             # workflow["6"]["inputs"]["text"] = prompt
-             pass
-
-        # 5. 发送任务
-        prompt_id = comfy_client.queue_prompt(workflow)["prompt_id"]
-        
-        # 6. 等待结果
-        output_images = comfy_client.get_images(prompt_id)
-        
-        # ... 保存并返回 ...
-        """
+            # 分块模式的底图：上传的图片，或先按 Prompt 生成一张普通尺寸的文生图
+            if file_location is not None:
+                base_image = await run_in_threadpool(cv2.imread, str(file_location))
+                if base_image is None:
+                    raise HTTPException(status_code=400, detail="Cannot decode uploaded image")
+            else:
+                base_workflow = build_workflow(prompt, None, ckpt_name)
+                base_files, _ = await submit(fingerprint(base_workflow), base_workflow, None, tenant, priority,
+                                             f"txt2img:{ckpt_name or 'default'}", ckpt_name)
+                base_image = None
+                if base_files:
+                    base_image = await run_in_threadpool(cv2.imread, str(OUTPUT_DIR / base_files[0]))
+            filenames, shared = None, False
+            if base_image is not None:
+                filenames, shared = await generation_flight.do(key, generate_tiled, key, prompt, ckpt_name,
+                                                               base_image, size, tenant, priority)
+
+        # 5. 生成失败（ComfyUI 不可用、超时）时同样降级
+        if not filenames:
+            return await run_in_threadpool(fallback_response, OUTPUT_DIR, key, prompt, part, "generation_failed",
+                                           size if tiled_mode else PROCEDURAL_SIZE)
+
+        response = {
+            "status": "success",
+            "message": "Texture generated successfully",
+            "texture_url": f"http://localhost:8000/outputs/{filenames[0]}",
+            "part": part,
+            "coalesced": shared
+        }
+        if tiled_mode:
+            response["size"] = size
+        return response
 
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error processing request: {e}")
+        metrics.ERRORS.inc(stage="generate_texture", type=type(e).__name__)
+        log("generate_texture_error", level="error", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
@@ -0,0 +1,272 @@
+import contextvars
+import json
+import math
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+
+try:
+    from .tracing import current_span, span
+except ImportError:  # 作为顶层模块导入时（见 comfy_client.py）
+    from tracing import current_span, span
+
+# 指标与结构化日志
+# /metrics 以 Prometheus 文本格式输出各阶段耗时直方图、请求数、错误数、
+# ComfyUI 队列深度和缓存命中次数；日志为每行一个 JSON，带 request_id，
+# 同一请求在 main.py / comfy_client.py / variants.py 里的日志可以串起来，
+# 有 span 时还带 trace_id / span_id（见 tracing.py）。
+# 只用标准库实现，不依赖 prometheus_client。
+
+# 生成任务的阶段: 接收上传 -> 上传到 ComfyUI -> 本地调度排队 -> ComfyUI 排队 -> 执行 -> 取图 -> 后处理
+STAGES = ("ingest", "comfy_upload", "schedule_wait", "queue_wait", "execution", "fetch", "postprocess")
+
+# ComfyUI 执行可能要几十秒，桶一直覆盖到 2 分钟
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines += self._render_sample(key, value)
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def snapshot(self, **labels):
+        """(每个桶的累计次数, 总和, 次数)，没有数据时返回 None"""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if state is None:
+                return None
+            cumulative, total = [], 0
+            for c in state["counts"]:
+                total += c
+                cumulative.append(total)
+            return cumulative, state["sum"], state["count"]
+
+    def _render_sample(self, key, state):
+        lines, total = [], 0
+        for bound, c in zip(self.buckets, state["counts"]):
+            total += c
+            le = (("le", _format_value(float(bound)) if bound != math.inf else "+Inf"),)
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {total}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+        lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+def render():
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# --- 指标定义 ---------------------------------------------------------------
+
+STAGE_SECONDS = Histogram("orchid_stage_seconds", "Time spent per pipeline stage", ["stage"])
+HTTP_REQUESTS = Counter("orchid_http_requests_total", "HTTP requests handled", ["method", "route", "status"])
+HTTP_SECONDS = Histogram("orchid_http_request_seconds", "HTTP request latency", ["method", "route"])
+HTTP_INFLIGHT = Gauge("orchid_http_inflight_requests", "HTTP requests currently being handled")
+ERRORS = Counter("orchid_errors_total", "Errors by stage and exception type", ["stage", "type"])
+COMFY_QUEUE_DEPTH = Gauge("orchid_comfyui_queue_depth", "Prompts waiting in ComfyUI (last reported)")
+CACHE_REQUESTS = Counter("orchid_cache_requests_total", "Cache lookups by cache and result", ["cache", "result"])
+
+
+def cache_result(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# --- 日志 -------------------------------------------------------------------
+
+_log_lock = threading.Lock()
+
+
+def log(event, level="info", **fields):
+    """输出一行 JSON 日志，自动带上当前请求的 request_id"""
+    record = {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "level": level,
+        "event": event,
+    }
+    request_id = request_id_var.get()
+    if request_id:
+        record["request_id"] = request_id
+    span = current_span()
+    if span is not None:
+        record["trace_id"] = span.trace_id
+        record["span_id"] = span.span_id
+    record.update(fields)
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _log_lock:
+        print(line, file=sys.stdout, flush=True)
+
+
+@contextmanager
+def stage(name, **fields):
+    """记录一个阶段的耗时（同时是一个 tracing span）；出错时计入 orchid_errors_total 后继续抛出"""
+    start = time.perf_counter()
+    try:
+        with span(f"stage.{name}", **fields):
+            yield
+    except Exception as e:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        ERRORS.inc(stage=name, type=type(e).__name__)
+        log("stage_failed", level="error", stage=name, seconds=round(elapsed, 4), error=str(e), **fields)
+        raise
+    elapsed = time.perf_counter() - start
+    STAGE_SECONDS.observe(elapsed, stage=name)
+    log("stage", stage=name, seconds=round(elapsed, 4), **fields)
+
+
+def observe_stage(name, seconds, **fields):
+    """阶段耗时不是由一段代码包住时（例如 ComfyUI 排队时间）直接记录"""
+    STAGE_SECONDS.observe(seconds, stage=name)
+    log("stage", stage=name, seconds=round(seconds, 4), **fields)
+
+
+# --- FastAPI 接入 -----------------------------------------------------------
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def install(app):
+    """注册 /metrics 路由和请求中间件（request_id、请求耗时、访问日志）"""
+    app.include_router(router)
+
+    @app.middleware("http")
+    async def _instrument(request: Request, call_next):
+        request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        HTTP_INFLIGHT.inc()
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            response.headers["X-Request-ID"] = request_id
+            return response
+        except Exception as e:
+            ERRORS.inc(stage="http", type=type(e).__name__)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_INFLIGHT.dec()
+            # 用路由模板而不是实际路径，避免标签数量无限增长
+            route = request.scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            if route != "/metrics":
+                HTTP_REQUESTS.inc(method=request.method, route=route, status=status)
+                HTTP_SECONDS.observe(elapsed, method=request.method, route=route)
+                log("http_request", method=request.method, path=request.url.path, route=route,
+                    status=status, seconds=round(elapsed, 4))
+            request_id_var.reset(token)
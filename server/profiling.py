@@ -0,0 +1,227 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse
+
+try:
+    from .metrics import HTTP_INFLIGHT, log, request_id_var
+except ImportError:  # 作为顶层模块导入时
+    from metrics import HTTP_INFLIGHT, log, request_id_var
+
+# 按需性能分析
+# 平时不做任何事（中间件只检查一个布尔值和一个请求头），需要时：
+#   POST /admin/profile?requests=5&mode=sampling   接下来 5 个请求做分析
+#   或单个请求带 X-Profile: sampling|cprofile 头（需要 X-Admin-Token）
+# 结果保存在 profiles/ 下：
+#   sampling  -> <时间>_<request_id>.collapsed   折叠栈，可直接给 flamegraph.pl / speedscope
+#   cprofile  -> <时间>_<request_id>.prof        pstats 文件，另附 .txt 的前 40 个热点
+# GET /admin/profiles 列出，GET /admin/profiles/{name} 下载。
+#
+# 采样模式采集进程内所有线程的栈（同步的处理函数跑在线程池里，cProfile 只能看到
+# 事件循环线程）。同一时间只分析一个请求，但其他请求照常处理：它们在事件循环和
+# 线程池里的栈也会被采到（cProfile 模式同样会记录事件循环上其他请求的协程）。
+# 所以最好在没有其他流量时分析；profile_saved 日志里的 other_requests 是分析期间
+# 同时在处理的其他请求数的最大值，不为 0 时结果里混有别的请求。
+#
+# 管理接口：设置了 ORCHID_ADMIN_TOKEN 时要求 X-Admin-Token 头一致，
+# 否则只允许本机访问。
+
+PROFILES_DIR = Path("profiles")
+ADMIN_TOKEN = os.environ.get("ORCHID_ADMIN_TOKEN", "")
+
+DEFAULT_INTERVAL = 0.005  # 采样间隔（秒）
+MAX_ARMED_REQUESTS = 100
+MODES = ("sampling", "cprofile")
+
+router = APIRouter()
+
+_lock = threading.Lock()
+_armed = {"remaining": 0, "mode": "sampling", "interval": DEFAULT_INTERVAL, "route": None}
+_busy = threading.Lock()  # 同一时间只分析一个请求
+
+
+def check_admin(request: Request):
+    if ADMIN_TOKEN:
+        if request.headers.get("x-admin-token") != ADMIN_TOKEN:
+            raise HTTPException(status_code=403, detail="Admin token required")
+    elif not request.client or request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="Admin endpoints are local-only without ORCHID_ADMIN_TOKEN")
+
+
+class Sampler:
+    """后台线程定时读取 sys._current_frames()，按折叠栈计数（所有线程，不区分请求）"""
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.max_inflight = 0  # 采样期间同时在处理的 HTTP 请求数（含被分析的请求）
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    @staticmethod
+    def _frame_name(code):
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own or names.get(ident, "").startswith("trace-exporter"):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_name(frame.f_code))
+                    frame = frame.f_back
+                thread_name = re.sub(r"[;\s]", "_", names.get(ident, str(ident)))
+                self.stacks[";".join([thread_name] + stack[::-1])] += 1
+            self.samples += 1
+            self.max_inflight = max(self.max_inflight, HTTP_INFLIGHT.value())
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _output_path(suffix):
+    PROFILES_DIR.mkdir(exist_ok=True)
+    request_id = request_id_var.get() or "request"
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}_{re.sub(r'[^0-9A-Za-z_-]', '', request_id)[:32]}{suffix}"
+    return PROFILES_DIR / name
+
+
+def _take_armed(request):
+    """取出一次分析机会：(mode, interval) 或 None"""
+    header = request.headers.get("x-profile")
+    if header:
+        try:
+            check_admin(request)
+        except HTTPException:
+            return None
+        return (header if header in MODES else "sampling"), DEFAULT_INTERVAL
+    with _lock:
+        if _armed["remaining"] <= 0:
+            return None
+        if _armed["route"] and not request.url.path.startswith(_armed["route"]):
+            return None
+        if request.url.path.startswith("/admin/"):
+            return None
+        _armed["remaining"] -= 1
+        return _armed["mode"], _armed["interval"]
+
+
+def install(app):
+    app.include_router(router)
+
+    @app.middleware("http")
+    async def _profile(request: Request, call_next):
+        # 未启用时的全部开销
+        if _armed["remaining"] <= 0 and "x-profile" not in request.headers:
+            return await call_next(request)
+        armed = _take_armed(request)
+        if armed is None or not _busy.acquire(blocking=False):
+            return await call_next(request)
+        mode, interval = armed
+        start = time.perf_counter()
+        other_requests = None
+        try:
+            if mode == "cprofile":
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    response = await call_next(request)
+                finally:
+                    profiler.disable()
+                path = _output_path(".prof")
+                profiler.dump_stats(str(path))
+                summary = io.StringIO()
+                pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+                path.with_suffix(".txt").write_text(summary.getvalue(), encoding="utf-8")
+            else:
+                sampler = Sampler(interval)
+                sampler.start()
+                try:
+                    response = await call_next(request)
+                finally:
+                    sampler.stop()
+                other_requests = max(0, sampler.max_inflight - 1)
+                path = _output_path(".collapsed")
+                path.write_text(sampler.collapsed(), encoding="utf-8")
+        finally:
+            _busy.release()
+        elapsed = time.perf_counter() - start
+        log("profile_saved", mode=mode, file=path.name, path_profiled=request.url.path, seconds=round(elapsed, 4),
+            other_requests=other_requests)
+        response.headers["X-Profile-File"] = path.name
+        return response
+
+
+@router.post("/admin/profile")
+async def arm_profiler(request: Request, requests: int = 1, mode: str = "sampling",
+                       interval: float = DEFAULT_INTERVAL, route: str = None):
+    """接下来 requests 个请求（可按路径前缀过滤）做性能分析"""
+    check_admin(request)
+    if mode not in MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {MODES}")
+    if not 1 <= requests <= MAX_ARMED_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"requests must be 1..{MAX_ARMED_REQUESTS}")
+    if not 0.0005 <= interval <= 1:
+        raise HTTPException(status_code=400, detail="interval must be 0.0005..1 seconds")
+    with _lock:
+        _armed.update(remaining=requests, mode=mode, interval=interval, route=route)
+        state = dict(_armed)
+    log("profile_armed", **state)
+    return state
+
+
+@router.get("/admin/profile")
+async def profiler_status(request: Request):
+    check_admin(request)
+    with _lock:
+        return dict(_armed)
+
+
+@router.delete("/admin/profile")
+async def disarm_profiler(request: Request):
+    check_admin(request)
+    with _lock:
+        _armed["remaining"] = 0
+        return dict(_armed)
+
+
+@router.get("/admin/profiles")
+async def list_profiles(request: Request):
+    check_admin(request)
+    if not PROFILES_DIR.exists():
+        return {"profiles": []}
+    files = sorted(PROFILES_DIR.iterdir(), key=lambda p: p.stat().st_mtime, reverse=True)
+    return {"profiles": [{"name": p.name, "size": p.stat().st_size,
+                          "created": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(p.stat().st_mtime))}
+                         for p in files if p.is_file()]}
+
+
+@router.get("/admin/profiles/{name}")
+async def get_profile(name: str, request: Request):
+    check_admin(request)
+    path = PROFILES_DIR / name
+    if "/" in name or "\\" in name or name.startswith(".") or not path.is_file():
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    return FileResponse(path, media_type="application/octet-stream" if name.endswith(".prof") else "text/plain")
@@ -0,0 +1,197 @@
+import asyncio
+import os
+import time
+
+from fastapi import APIRouter
+from starlette.concurrency import run_in_threadpool
+
+from .comfy_client import ComfyUIClient
+from .metrics import Counter, Gauge, log
+
+# ComfyUI worker 与模型驻留管理
+# 切换 checkpoint 时 ComfyUI 要重新加载整个模型（几秒到几十秒），
+# 启动后的第一次生成也一样。这里：
+#   - COMFYUI_ADDRESS 可以是逗号分隔的多个 ComfyUI（每个一块 GPU），每个是一个 worker；
+#   - 记录每个 worker 最后加载的 checkpoint（所有任务都经 scheduler 分配到 worker，
+#     所以这里看到的就是实际情况）；
+#   - 启动时给每个 worker 提交一个极小的预热工作流，把配置的 checkpoint 先加载好，
+#     冷启动时间不落在用户请求上；
+#   - scheduler 取任务时优先取和 worker 当前模型相同的任务，换模型的代价
+#     （实测的冷启动额外耗时）算进公平排队的虚拟时间里，见 scheduler.py。
+#
+# 环境变量：
+#   COMFYUI_ADDRESS        host:port[,host:port...]，默认 127.0.0.1:8188
+#   ORCHID_CHECKPOINTS     预热/默认使用的 checkpoint，逗号分隔，按优先顺序；
+#                          不设置时用 ComfyUI 列表里的第一个
+#   ORCHID_WARMUP          设为 0 关闭启动预热
+
+ADDRESSES = [a.strip() for a in os.environ.get("COMFYUI_ADDRESS", "127.0.0.1:8188").split(",") if a.strip()]
+PREFERRED_CHECKPOINTS = [c.strip() for c in os.environ.get("ORCHID_CHECKPOINTS", "").split(",") if c.strip()]
+WARMUP_ENABLED = os.environ.get("ORCHID_WARMUP", "1") != "0"
+
+DEFAULT_SWAP_SECONDS = 15.0  # 还没有测量值时，换一次模型的额外耗时
+EWMA_ALPHA = 0.2
+
+SWAPS = Counter("orchid_checkpoint_swaps_total", "Jobs that made a worker load a different checkpoint",
+                ["worker"])
+RESIDENT = Gauge("orchid_checkpoint_resident", "1 for the checkpoint each worker has loaded",
+                 ["worker", "checkpoint"])
+
+router = APIRouter()
+
+
+class Worker:
+    def __init__(self, index, address):
+        self.index = index
+        self.address = address
+        self.client = ComfyUIClient(server_address=address)
+        self.resident = None  # 最后加载的 checkpoint，未知时为 None
+        self.busy = False
+        self.warm = False
+
+    def set_resident(self, checkpoint):
+        if checkpoint == self.resident:
+            return
+        if self.resident is not None:
+            RESIDENT.set(0, worker=self.address, checkpoint=self.resident)
+        self.resident = checkpoint
+        RESIDENT.set(1, worker=self.address, checkpoint=checkpoint)
+
+
+class Residency:
+    def __init__(self, addresses=ADDRESSES, preferred=PREFERRED_CHECKPOINTS):
+        self.workers = [Worker(i, a) for i, a in enumerate(addresses or ["127.0.0.1:8188"])]
+        self.preferred = list(preferred)
+        self.checkpoints = None  # ComfyUI 上可用的 checkpoint，取到一次后缓存
+        self.swap_seconds = {}  # checkpoint -> 冷启动额外耗时的 EWMA
+        self.idle_callback = None  # worker 空闲时通知 scheduler 派发任务
+
+    # --- checkpoint 列表 ----------------------------------------------------
+
+    def available(self):
+        """ComfyUI 上可用的 checkpoint 列表；取不到时返回 None，下次再试"""
+        if self.checkpoints:
+            return self.checkpoints
+        for worker in self.healthy():
+            try:
+                log("comfy_fetch_models", worker=worker.address)
+                info = worker.client.get_object_info()
+                # CheckpointLoaderSimple 节点的 input.required.ckpt_name[0] 是列表
+                checkpoints = info['CheckpointLoaderSimple']['input']['required']['ckpt_name'][0]
+            except Exception as e:
+                log("comfy_fetch_models_failed", level="error", worker=worker.address, error=str(e))
+                continue
+            if checkpoints:
+                self.checkpoints = list(checkpoints)
+                return self.checkpoints
+        return None
+
+    def default_checkpoint(self):
+        """ORCHID_CHECKPOINTS 里第一个可用的，否则 ComfyUI 列表里的第一个；取不到列表时返回 None"""
+        checkpoints = self.available()
+        if not checkpoints:
+            return None
+        for name in self.preferred:
+            if name in checkpoints:
+                return name
+        return checkpoints[0]
+
+    def warmup_targets(self):
+        """每个 worker 预热哪个 checkpoint：配置的依次轮流分配，没配置就都用默认的"""
+        checkpoints = self.available() or []
+        wanted = [c for c in self.preferred if c in checkpoints] or [self.default_checkpoint()]
+        return [(w, wanted[w.index % len(wanted)]) for w in self.workers if wanted[0]]
+
+    # --- 可用性 -------------------------------------------------------------
+
+    def healthy(self):
+        """熔断器没有打开的 worker（见 circuit_breaker.py）"""
+        return [w for w in self.workers if not w.client.breaker.is_open()]
+
+    def unavailable(self):
+        """所有 worker 的熔断器都打开了：请求直接降级，不再排队"""
+        return not self.healthy()
+
+    # --- 换模型代价 ---------------------------------------------------------
+
+    def is_resident(self, checkpoint):
+        return any(w.resident == checkpoint for w in self.workers)
+
+    def swap_cost(self, checkpoint):
+        return self.swap_seconds.get(checkpoint, DEFAULT_SWAP_SECONDS)
+
+    def record_swap(self, checkpoint, extra_seconds):
+        old = self.swap_seconds.get(checkpoint)
+        extra = max(0.0, extra_seconds)
+        self.swap_seconds[checkpoint] = extra if old is None else old + EWMA_ALPHA * (extra - old)
+
+    def loaded(self, worker, checkpoint):
+        """任务在 worker 上执行完之后调用；返回这次是否换了模型"""
+        swapped = worker.resident != checkpoint
+        if swapped:
+            SWAPS.inc(worker=worker.address)
+            log("checkpoint_swap", worker=worker.address, previous=worker.resident, checkpoint=checkpoint)
+        worker.set_resident(checkpoint)
+        return swapped
+
+    # --- 预热 ---------------------------------------------------------------
+
+    async def warm_up(self, make_workflow):
+        """给每个 worker 提交一个极小的工作流，加载好它的 checkpoint。
+
+        make_workflow(checkpoint, run) 返回预热用的工作流，run 不同时 seed 不同
+        （否则 ComfyUI 直接返回缓存结果）。预热跑两次：第一次加载模型，第二次模型已驻留，
+        两次之差才是换模型的代价。预热失败只记日志，不影响服务启动；
+        对应的 worker 在第一个真实任务时再加载。
+        """
+        targets = await run_in_threadpool(self.warmup_targets)
+        if not targets:
+            log("warmup_skipped", level="warning", reason="no checkpoints available")
+            return
+
+        async def timed(worker, workflow):
+            start = time.perf_counter()
+            images = await run_in_threadpool(worker.client.generate, workflow)
+            return images, time.perf_counter() - start
+
+        async def one(worker, checkpoint):
+            if worker.busy:  # 已经有用户任务在跑，它会顺带加载模型
+                return
+            worker.busy = True
+            try:
+                images, cold = await timed(worker, make_workflow(checkpoint, 0))
+                if images is None:
+                    log("warmup_failed", level="error", worker=worker.address, checkpoint=checkpoint,
+                        seconds=round(cold, 3))
+                    return
+                worker.warm = True
+                self.loaded(worker, checkpoint)
+                images, warm = await timed(worker, make_workflow(checkpoint, 1))
+                if images is not None:
+                    self.record_swap(checkpoint, cold - warm)
+                log("warmup_done", worker=worker.address, checkpoint=checkpoint, seconds=round(cold, 3),
+                    load_seconds=round(cold - warm, 3) if images is not None else None)
+            finally:
+                worker.busy = False
+                if self.idle_callback is not None:
+                    self.idle_callback()
+
+        await asyncio.gather(*(one(w, c) for w, c in targets))
+
+    def snapshot(self):
+        return {
+            "workers": [{"address": w.address, "resident": w.resident, "busy": w.busy, "warm": w.warm,
+                         "circuit": w.client.breaker.snapshot()}
+                        for w in self.workers],
+            "checkpoints": self.checkpoints,
+            "swap_seconds": {k: round(v, 2) for k, v in self.swap_seconds.items()},
+        }
+
+
+residency = Residency()
+
+
+@router.get("/residency")
+def residency_status():
+    """每个 ComfyUI worker 当前加载的 checkpoint"""
+    return residency.snapshot()
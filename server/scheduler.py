@@ -0,0 +1,299 @@
+import asyncio
+import itertools
+import json
+import math
+import os
+import time
+from collections import deque
+
+from fastapi import APIRouter, HTTPException
+
+from .metrics import Counter, Gauge, log, observe_stage
+from .residency import residency as default_residency
+
+# 生成任务的多租户公平调度与准入控制
+# ComfyUI 自己是 FIFO 队列：一个人一次提交 50 个批量任务，后面所有人都要等。
+# 这里在提交前排队，每个 ComfyUI worker（见 residency.py）同一时间只分配一个任务，
+# 其余按加权公平排队（start-time fair queuing）：
+#   - 每个 (优先级, 租户) 是一条队列，权重 = 优先级权重 x 租户权重；
+#   - 每条队列有虚拟时间，取任务时选虚拟时间最小的队列，取出后虚拟时间
+#     加上 预计耗时 / 权重；空闲后重新进来的队列从当前虚拟时钟开始，
+#     不能攒额度。
+# 交互式任务权重是批量的 8 倍，一个批量用户排满了队列，新来的交互式请求
+# 也是下一个被执行。
+#
+# 按模型分组：worker 空闲时，队头 checkpoint 和 worker 当前模型不同的队列，
+# 虚拟时间要加上换模型的代价 / 权重，所以同模型的任务会被优先连续执行，
+# 但换模型的代价用完后还是轮到它，不会饿死。同一条队列内（同一租户同一优先级）
+# 在前 LOOKAHEAD 个任务里优先取同模型的。
+#
+# 熔断器打开的 worker（ComfyUI 不可用，见 circuit_breaker.py）不分配任务，
+# 全部都打开时照常分配，让任务去做 half_open 探测。
+#
+# 预计耗时按工作流类型（图生图/文生图 + 模型）用实际执行时间的 EWMA 估计。
+# 需要换模型的任务再加上实测的换模型耗时。
+# 预计等待 = 运行中任务的剩余时间 + 按公平份额排在它前面的工作量，除以 worker 数；
+# 超过该优先级的上限时直接返回 429 和 Retry-After。
+#
+# 多任务作业（分块生成的各个图块，见 tiled.py）用 admit_job 一次接纳：
+# 准入只判断一次（等到作业的第一个任务开始），在租户排队上限里算一个；
+# 任务数超过 MAX_JOB_TASKS 的作业永远排不进来，返回 413 而不是 429。
+# 还没有测量值的任务类型可以用相近类型的估计（如图块用图生图的）做初值。
+#
+# 环境变量：
+#   ORCHID_TENANT_WEIGHTS     租户权重 JSON，如 {"studio-a": 2, "render-bot": 0.5}
+#   ORCHID_MAX_WAIT_INTERACTIVE / ORCHID_MAX_WAIT_BATCH   预计等待上限（秒）
+
+TENANT_WEIGHTS = json.loads(os.environ.get("ORCHID_TENANT_WEIGHTS", "{}"))
+
+PRIORITIES = {"interactive": 8.0, "batch": 1.0}
+MAX_WAIT = {
+    "interactive": float(os.environ.get("ORCHID_MAX_WAIT_INTERACTIVE", "60")),
+    "batch": float(os.environ.get("ORCHID_MAX_WAIT_BATCH", "1800")),
+}
+MAX_QUEUED_PER_TENANT = 100  # 每条队列最多排多少个请求（多任务作业算一个）
+MAX_JOB_TASKS = 256
+LOOKAHEAD = 8  # 同一队列内为凑同模型最多往后看几个任务
+
+DEFAULT_ESTIMATE = 20.0  # 还没有测量值时的预计耗时（秒）
+EWMA_ALPHA = 0.2
+
+ADMISSIONS = Counter("orchid_scheduler_admissions_total", "Generation jobs admitted / rejected",
+                     ["priority", "result"])
+QUEUED = Gauge("orchid_scheduler_queued_jobs", "Jobs waiting for a ComfyUI slot", ["priority"])
+RUNNING = Gauge("orchid_scheduler_running_jobs", "Jobs holding a ComfyUI slot")
+ESTIMATE = Gauge("orchid_scheduler_estimate_seconds", "EWMA execution time per workflow kind", ["kind"])
+
+router = APIRouter()
+
+
+class Ticket:
+    """一个已被接纳的任务，从排队到释放 ComfyUI slot"""
+
+    def __init__(self, seq, tenant, priority, kind, checkpoint, cost, job=None):
+        self.seq = seq
+        self.job = seq if job is None else job  # 同一作业的任务 job 相同
+        self.tenant = tenant
+        self.priority = priority
+        self.kind = kind
+        self.checkpoint = checkpoint
+        self.cost = cost  # 接纳时的预计耗时
+        self.worker = None  # 分配到的 ComfyUI worker
+        self.estimated_wait = 0.0
+        self.enqueued_at = time.perf_counter()
+        self.started_at = None
+        self.ready = asyncio.get_running_loop().create_future()
+
+
+class _Flow:
+    def __init__(self, priority, tenant, weight):
+        self.priority = priority
+        self.tenant = tenant
+        self.weight = weight
+        self.vtime = 0.0
+        self.jobs = deque()
+
+    def backlog(self):
+        return sum(t.cost for t in self.jobs)
+
+    def queued(self):
+        """排着的请求数（多任务作业算一个）"""
+        return len({t.job for t in self.jobs})
+
+    def pick(self, resident):
+        """队列里下一个要执行的任务的位置：前 LOOKAHEAD 个里第一个同模型的，否则队头"""
+        for i in range(min(LOOKAHEAD, len(self.jobs))):
+            if self.jobs[i].checkpoint == resident:
+                return i
+        return 0
+
+
+class Scheduler:
+    def __init__(self, residency=default_residency, tenant_weights=None, max_wait=None):
+        self.residency = residency
+        self.workers = residency.workers
+        self.slots = len(self.workers)
+        residency.idle_callback = self._dispatch
+        self.tenant_weights = dict(TENANT_WEIGHTS if tenant_weights is None else tenant_weights)
+        self.max_wait = dict(MAX_WAIT if max_wait is None else max_wait)
+        self.estimates = {}
+        self.flows = {}
+        self.running = set()
+        self.vclock = 0.0
+        self._seq = itertools.count()
+
+    # --- 估计 ---------------------------------------------------------------
+
+    def estimate(self, kind, seed_kind=None):
+        """kind 的预计耗时；还没有测量值时用 seed_kind 的，都没有时用 DEFAULT_ESTIMATE"""
+        if kind in self.estimates:
+            return self.estimates[kind]
+        return self.estimates.get(seed_kind, DEFAULT_ESTIMATE)
+
+    def record(self, kind, seconds):
+        old = self.estimates.get(kind)
+        self.estimates[kind] = seconds if old is None else old + EWMA_ALPHA * (seconds - old)
+        ESTIMATE.set(round(self.estimates[kind], 3), kind=kind)
+
+    def _flow(self, priority, tenant):
+        key = (priority, tenant)
+        flow = self.flows.get(key)
+        if flow is None:
+            weight = PRIORITIES[priority] * float(self.tenant_weights.get(tenant, 1.0))
+            flow = self.flows[key] = _Flow(priority, tenant, weight)
+        return flow
+
+    def estimated_wait(self, priority, tenant, cost):
+        """按加权公平份额估计一个新任务要等多久才能拿到 slot（秒）"""
+        now = time.perf_counter()
+        remaining = sum(max(0.0, t.cost - (now - t.started_at)) for t in self.running)
+        if len(self.running) < self.slots and not any(f.jobs for f in self.flows.values()):
+            return 0.0
+        flow = self._flow(priority, tenant)
+        own = flow.backlog() + cost
+        # 在它完成前，别的队列按权重比例能分到的工作量，不超过它们实际排着的量
+        ahead = flow.backlog()
+        for other in self.flows.values():
+            if other is not flow and other.jobs:
+                ahead += min(other.backlog(), own * other.weight / flow.weight)
+        return (remaining + ahead) / self.slots
+
+    # --- 准入与调度 ---------------------------------------------------------
+
+    def admit(self, tenant, priority, kind, checkpoint=None):
+        """接纳一个任务并排进队列；预计等待超过上限时抛 429"""
+        return self.admit_job(tenant, priority, kind, checkpoint)[0]
+
+    def admit_job(self, tenant, priority, kind, checkpoint=None, count=1, seed_kind=None):
+        """把 count 个同类任务作为一个作业接纳，返回 Ticket 列表。
+
+        准入只判断一次：作业的第一个任务要等多久才能开始；超过上限时抛 429。
+        任务数超过 MAX_JOB_TASKS 时抛 413（重试也不会成功）。
+        """
+        if priority not in PRIORITIES:
+            raise HTTPException(status_code=400, detail=f"priority must be one of {sorted(PRIORITIES)}")
+        if count > MAX_JOB_TASKS:
+            raise HTTPException(status_code=413,
+                                detail=f"Job has {count} tasks, at most {MAX_JOB_TASKS} can be scheduled")
+        cost = self.estimate(kind, seed_kind)
+        swap = 0.0
+        if checkpoint is not None and not self.residency.is_resident(checkpoint):
+            swap = self.residency.swap_cost(checkpoint)
+        flow = self._flow(priority, tenant)
+        wait = self.estimated_wait(priority, tenant, cost + swap)
+        limit = self.max_wait[priority]
+        if wait > limit or flow.queued() >= MAX_QUEUED_PER_TENANT:
+            ADMISSIONS.inc(priority=priority, result="rejected")
+            # 大约等到前面的工作量消化到上限以内再来
+            retry_after = max(1, math.ceil(wait - limit)) if wait > limit else max(1, math.ceil(cost + swap))
+            log("scheduler_rejected", tenant=tenant, priority=priority, kind=kind, tasks=count,
+                estimated_wait=round(wait, 2), limit=limit, queued=flow.queued())
+            raise HTTPException(
+                status_code=429,
+                detail=f"Generation queue is full (estimated wait {wait:.0f}s, limit {limit:.0f}s)",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+        if not flow.jobs:
+            flow.vtime = max(flow.vtime, self.vclock)
+        tickets = []
+        for i in range(count):
+            # 换模型的代价只算在第一个任务上，之后模型已经驻留
+            ticket = Ticket(next(self._seq), tenant, priority, kind, checkpoint, cost + (swap if i == 0 else 0.0),
+                            job=tickets[0].seq if tickets else None)
+            ticket.estimated_wait = wait
+            flow.jobs.append(ticket)
+            tickets.append(ticket)
+        ADMISSIONS.inc(priority=priority, result="admitted")
+        QUEUED.inc(count, priority=priority)
+        log("scheduler_admitted", tenant=tenant, priority=priority, kind=kind, tasks=count,
+            estimated_wait=round(wait, 2))
+        self._dispatch()
+        return tickets
+
+    def _swap_penalty(self, flow, worker):
+        """worker 执行这条队列下一个任务需要换模型时，虚拟时间上加的代价"""
+        ticket = flow.jobs[flow.pick(worker.resident)]
+        if worker.resident is None or ticket.checkpoint in (None, worker.resident):
+            return 0.0
+        return self.residency.swap_cost(ticket.checkpoint) / flow.weight
+
+    def _dispatch(self):
+        for worker in self.residency.healthy() or self.workers:
+            if worker.busy:
+                continue
+            active = [f for f in self.flows.values() if f.jobs]
+            if not active:
+                return
+            flow = min(active, key=lambda f: (f.vtime + self._swap_penalty(f, worker), f.jobs[0].seq))
+            index = flow.pick(worker.resident)
+            ticket = flow.jobs[index]
+            del flow.jobs[index]
+            self.vclock = flow.vtime
+            flow.vtime += ticket.cost / flow.weight
+            QUEUED.dec(priority=ticket.priority)
+            ticket.worker = worker
+            ticket.started_at = time.perf_counter()
+            worker.busy = True
+            self.running.add(ticket)
+            RUNNING.set(len(self.running))
+            ticket.ready.set_result(None)
+
+    async def wait(self, ticket):
+        """等到轮到这个任务（拿到 ComfyUI slot）"""
+        try:
+            await ticket.ready
+        except asyncio.CancelledError:
+            self.release(ticket, succeeded=False)
+            raise
+        observe_stage("schedule_wait", ticket.started_at - ticket.enqueued_at, tenant=ticket.tenant,
+                      priority=ticket.priority, estimated=round(ticket.estimated_wait, 2))
+
+    def release(self, ticket, succeeded=True):
+        """任务结束（或放弃排队），释放 slot；成功的任务用实际耗时更新估计"""
+        if ticket in self.running:
+            self.running.discard(ticket)
+            RUNNING.set(len(self.running))
+            ticket.worker.busy = False
+            if succeeded:
+                seconds = time.perf_counter() - ticket.started_at
+                if ticket.checkpoint is not None and self.residency.loaded(ticket.worker, ticket.checkpoint):
+                    # 换了模型：多出来的时间记为换模型代价，不计入该工作流的正常耗时
+                    if ticket.kind in self.estimates:
+                        self.residency.record_swap(ticket.checkpoint, seconds - self.estimates[ticket.kind])
+                else:
+                    self.record(ticket.kind, seconds)
+        else:
+            flow = self.flows.get((ticket.priority, ticket.tenant))
+            if flow is not None and ticket in flow.jobs:
+                flow.jobs.remove(ticket)
+                QUEUED.dec(priority=ticket.priority)
+        self._dispatch()
+        # 空闲且没有透支的队列可以删掉，重新进来时也是从当前虚拟时钟开始
+        for key in [k for k, f in self.flows.items() if not f.jobs and f.vtime <= self.vclock]:
+            del self.flows[key]
+
+    def snapshot(self):
+        now = time.perf_counter()
+        queues = [{"tenant": f.tenant, "priority": f.priority, "weight": f.weight,
+                   "queued": f.queued(), "tasks": len(f.jobs),
+                   "backlog_seconds": round(f.backlog(), 2)}
+                  for f in self.flows.values() if f.jobs]
+        return {
+            "slots": self.slots,
+            "running": [{"tenant": t.tenant, "priority": t.priority, "kind": t.kind,
+                         "worker": t.worker.address, "seconds": round(now - t.started_at, 2)}
+                        for t in self.running],
+            "queues": sorted(queues, key=lambda q: -q["backlog_seconds"]),
+            "estimates": {k: round(v, 2) for k, v in self.estimates.items()},
+            "max_wait": self.max_wait,
+        }
+
+
+scheduler = Scheduler()
+
+
+@router.get("/scheduler")
+def scheduler_status():
+    """排队情况和各工作流的预计耗时"""
+    return scheduler.snapshot()
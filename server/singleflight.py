@@ -0,0 +1,79 @@
+import asyncio
+import hashlib
+import json
+
+from .metrics import Counter, Gauge, log
+from .tracing import current_span
+
+# 合并相同的并发请求（single-flight）
+# 同一个 key 已经有任务在跑时，后来的请求不再重复提交，而是挂在这个任务上
+# 等待，拿到同一个结果（或同一个异常）。任务结束就从表里删掉，不做结果缓存：
+# 之后再来的相同请求会重新执行。
+# 任务跑在独立的 asyncio.Task 里，发起它的请求断开也不会把它取消，
+# 其它等待者照样能拿到结果。所有调用都在事件循环线程里，不需要加锁。
+
+CALLS = Counter("orchid_singleflight_calls_total",
+                "Single-flight calls by group and role (leader = executed, waiter = coalesced)",
+                ["group", "role"])
+INFLIGHT = Gauge("orchid_singleflight_inflight", "Distinct single-flight jobs currently running", ["group"])
+
+
+def fingerprint(payload):
+    """规范化后的 JSON（键排序、无空白）的 sha256，作为合并用的 key"""
+    text = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self, task, trace_id):
+        self.task = task
+        self.trace_id = trace_id  # 发起者的 trace，等待者的日志里带上方便对照
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, group):
+        self.group = group
+        self._calls = {}
+
+    def inflight(self):
+        return len(self._calls)
+
+    def running(self, key):
+        return key in self._calls
+
+    async def do(self, key, fn, *args, **kwargs):
+        """执行 await fn(*args, **kwargs)，相同 key 的并发调用只执行一次。
+
+        返回 (结果, shared)，shared 为 True 表示结果来自别的请求发起的任务。
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if shared:
+            call.waiters += 1
+            CALLS.inc(group=self.group, role="waiter")
+            log("singleflight_join", group=self.group, key=key[:16], waiters=call.waiters,
+                leader_trace_id=call.trace_id)
+        else:
+            span = current_span()
+            call = _Call(asyncio.ensure_future(fn(*args, **kwargs)), span.trace_id if span else None)
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._done(key, call))
+            CALLS.inc(group=self.group, role="leader")
+            INFLIGHT.inc(group=self.group)
+
+        span = current_span()
+        if span is not None:
+            span.set_attribute("singleflight.key", key[:16])
+            span.set_attribute("singleflight.shared", shared)
+        # shield: 某个等待者被取消（客户端断开）时不取消共享的任务
+        return await asyncio.shield(call.task), shared
+
+    def _done(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        INFLIGHT.dec(group=self.group)
+        if not call.task.cancelled():
+            call.task.exception()  # 等待者都已断开时，避免 "exception was never retrieved"
+        if call.waiters:
+            log("singleflight_done", group=self.group, key=key[:16], waiters=call.waiters)
@@ -0,0 +1,98 @@
+import asyncio
+import math
+import os
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from .metrics import Counter, stage
+
+# 大尺寸无缝纹理的分块生成
+# 模板工作流一次采样 512 左右的 latent，直接提高分辨率显存和耗时都会爆炸。
+# 分块模式：
+#   1. 把底图（上传的图片，或先生成的一张 512 文生图）放大到目标尺寸；
+#   2. 把它看成环面（左右、上下首尾相接），切成互相重叠的 TILE_SIZE 图块，
+#      跨边界的图块从对边取像素，第一排/列图块的中心正好落在接缝上；
+#   3. 每个图块是一个独立的图生图任务（低 denoise，只补细节不改构图），
+#      经 scheduler 分配到各个 ComfyUI worker 并行执行；
+#   4. 结果按羽化权重（重叠区线性渐变）在环面上加权平均拼回去。
+# 接缝处也是由跨接缝的图块生成并羽化过渡的，所以结果四方连续，可以直接在服装上平铺；
+# 总耗时随 worker 数线性缩短，单个任务的显存只取决于 TILE_SIZE。
+#
+# 环境变量：
+#   ORCHID_TILE_SIZE      图块边长，默认 512
+#   ORCHID_TILE_OVERLAP   相邻图块最少重叠的像素，默认 64
+#   ORCHID_TILE_DENOISE   图块图生图的 denoise，默认 0.35
+
+TILE_SIZE = int(os.environ.get("ORCHID_TILE_SIZE", "512"))
+TILE_OVERLAP = int(os.environ.get("ORCHID_TILE_OVERLAP", "64"))
+TILE_DENOISE = float(os.environ.get("ORCHID_TILE_DENOISE", "0.35"))
+MAX_SIZE = 4096
+
+TILES = Counter("orchid_tiles_total", "Tiles generated for large textures", ["result"])
+
+
+def plan(size, tile=TILE_SIZE, overlap=TILE_OVERLAP):
+    """size x size 环面上的图块起点 [(y, x), ...] 和实际重叠宽度。
+
+    每个方向均匀放 n 块（步长 size / n <= tile - overlap），
+    起点错开半块，让接缝落在图块中间。
+    """
+    if tile >= size:
+        return [(0, 0)], 0
+    n = math.ceil(size / (tile - overlap))
+    starts = [(round(i * size / n) - tile // 2) % size for i in range(n)]
+    actual = tile - math.ceil(size / n)
+    return [(y, x) for y in starts for x in starts], actual
+
+
+def _indices(start, tile, size):
+    return (start + np.arange(tile)) % size
+
+
+def extract(image, y, x, tile=TILE_SIZE):
+    """从环面上切出一个图块（越界部分从对边取）"""
+    h, w = image.shape[:2]
+    return image[np.ix_(_indices(y, tile, h), _indices(x, tile, w))]
+
+
+def feather(tile, overlap):
+    """图块的羽化权重：边缘 overlap 像素内从 0 线性升到 1"""
+    if overlap <= 0:
+        return np.ones((tile, tile), dtype=np.float32)
+    edge = np.minimum(np.arange(tile) + 0.5, tile - np.arange(tile) - 0.5)
+    ramp = np.clip(edge / overlap, 1e-3, 1.0).astype(np.float32)
+    return np.outer(ramp, ramp)
+
+
+def blend(size, origins, tiles, overlap):
+    """把图块按羽化权重在环面上加权平均，返回 size x size 的 uint8 图像"""
+    tile = tiles[0].shape[0]
+    weight = feather(tile, overlap)
+    acc = np.zeros((size, size, tiles[0].shape[2]), dtype=np.float32)
+    total = np.zeros((size, size), dtype=np.float32)
+    for (y, x), image in zip(origins, tiles):
+        index = np.ix_(_indices(y, tile, size), _indices(x, tile, size))
+        acc[index] += image.astype(np.float32) * weight[..., None]
+        total[index] += weight
+    return np.clip(acc / np.maximum(total, 1e-6)[..., None] + 0.5, 0, 255).astype(np.uint8)
+
+
+async def generate(base, origins, overlap, run_tile, tile=TILE_SIZE):
+    """逐块生成并拼接。
+
+    base 是已放大到目标尺寸的底图；run_tile(index, crop) 返回生成的图块
+    （和 crop 同尺寸的 BGR 数组），失败时返回 None，该块保留底图。
+    返回 (拼好的图像, 成功的图块数)。
+    """
+    size = base.shape[0]
+    crops = [extract(base, y, x, tile) for y, x in origins]
+    results = await asyncio.gather(*(run_tile(i, crop) for i, crop in enumerate(crops)))
+    done = 0
+    for result in results:
+        TILES.inc(result="generated" if result is not None else "failed")
+        done += result is not None
+    tiles = [result if result is not None else crop for result, crop in zip(results, crops)]
+    with stage("postprocess", step="tile_blend", size=size, tiles=len(tiles)):
+        image = await run_in_threadpool(blend, size, origins, tiles, overlap)
+    return image, done
@@ -0,0 +1,290 @@
+import atexit
+import contextvars
+import functools
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+
+# 轻量级链路追踪
+# 一次请求经过 FastAPI 处理函数 -> ComfyUIClient 的 HTTP/websocket 调用，
+# 脚本侧还有 Blender socket 命令（scripts/blender_bridge.py）。每一步记录为
+# 一个 span（trace_id / span_id / parent_span_id），通过 W3C traceparent
+# 头在进程之间传递。结束的 span 以 OTLP/JSON 格式批量写入本地文件
+# （每行一个 ExportTraceServiceRequest），设置 ORCHID_OTLP_ENDPOINT 时同时
+# POST 给 OpenTelemetry Collector（例如 http://localhost:4318/v1/traces）。
+#
+# 只依赖标准库：scripts/ 下的脚本也直接 import 这个文件。
+#
+# 环境变量:
+#   ORCHID_TRACE_FILE      导出文件，默认 traces/spans.jsonl，设为空字符串则不写文件
+#   ORCHID_TRACE_MAX_BYTES 导出文件超过这个大小时轮转为 <文件>.1（只保留一份旧文件），
+#                          默认 50MB，所以长期运行时最多占用约两倍的空间
+#   ORCHID_OTLP_ENDPOINT   OTLP/HTTP JSON 接收地址（可选）
+#   ORCHID_TRACE_SAMPLE    新 trace 的采样率 0..1，默认 1
+
+SERVICE_NAME = os.environ.get("ORCHID_SERVICE_NAME", "orchid-gesture")
+TRACE_FILE = os.environ.get("ORCHID_TRACE_FILE", os.path.join("traces", "spans.jsonl"))
+OTLP_ENDPOINT = os.environ.get("ORCHID_OTLP_ENDPOINT", "")
+SAMPLE_RATE = float(os.environ.get("ORCHID_TRACE_SAMPLE", "1"))
+TRACE_MAX_BYTES = int(os.environ.get("ORCHID_TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+FLUSH_INTERVAL = 1.0
+MAX_BATCH = 512
+
+# OTLP SpanKind / StatusCode
+KINDS = {"internal": 1, "server": 2, "client": 3, "producer": 4, "consumer": 5}
+STATUS_OK, STATUS_ERROR = 1, 2
+
+_current = contextvars.ContextVar("orchid_span", default=None)
+
+
+def _new_id(n_bytes):
+    return f"{random.getrandbits(n_bytes * 8):0{n_bytes * 2}x}"
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+
+class SpanContext:
+    """远端传来的父 span（只有 id，没有计时）"""
+
+    def __init__(self, trace_id, span_id, sampled=True):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+
+class Span:
+    def __init__(self, name, kind="internal", parent=None, attributes=None):
+        self.name = name
+        self.kind = kind
+        if parent is not None:
+            self.trace_id = parent.trace_id
+            self.parent_span_id = parent.span_id
+            self.sampled = parent.sampled
+        else:
+            self.trace_id = _new_id(16)
+            self.parent_span_id = None
+            self.sampled = random.random() < SAMPLE_RATE
+        self.span_id = _new_id(8)
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.status = None
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def add_event(self, name, **attributes):
+        self.events.append((time.time_ns(), name, attributes))
+
+    def record_exception(self, exc):
+        self.add_event("exception", **{"exception.type": type(exc).__name__, "exception.message": str(exc)})
+        self.status, self.status_message = STATUS_ERROR, str(exc)
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if self.sampled:
+                _exporter.submit(self)
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_otlp(self):
+        record = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": KINDS.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "events": [{"timeUnixNano": str(t), "name": n, "attributes": _otlp_attributes(a)}
+                       for t, n, a in self.events],
+        }
+        if self.parent_span_id:
+            record["parentSpanId"] = self.parent_span_id
+        if self.status:
+            record["status"] = {"code": self.status, "message": self.status_message}
+        return record
+
+
+def parse_traceparent(header):
+    """W3C traceparent -> SpanContext，格式不对时返回 None"""
+    try:
+        version, trace_id, span_id, flags = header.strip().split("-")
+        int(trace_id, 16), int(span_id, 16)
+        if len(trace_id) != 32 or len(span_id) != 16 or version == "ff" or set(trace_id) == {"0"}:
+            return None
+        return SpanContext(trace_id, span_id, sampled=bool(int(flags, 16) & 1))
+    except (AttributeError, ValueError):
+        return None
+
+
+def current_span():
+    return _current.get()
+
+
+def current_traceparent():
+    span = _current.get()
+    return span.traceparent if span is not None else None
+
+
+def add_event(name, **attributes):
+    span = _current.get()
+    if span is not None:
+        span.add_event(name, **attributes)
+
+
+@contextmanager
+def span(name, kind="internal", parent=None, **attributes):
+    """开始一个 span 并设为当前 span；异常会记录在 span 上后继续抛出"""
+    s = Span(name, kind, parent if parent is not None else _current.get(), attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.record_exception(e)
+        raise
+    finally:
+        _current.reset(token)
+        s.end()
+
+
+def traced(name=None, kind="internal"):
+    """装饰器版本的 span()"""
+    def decorate(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class _Exporter:
+    """后台线程批量导出结束的 span，不阻塞请求"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def submit(self, s):
+        if not TRACE_FILE and not OTLP_ENDPOINT:
+            return
+        self._queue.put(s)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+
+    def _drain(self):
+        spans = []
+        while len(spans) < MAX_BATCH:
+            try:
+                spans.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return spans
+
+    def _run(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        # 后台线程和 atexit 可能同时调用，写文件要串行
+        with self._flush_lock:
+            spans = self._drain()
+            while spans:
+                self._export(spans)
+                spans = self._drain()
+
+    def _rotate(self):
+        """文件超过 TRACE_MAX_BYTES 时改名为 <文件>.1（覆盖上一份），之后写新文件"""
+        try:
+            if TRACE_MAX_BYTES > 0 and os.path.getsize(TRACE_FILE) >= TRACE_MAX_BYTES:
+                os.replace(TRACE_FILE, TRACE_FILE + ".1")
+        except FileNotFoundError:
+            pass
+
+    def _export(self, spans):
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME, "process.pid": os.getpid()})},
+            "scopeSpans": [{"scope": {"name": "orchid.tracing"}, "spans": [s.to_otlp() for s in spans]}],
+        }]}
+        data = json.dumps(payload, ensure_ascii=False)
+        if TRACE_FILE:
+            try:
+                os.makedirs(os.path.dirname(TRACE_FILE) or ".", exist_ok=True)
+                self._rotate()
+                with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                    f.write(data + "\n")
+            except OSError as e:
+                print(f"Trace export to {TRACE_FILE} failed: {e}")
+        if OTLP_ENDPOINT:
+            req = urllib.request.Request(OTLP_ENDPOINT, data=data.encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+            try:
+                urllib.request.urlopen(req, timeout=2).read()
+            except Exception as e:
+                print(f"Trace export to {OTLP_ENDPOINT} failed: {e}")
+
+
+_exporter = _Exporter()
+
+
+def flush():
+    """立即导出所有已结束的 span"""
+    _exporter.flush()
+
+
+# 导出线程是 daemon，进程退出前把剩下的 span 写完（脚本通常只跑几秒）
+atexit.register(flush)
+
+
+def install(app):
+    """给每个 HTTP 请求建一个 server span，接受并返回 traceparent 头"""
+    from fastapi import Request
+
+    @app.middleware("http")
+    async def _trace(request: Request, call_next):
+        parent = parse_traceparent(request.headers.get("traceparent", ""))
+        with span(f"{request.method} {request.url.path}", "server", parent=parent,
+                  **{"http.method": request.method, "http.target": request.url.path}) as s:
+            response = await call_next(request)
+            route = request.scope.get("route")
+            if getattr(route, "path", None):
+                # span 名用路由模板，和 /metrics 的标签一致
+                s.name = f"{request.method} {route.path}"
+                s.set_attribute("http.route", route.path)
+            s.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                s.status = STATUS_ERROR
+            response.headers["traceparent"] = s.traceparent
+            return response
@@ -0,0 +1,274 @@
+import hashlib
+import json
+import math
+import os
+import struct
+import threading
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+
+from .metrics import cache_result, stage
+
+# 体型参数（身高/胖瘦）预烘焙模型服务
+# 模型由 scripts/bake_body_variants.py 离线生成，按内容哈希命名，存放在
+# variants/<model>/ 下，并附带 index.json（参数网格 + 每个变体的文件）。
+# 前端按参数请求时返回最近的网格点，或由相邻网格点线性插值得到的模型，
+# 客户端不再需要加载全部 morph target 自己计算。
+#
+# 插值结果缓存在 variants/<model>/blended/ 下。插值位置按网格间距的 1/BLEND_STEPS
+# 取整，不同结果的数量有限；目录里最多保留 BLEND_CACHE_FILES 个文件，超出时删掉最久没用过的。
+#
+# 环境变量：
+#   ORCHID_VARIANT_BLEND_STEPS   每个网格间距内的插值档数，默认 20
+#   ORCHID_VARIANT_BLEND_FILES   每个模型最多缓存的插值结果数，默认 256
+
+VARIANTS_DIR = Path("variants")
+
+# 按内容哈希命名的文件永远不会变化，可以长期缓存
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# 参数 -> 文件 的映射会在重新烘焙后变化，只短期缓存
+PARAM_CACHE = "public, max-age=3600"
+
+BLEND_STEPS = max(1, int(os.environ.get("ORCHID_VARIANT_BLEND_STEPS", "20")))
+BLEND_CACHE_FILES = max(1, int(os.environ.get("ORCHID_VARIANT_BLEND_FILES", "256")))
+
+GLB_MAGIC = 0x46546C67
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+router = APIRouter()
+
+_lock = threading.Lock()
+_indexes = {}  # model -> (index.json mtime, index)
+
+
+def load_index(model):
+    """读取 variants/<model>/index.json，文件未变化时直接用内存中的结果"""
+    if not model.replace("_", "").replace("-", "").isalnum():
+        raise HTTPException(status_code=404, detail="Unknown model")
+    path = VARIANTS_DIR / model / "index.json"
+    if not path.exists():
+        raise HTTPException(status_code=404, detail=f"No variants for {model}")
+    mtime = path.stat().st_mtime_ns
+    with _lock:
+        cached = _indexes.get(model)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        index = json.load(f)
+    index["_by_params"] = {
+        tuple(v["params"][p] for p in sorted(index["params"])): v for v in index["variants"]
+    }
+    with _lock:
+        _indexes[model] = (mtime, index)
+    return index
+
+
+def requested_params(index, query):
+    """从 query 参数里取出各个体型参数，缺省时取网格中最接近 0 的值"""
+    values = {}
+    for name, grid in index["params"].items():
+        raw = query.get(name)
+        if raw is None:
+            values[name] = min(grid, key=abs)
+            continue
+        try:
+            values[name] = float(raw)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid value for {name}: {raw}")
+        if not math.isfinite(values[name]):  # nan/inf 会让插值找不到网格点
+            raise HTTPException(status_code=400, detail=f"Invalid value for {name}: {raw}")
+    return values
+
+
+def nearest_variant(index, values):
+    """网格上最近的变体（每个参数按网格范围归一化后计算距离）"""
+    best, best_dist = None, None
+    for v in index["variants"]:
+        dist = 0.0
+        for name, grid in index["params"].items():
+            span = (max(grid) - min(grid)) or 1.0
+            dist += ((v["params"][name] - values[name]) / span) ** 2
+        if best_dist is None or dist < best_dist:
+            best, best_dist = v, dist
+    return best
+
+
+def corner_weights(index, values):
+    """多线性插值：返回 [(变体, 权重)]，最多 2^参数个数 个网格点"""
+    names = sorted(index["params"])
+    axes = []
+    for name in names:
+        grid = index["params"][name]
+        x = min(max(values[name], grid[0]), grid[-1])
+        hi = int(np.searchsorted(grid, x))
+        if hi == 0 or grid[min(hi, len(grid) - 1)] == x:
+            i = min(hi, len(grid) - 1)
+            axes.append([(grid[i], 1.0)])
+        else:
+            t = (x - grid[hi - 1]) / (grid[hi] - grid[hi - 1])
+            t = round(t * BLEND_STEPS) / BLEND_STEPS  # 只插值到固定的档位，缓存的结果数量有限
+            axes.append([(grid[hi - 1], 1.0 - t), (grid[hi], t)])
+
+    corners = []
+    for combo in product(*axes):
+        weight = float(np.prod([w for _, w in combo]))
+        if weight > 1e-6:
+            corners.append((index["_by_params"][tuple(v for v, _ in combo)], weight))
+    return corners
+
+
+def _split_glb(data):
+    magic, _, length = struct.unpack_from("<III", data, 0)
+    if magic != GLB_MAGIC:
+        raise ValueError("not a GLB file")
+    gltf, bin_chunk = None, b""
+    offset = 12
+    while offset < length:
+        chunk_length, chunk_type = struct.unpack_from("<II", data, offset)
+        chunk = data[offset + 8:offset + 8 + chunk_length]
+        offset += 8 + chunk_length
+        if chunk_type == CHUNK_JSON:
+            gltf = json.loads(chunk)
+        elif chunk_type == CHUNK_BIN:
+            bin_chunk = chunk
+    return gltf, bin_chunk
+
+
+def _join_glb(gltf, bin_chunk):
+    json_bytes = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    json_bytes += b" " * (-len(json_bytes) % 4)
+    bin_chunk = bytes(bin_chunk) + b"\x00" * (-len(bin_chunk) % 4)
+    body = struct.pack("<II", len(json_bytes), CHUNK_JSON) + json_bytes
+    body += struct.pack("<II", len(bin_chunk), CHUNK_BIN) + bin_chunk
+    return struct.pack("<III", GLB_MAGIC, 2, 12 + len(body)) + body
+
+
+def blend_variants(model_dir, corners):
+    """按权重混合几个变体的 POSITION/NORMAL 数据。
+
+    morph 是线性的，POSITION 和直接烘焙这组参数的结果一致；
+    NORMAL 是各网格点（已归一化的）法线的加权平均再归一化，是近似值，
+    网格越密越接近直接烘焙的法线。
+    """
+    base_variant = corners[0][0]
+    gltf, base_bin = _split_glb((model_dir / base_variant["file"]).read_bytes())
+    out_bin = bytearray(base_bin)
+    corner_bins = [_split_glb((model_dir / v["file"]).read_bytes())[1] for v, _ in corners]
+
+    for slot, entry in enumerate(base_variant["blend"]):
+        acc = 0.0
+        for (variant, weight), data in zip(corners, corner_bins):
+            src = variant["blend"][slot]
+            acc = acc + weight * np.frombuffer(data, dtype=np.float32, count=src["count"] * 3,
+                                               offset=src["offset"]).reshape(-1, 3).astype(np.float64)
+        if entry["attribute"] == "NORMAL":
+            acc /= np.maximum(np.linalg.norm(acc, axis=1, keepdims=True), 1e-12)
+        else:
+            accessor = gltf["accessors"][entry["accessor"]]
+            accessor["min"] = acc.min(axis=0).tolist()
+            accessor["max"] = acc.max(axis=0).tolist()
+        out_bin[entry["offset"]:entry["offset"] + entry["count"] * 12] = acc.astype(np.float32).tobytes()
+    return _join_glb(gltf, out_bin)
+
+
+def blended_file(model, index, corners):
+    """插值结果按 (网格点, 权重) 缓存到 variants/<model>/blended/ 下"""
+    model_dir = VARIANTS_DIR / model
+    if len(corners) == 1:
+        variant = corners[0][0]
+        return model_dir / variant["file"], variant["sha256"]
+
+    key_src = json.dumps([(v["sha256"], round(w, 4)) for v, w in corners]).encode("utf-8")
+    key = hashlib.sha256(key_src).hexdigest()[:16]
+    path = model_dir / "blended" / f"{key}.glb"
+    cache_result("variant_blend", path.exists())
+    if path.exists():
+        try:
+            os.utime(path)  # mtime 记录最近使用时间，淘汰时按它排序
+        except FileNotFoundError:  # 刚好被淘汰了，下面重新生成
+            pass
+    if not path.exists():
+        with stage("variant_blend", model=model):
+            data = blend_variants(model_dir, corners)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+        _evict_blended(path.parent, keep=path)
+    return path, key
+
+
+def _evict_blended(blend_dir, keep):
+    """blended/ 里超过 BLEND_CACHE_FILES 个文件时，删掉最久没用过的（不删刚生成的 keep）"""
+    entries = []
+    for p in blend_dir.glob("*.glb"):
+        try:
+            entries.append((p.stat().st_mtime_ns, p))
+        except FileNotFoundError:
+            continue
+    if len(entries) <= BLEND_CACHE_FILES:
+        return
+    entries.sort()
+    for _, p in entries[:len(entries) - BLEND_CACHE_FILES]:
+        if p != keep:
+            p.unlink(missing_ok=True)
+
+
+def _glb_response(request, path, etag, cache_control):
+    headers = {"ETag": f'"{etag}"', "Cache-Control": cache_control}
+    not_modified = request.headers.get("if-none-match") == headers["ETag"]
+    cache_result("http_etag", not_modified)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="model/gltf-binary", headers=headers)
+
+
+@router.get("/variants")
+async def list_models():
+    if not VARIANTS_DIR.exists():
+        return {"models": []}
+    return {"models": sorted(p.name for p in VARIANTS_DIR.iterdir() if (p / "index.json").exists())}
+
+
+@router.get("/variants/{model}")
+async def model_info(model: str):
+    index = load_index(model)
+    return {
+        "model": model,
+        "params": index["params"],
+        "variants": [{"params": v["params"], "url": f"/variants/{model}/files/{v['file']}", "size": v["size"]}
+                     for v in index["variants"]],
+    }
+
+
+@router.get("/variants/{model}/body.glb")
+def variant_glb(model: str, request: Request, mode: str = "nearest"):
+    """
+    按体型参数返回模型，例如 /variants/mpfb_body/body.glb?height=0.3&weight=-0.5
+    mode=nearest 返回最近的网格点，mode=interpolate 返回插值结果
+    （普通 def：插值是 CPU 计算，交给线程池执行，不阻塞事件循环）
+    """
+    index = load_index(model)
+    values = requested_params(index, request.query_params)
+    if mode == "nearest":
+        variant = nearest_variant(index, values)
+        path, etag = VARIANTS_DIR / model / variant["file"], variant["sha256"]
+    elif mode == "interpolate":
+        path, etag = blended_file(model, index, corner_weights(index, values))
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown mode: {mode}")
+    return _glb_response(request, path, etag, PARAM_CACHE)
+
+
+@router.get("/variants/{model}/files/{name}")
+async def variant_file(model: str, name: str, request: Request):
+    index = load_index(model)
+    variant = next((v for v in index["variants"] if v["file"] == name), None)
+    if variant is None:
+        raise HTTPException(status_code=404, detail="Unknown variant")
+    return _glb_response(request, VARIANTS_DIR / model / name, variant["sha256"], IMMUTABLE_CACHE)